@@ -37,6 +37,27 @@ environment variables that are currently used:
 | `SECRET_KEY` | `top-secret!` | A secret key used when signing tokens. |
 | `DATABASE_URL`  | `sqlite:///db.sqlite` | The database URL, as defined by the [SQLAlchemy](https://docs.sqlalchemy.org/en/14/core/engines.html#database-urls) framework. |
 | `SQL_ECHO` | not defined | Whether to echo SQL statements to the console for debugging purposes. |
+| `DATABASE_POOL_SIZE` | SQLAlchemy default | The number of connections to keep open in the database connection pool. |
+| `DATABASE_MAX_OVERFLOW` | SQLAlchemy default | The number of connections that can be opened beyond the pool size during load spikes. |
+| `DATABASE_POOL_RECYCLE` | not defined | The number of seconds after which pooled connections are replaced. |
+| `DATABASE_POOL_TIMEOUT` | SQLAlchemy default | The number of seconds to wait for a connection from the pool before giving up. |
+| `DATABASE_POOL_PRE_PING` | not defined | Whether to test pooled connections for liveness before using them. |
+| `DATABASE_STATEMENT_TIMEOUT` | `0` | The maximum number of milliseconds a database statement is allowed to run, or `0` for no limit. Statements that exceed it are cancelled and the request fails with a `503` status code. |
+| `DATABASE_COLLECTION_STATEMENT_TIMEOUT` | `5000` | The maximum number of milliseconds a database statement is allowed to run in the endpoints that return large collections, such as the lists of users and posts, or `0` for no limit. When `DATABASE_STATEMENT_TIMEOUT` is lower, that limit is used instead. |
+| `ADMISSION_AUTH_LIMIT` | `0` | The number of requests in flight in a worker above which token requests are rejected with a `503` status code, or `0` for no limit. |
+| `ADMISSION_WRITE_LIMIT` | `0` | The number of requests in flight in a worker above which requests that modify data are rejected, or `0` for no limit. |
+| `ADMISSION_READ_LIMIT` | `0` | The number of requests in flight in a worker above which read requests are rejected, or `0` for no limit. Set lower than the other limits so that reads are shed first. |
+| `ADMISSION_MAX_POOL_WAIT` | `0` | The average number of milliseconds spent waiting for a database connection above which read requests are rejected, or `0` to disable. |
+| `ADMISSION_RETRY_AFTER` | `1` | The number of seconds returned in the `Retry-After` header of rejected requests. |
+| `SERVER_TIMING` | `no` | Whether to include a `Server-Timing` header in responses, with the number of database queries and the time spent in the database, authentication and serialization. These timings are visible to any client, so this option is intended for development. |
+| `SLOW_REQUEST_THRESHOLD` | `500` | The number of milliseconds above which a request is logged as slow, along with its slowest database query, or `0` to disable. |
+| `METRICS_ENABLED` | `no` | Whether to expose request, database pool and email metrics in the Prometheus text format at `/metrics`. The metrics include traffic details, so the endpoint should also be protected with `METRICS_TOKEN` when the API is public. |
+| `METRICS_TOKEN` | not defined | A token that clients must send as a bearer token to access `/metrics`. When not defined, the metrics are public. |
+| `METRICS_DIR` | not defined | A directory shared by all the worker processes of the server, where each process writes its metrics and profiles so that `/metrics`, `/profile` and `flask profile dump` can report totals for all of them. The directory should be emptied before the server starts. When not defined, each process reports only its own metrics. |
+| `METRICS_WRITE_INTERVAL` | `5` | The minimum number of seconds between writes of the metrics and profiles of a process to `METRICS_DIR`. |
+| `PROFILER_SAMPLE_RATE` | `0` | The fraction of requests to profile, between `0` and `1`. The stacks of profiled requests are aggregated per endpoint in the collapsed format used by flamegraph tools. |
+| `PROFILER_SECRET` | not defined | A secret that enables profiling of any request that includes it in a `X-Profile` header. The aggregated stacks can be retrieved from `/profile` by sending this secret as a bearer token, or with the `flask profile dump` command. When not defined, `/profile` is disabled. |
+| `PROFILER_INTERVAL` | `5` | The number of milliseconds between stack samples of a profiled request. |
 | `DISABLE_AUTH` | not defined | Whether to disable authentication. When running with authentication disabled, the user is assumed to be logged as the user with `id=1`, which must exist in the database. |
 | `ACCESS_TOKEN_MINUTES` | `15` | The number of minutes an access token is valid for. |
 | `REFRESH_TOKEN_DAYS` | `7` | The number of days a refresh token is valid for. |
@@ -45,18 +66,50 @@ environment variables that are currently used:
 | `RESET_TOKEN_MINUTES` | `15` | The number of minutes a reset token is valid for. |
 | `PASSWORD_RESET_URL` | `http://localhost:3000/reset` | The URL that will be used in password reset links. |
 | `USE_CORS` | `yes` | Whether to allow cross-origin requests. If allowed, CORS support can be configured or customized with options provided by the Flask-CORS extension. |
+| `MAX_CONTENT_LENGTH` | `1048576` | The maximum size in bytes of a request body. Larger requests are rejected with a `413` status code, or `0` for no limit. |
+| `REQUEST_DRAIN_LIMIT` | `65536` | The maximum number of bytes of a request body that the server reads and discards when the body was not used, so that the connection can be reused. When more is left unread, the connection is closed instead. |
+| `BATCH_MAX_IDS` | `100` | The maximum number of ids that can be requested at once with the `ids` argument of the user and post collections. |
+| `BATCH_MAX_REQUESTS` | `20` | The maximum number of requests that can be sent at once to the batch endpoint. |
+| `COMPRESSION` | `yes` | Whether to compress JSON responses with the zstd, brotli or gzip encoding, as accepted by the client. The zstd and brotli encodings require the `zstandard` and `brotli` packages. |
+| `COMPRESS_MIN_SIZE` | `500` | The minimum size in bytes of a response body that is compressed. |
+| `COMPRESS_GZIP_LEVEL` | `6` | The gzip compression level, from `1` to `9`. |
+| `COMPRESS_BROTLI_LEVEL` | `4` | The brotli compression quality, from `0` to `11`. |
+| `COMPRESS_ZSTD_LEVEL` | `3` | The zstd compression level, from `1` to `22`. |
+| `COMPRESS_CACHE_SIZE` | `256` | The number of compressed response bodies that each worker keeps, so that identical responses are not compressed again, or `0` to disable. |
 | `DOCS_UI` | `elements` | The UI library to use for the documentation. Allowed values are `swagger_ui`, `redoc`, `rapidoc` and `elements`. |
+| `APISPEC_FILE` | not defined | A file with the OpenAPI document of the API, written by the `flask openapi build` command. When the file exists, the document is served from it instead of being generated when the server starts. |
 | `MAIL_SERVER` | `localhost` | The mail server to use for sending emails. |
 | `MAIL_PORT` | `25` | The port to use for sending emails. |
 | `MAIL_USE_TLS` | not defined | Whether to use TLS when sending emails. |
 | `MAIL_USERNAME` | not defined | The username to use for sending emails. |
 | `MAIL_PASSWORD` | not defined | The password to use for sending emails. |
 | `MAIL_DEFAULT_SENDER` | `donotreply@microblog.example.com` | The default sender to use for emails. |
+| `MAIL_WORKERS` | `2` | The number of threads that send emails in each server process. Each thread keeps its own connection to the mail server. |
+| `MAIL_QUEUE_SIZE` | `100` | The maximum number of emails waiting to be sent in each server process. |
+| `MAIL_QUEUE_POLICY` | `block` | What to do when the email queue is full: `block` waits for space for up to `MAIL_QUEUE_TIMEOUT` seconds, `drop` discards the email, and `reject` fails the request with a 503 error. Blocked requests that time out also fail with a 503 error. |
+| `MAIL_QUEUE_TIMEOUT` | `5` | The number of seconds a request waits for space in a full email queue when using the `block` policy. |
+| `MAIL_BATCH_SIZE` | `20` | The maximum number of queued emails that a thread takes and sends at once, and the number of emails from the outbox that are sent over one connection. |
+| `MAIL_IDLE_TIMEOUT` | `30` | The number of seconds without emails to send after which a thread closes its connection to the mail server. |
+| `MAIL_TIMEOUT` | `10` | The number of seconds to wait for the mail server to respond before giving up on an email. |
+| `MAIL_SHUTDOWN_TIMEOUT` | `10` | The number of seconds a server process waits for its queued emails to be sent when it exits. The emails that are not sent by then are logged and discarded. |
+| `MAIL_OUTBOX` | not defined | Whether to store emails in the `outbox` database table, in the same transaction as the request, instead of sending them from the server processes. The emails are then sent by the `flask mail worker` command. |
+| `MAIL_OUTBOX_MAX_ATTEMPTS` | `10` | The number of attempts to send an email from the outbox before giving up. Emails that are given up stay in the outbox, with the last error. |
+| `MAIL_OUTBOX_RETRY_DELAY` | `30` | The number of seconds before the first retry of an email from the outbox that failed to send. The delay doubles after each attempt, with random jitter. |
+| `MAIL_OUTBOX_POLL_INTERVAL` | `1` | The number of seconds the `flask mail worker` command waits before checking the outbox again when there are no emails to send. |
 | `GITHUB_CLIENT_ID` | not defined | The client ID for the GitHub OAuth2 application, used for logging in with a GitHub account. |
 | `GITHUB_CLIENT_SECRET` | not defined | The client secret for the GitHub OAuth2 application, used for logging in with a GitHub account. |
 | `GOOGLE_CLIENT_ID` | not defined | The client ID for the Google OAuth2 application, used for logging in with a Google account. |
 | `GOOGLE_CLIENT_SECRET` | not defined | The client secret for the Google OAuth2 application, used for logging in with a Google account. |
 | `OAUTH2_REDIRECT_URI` | `http://localhost:3000/oauth2/{provider}/callback` | The redirect URI to use for OAuth2 logins. A `{provider}` placeholder can be used to have the provider name inserted dynamically. |
+| `OAUTH2_CONNECT_TIMEOUT` | `3` | The number of seconds to wait for a connection to an OAuth2 provider. |
+| `OAUTH2_READ_TIMEOUT` | `10` | The number of seconds to wait for a response from an OAuth2 provider. A login fails with a 503 error when a timeout expires. |
+| `OAUTH2_RETRIES` | `2` | The number of times a failed request to an OAuth2 provider is retried, after a short delay with random jitter. Only connection errors are retried for requests that are not idempotent. |
+| `OAUTH2_POOL_SIZE` | `10` | The maximum number of keep-alive connections to each OAuth2 provider in each server process. |
+| `WEB_CONCURRENCY` | number of CPUs plus one | The number of Gunicorn worker processes. With the `sync` worker class, the default is twice the number of CPUs plus one. |
+| `GUNICORN_WORKER_CLASS` | `gthread` | The Gunicorn worker class. Use `sync` for one request at a time per worker, `gthread` for a pool of threads per worker, or `gevent` for greenlets, which requires the `gevent` package to be installed. |
+| `GUNICORN_THREADS` | `4` | The number of threads of each worker when using the `gthread` worker class. |
+| `GUNICORN_WORKER_CONNECTIONS` | `1000` | The maximum number of concurrent connections of each worker when using the `gevent` worker class. |
+| `GUNICORN_PRELOAD` | `yes` | Whether Gunicorn loads the application before starting the workers. Preloaded workers share the memory of the application, and start faster. |
 
 ## Authentication
 
@@ -0,0 +1,106 @@
+from threading import Lock
+from time import monotonic
+
+from flask import current_app, g, request
+from werkzeug.exceptions import ServiceUnavailable
+
+from api.metrics import metrics
+
+# endpoint classes, from highest to lowest priority
+CLASSES = ['auth', 'write', 'read']
+
+
+class Admission:
+    """Admission controller that sheds load when the server is saturated.
+
+    Requests are classified as ``auth`` (token endpoints), ``write`` (any
+    method that is not a read) or ``read``. A batch is classified as a read
+    when all of its requests are reads, as they would be if they were sent
+    on their own, and as a write otherwise. Each class is only admitted while
+    the number of requests in flight is below its limit, so configuring a
+    lower limit for reads causes them to be rejected first. Reads are also
+    rejected while connections from the database pool are slow to obtain.
+    """
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.in_flight = {name: 0 for name in CLASSES}
+        self.pool_wait = {name: (0.0, 0.0) for name in CLASSES}
+        if app:  # pragma: no cover
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    @staticmethod
+    def classify():
+        if request.blueprint == 'tokens':
+            return 'auth'
+        if request.blueprint == 'batch':
+            # invalid batches are classified as writes, and are rejected
+            # by the validation of the endpoint once admitted
+            data = request.get_json(silent=True)
+            requests = data.get('requests') if isinstance(data, dict) \
+                else None
+            if isinstance(requests, list) and all(
+                    isinstance(r, dict) and r.get('method', 'GET') == 'GET'
+                    for r in requests):
+                return 'read'
+            return 'write'
+        if request.method not in ['GET', 'HEAD', 'OPTIONS']:
+            return 'write'
+        return 'read'
+
+    def recent_pool_wait(self, name):
+        """Return the average pool wait for a class, in seconds.
+
+        The average decays over time, so that a class that is being shed
+        is eventually admitted again.
+        """
+        wait, updated = self.pool_wait[name]
+        half_life = current_app.config['ADMISSION_POOL_WAIT_HALF_LIFE']
+        return wait * 0.5 ** ((monotonic() - updated) / half_life)
+
+    def record_pool_wait(self, name, seconds):
+        with self.lock:
+            wait = self.recent_pool_wait(name)
+            self.pool_wait[name] = (0.8 * wait + 0.2 * seconds, monotonic())
+
+    def admit(self):
+        g.pool_wait = 0.0
+        name = self.classify()
+        limit = current_app.config['ADMISSION_LIMITS'][name]
+        max_pool_wait = current_app.config['ADMISSION_MAX_POOL_WAIT']
+        with self.lock:
+            total = sum(self.in_flight.values())
+            overloaded = limit and total >= limit
+            if not overloaded and name == 'read' and max_pool_wait:
+                overloaded = max(self.recent_pool_wait(c) for c in CLASSES) \
+                    * 1000 > max_pool_wait
+            if not overloaded:
+                self.in_flight[name] += 1
+                g.admission_class = name
+        metrics.set('admission_in_flight', self.in_flight[name],
+                    endpoint_class=name)
+        if overloaded:
+            metrics.inc('admission_rejected_total', endpoint_class=name)
+            return {
+                'code': ServiceUnavailable.code,
+                'message': ServiceUnavailable().name,
+                'description': ('The server is overloaded. Try again '
+                                'later.'),
+            }, ServiceUnavailable.code, {'Retry-After': str(
+                current_app.config['ADMISSION_RETRY_AFTER'])}
+
+    def release(self, exc):
+        name = g.pop('admission_class', None)
+        if name is None:
+            return
+        self.record_pool_wait(name, g.pop('pool_wait', 0.0))
+        with self.lock:
+            self.in_flight[name] -= 1
+        metrics.set('admission_in_flight', self.in_flight[name],
+                    endpoint_class=name)
+
+
+admission = Admission()
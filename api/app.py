@@ -1,30 +1,75 @@
-from flask import Flask, redirect, url_for, request
+import json
+import os
+from flask import Flask, current_app, redirect, url_for, request
+from werkzeug.exceptions import HTTPException
 from alchemical.flask import Alchemical
 from flask_marshmallow import Marshmallow
 from flask_cors import CORS
 from flask_mail import Mail
-from apifairy import APIFairy
+from apifairy import APIFairy as BaseAPIFairy
 from config import Config
 
+
+class APIFairy(BaseAPIFairy):
+    """APIFairy extension that can serve a prebuilt OpenAPI document.
+
+    When the file given by the ``APISPEC_FILE`` configuration exists, each
+    application serves the document in it instead of generating one from
+    the schemas.
+    """
+    def init_app(self, app):
+        super().init_app(app)
+        path = app.config['APISPEC_FILE']
+        if path and os.path.exists(path):
+            with open(path) as f:
+                app.extensions['apispec'] = json.load(f)
+
+    @property
+    def apispec(self):
+        prebuilt = current_app.extensions.get('apispec')
+        if prebuilt is not None:
+            return prebuilt
+        return self.generated_apispec
+
+    @property
+    def generated_apispec(self):
+        """The OpenAPI document generated from the schemas."""
+        return super().apispec
+
+
 db = Alchemical()
 ma = Marshmallow()
 cors = CORS()
 mail = Mail()
 apifairy = APIFairy()
 
+DRAIN_CHUNK_SIZE = 64 * 1024
+
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    from api.encoding import JSONProvider
+    app.json = JSONProvider(app)
 
     # extensions
     from api import models
+    from api.database import engine_options
+    app.config['ALCHEMICAL_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
     ma.init_app(app)
     if app.config['USE_CORS']:  # pragma: no branch
         cors.init_app(app)
     mail.init_app(app)
     apifairy.init_app(app)
+    from api.instrumentation import instrumentation
+    instrumentation.init_app(app)
+    from api.admission import admission
+    admission.init_app(app)
+    from api.profiler import profiler
+    profiler.init_app(app)
+    from api.compression import compression
+    compression.init_app(app)
 
     # blueprints
     from api.errors import errors
@@ -35,8 +80,21 @@ def create_app(config_class=Config):
     app.register_blueprint(users, url_prefix='/api')
     from api.posts import posts
     app.register_blueprint(posts, url_prefix='/api')
-    from api.fake import fake
-    app.register_blueprint(fake)
+    from api.batch import batch
+    app.register_blueprint(batch, url_prefix='/api')
+    from api.email import outbox
+    app.register_blueprint(outbox)
+    from api.monitoring import monitoring
+    app.register_blueprint(monitoring)
+    from api.profiler import profile
+    app.register_blueprint(profile)
+
+    # command line only blueprints are imported when their commands are used
+    from api.cli import LazyGroup
+    app.cli.add_command(LazyGroup(
+        'fake', 'api.fake:fake', help='Generate fake users and posts.'))
+    app.cli.add_command(LazyGroup(
+        'openapi', 'api.openapi:openapi', help='Build the OpenAPI document.'))
 
     # define the shell context
     @app.shell_context_processor
@@ -54,9 +112,32 @@ def create_app(config_class=Config):
         return redirect(url_for('apifairy.docs'))
 
     @app.after_request
-    def after_request(response):
-        # Werkzeug sometimes does not flush the request body so we do it here
-        request.get_data()
+    def drain_request_body(response):
+        # a request body that the server does not flush would be taken as
+        # the start of the next request on the connection, so the unread
+        # part is read here, unless it is too large and the connection is
+        # closed instead
+        length = request.content_length
+        if not length and 'Transfer-Encoding' not in request.headers:
+            return response
+        max_length = app.config['MAX_CONTENT_LENGTH']
+        limit = app.config['REQUEST_DRAIN_LIMIT']
+        if length is not None and (
+                (max_length is not None and length > max_length) or
+                (length > limit and 'stream' not in request.__dict__)):
+            response.headers['Connection'] = 'close'
+            return response
+        try:
+            while limit > 0:
+                chunk = request.stream.read(min(limit, DRAIN_CHUNK_SIZE))
+                if not chunk:
+                    return response
+                limit -= len(chunk)
+            if not request.stream.read(1):
+                return response
+        except (OSError, HTTPException):
+            pass
+        response.headers['Connection'] = 'close'
         return response
 
     return app
@@ -0,0 +1,279 @@
+"""Asynchronous deployment mode, for ASGI servers.
+
+The most used read endpoints of the API are served by coroutines that
+access the database through an asyncio engine, so that each worker process
+can serve many of these requests concurrently while they wait on the
+database. All other requests are handled by the Flask application, which
+runs in a thread pool, as are requests for sparse fieldsets and lookups by
+id.
+
+This mode requires the ``asgiref`` package, an ASGI server such as
+``uvicorn``, and the asyncio driver of the database, which is ``aiosqlite``
+for SQLite, ``asyncpg`` for Postgres or ``aiomysql`` for MySQL::
+
+    uvicorn microblog_asgi:app
+"""
+from io import BytesIO
+import sys
+
+from alchemical.aio import Alchemical
+import apifairy.exceptions
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, current_app, g, request
+from marshmallow import EXCLUDE, ValidationError
+from sqlalchemy import orm as so
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RoutingException
+
+from api.app import create_app
+from api.database import COLLECTION_STATEMENT_TIMEOUT
+from api.dates import naive_utcnow
+from api.decorators import paginate
+from api.encoding import encode
+from api.models import Post, Token, User
+from api.posts import post_schema, posts_schema, normalized_posts_schema
+from api.schemas import PostPaginationSchema, StringPaginationSchema, \
+    PaginatedCollection, PostIncludesSchema
+from api.users import user_schema, users_schema
+from config import Config
+
+handlers = {}
+normalized_posts_page_schema = PaginatedCollection(
+    normalized_posts_schema, pagination_schema=PostPaginationSchema,
+    includes_schema=PostIncludesSchema)()
+
+
+def read(endpoint, schema, pagination_schema=None, statement_timeout=None,
+         normalized_schema=None):
+    """Register a coroutine that serves a read endpoint of the API.
+
+    The coroutine receives a database session, the authenticated user and
+    the arguments of the route, plus the pagination arguments for endpoints
+    that return a paginated collection. It returns the object to dump with
+    ``schema``, or with ``normalized_schema`` when the normalized format is
+    requested, or raises a HTTP exception to pass the request to the Flask
+    application.
+    """
+    def decorator(f):
+        handlers[endpoint] = (f, schema, pagination_schema,
+                              statement_timeout, normalized_schema)
+        return f
+    return decorator
+
+
+@read('users.me', user_schema)
+async def me(session, user):
+    return user
+
+
+@read('users.get', user_schema)
+async def get_user(session, user, id):
+    return await session.get(User, id) or abort(404)
+
+
+@read('users.get_by_username', user_schema)
+async def get_user_by_username(session, user, username):
+    return await session.scalar(
+        User.select().filter_by(username=username)) or abort(404)
+
+
+@read('users.all', PaginatedCollection(users_schema)(),
+      StringPaginationSchema, statement_timeout=COLLECTION_STATEMENT_TIMEOUT)
+async def all_users(session, user, pagination):
+    return await session.run_sync(paginate, User.select(), pagination)
+
+
+@read('posts.get', post_schema)
+async def get_post(session, user, id):
+    return await session.get(Post, id, options=[
+        so.joinedload(Post.author)]) or abort(404)
+
+
+def paginate_posts(session, select_query, pagination):
+    return paginate(session, select_query.options(
+        so.selectinload(Post.author)), pagination, order_by=Post.timestamp,
+        order_direction='desc')
+
+
+@read('posts.all', PaginatedCollection(
+          posts_schema, pagination_schema=PostPaginationSchema)(),
+      PostPaginationSchema, statement_timeout=COLLECTION_STATEMENT_TIMEOUT,
+      normalized_schema=normalized_posts_page_schema)
+async def all_posts(session, user, pagination):
+    return await session.run_sync(paginate_posts, Post.select(), pagination)
+
+
+@read('posts.user_all', PaginatedCollection(
+          posts_schema, pagination_schema=PostPaginationSchema)(),
+      PostPaginationSchema, statement_timeout=COLLECTION_STATEMENT_TIMEOUT,
+      normalized_schema=normalized_posts_page_schema)
+async def user_posts(session, user, pagination, id):
+    author = await session.get(User, id) or abort(404)
+    return await session.run_sync(paginate_posts, author.posts.select(),
+                                  pagination)
+
+
+@read('posts.feed', PaginatedCollection(
+          posts_schema, pagination_schema=PostPaginationSchema)(),
+      PostPaginationSchema, statement_timeout=COLLECTION_STATEMENT_TIMEOUT,
+      normalized_schema=normalized_posts_page_schema)
+async def feed(session, user, pagination):
+    return await session.run_sync(
+        paginate_posts, user.followed_posts_select(), pagination)
+
+
+def build_environ(scope):
+    """Return the WSGI environment of a request without a body."""
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode().decode('latin1'),
+        'PATH_INFO': path.encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope['http_version'],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        key = name.decode('latin1').upper().replace('-', '_')
+        if key not in ['CONTENT_LENGTH', 'CONTENT_TYPE']:
+            key = 'HTTP_' + key
+        value = value.decode('latin1')
+        environ[key] = environ[key] + ',' + value if key in environ \
+            else value
+    return environ
+
+
+async def verify_token(session):
+    """Return the user that sent the request."""
+    if current_app.config['DISABLE_AUTH']:
+        return await session.get(User, 1)
+    auth = request.authorization
+    if auth is None or auth.type != 'bearer' or not auth.token:
+        abort(401)
+    access_token = Token.decode_jwt(auth.token)
+    token = access_token and await session.scalar(Token.select().filter_by(
+        access_token=access_token).options(so.joinedload(Token.user)))
+    if not token or token.access_expiration <= naive_utcnow():
+        abort(401)
+    token.user.ping()
+    await session.commit()
+    return token.user
+
+
+class AsyncReads:
+    """ASGI application that serves the read endpoints registered with
+    ``read`` on an asyncio database engine, and passes all other requests
+    to a Flask application."""
+    def __init__(self, app, engine_options=None):
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.db = Alchemical(app.config['ALCHEMICAL_DATABASE_URL'],
+                             engine_options=engine_options or {})
+        self.url_adapter = app.url_map.bind('')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            response = await self.handle(scope)
+            if response is not None:
+                status, headers, body = response
+                await send({'type': 'http.response.start', 'status': status,
+                            'headers': headers})
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in (self.db.engines or {}).values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def match(self, environ):
+        try:
+            endpoint, view_args = self.url_adapter.match(
+                environ['PATH_INFO'], method='GET')
+        except (HTTPException, RoutingException):
+            return None, None
+        return handlers.get(endpoint), (endpoint, view_args)
+
+    async def handle(self, scope):
+        """Serve a read request, or return ``None`` if the request has to be
+        handled by the Flask application.
+
+        The request goes through the request hooks and error handlers of
+        the Flask application, as requests that the application serves do,
+        so that admission control, instrumentation, profiling, CORS and
+        compression apply to it.
+        """
+        environ = build_environ(scope)
+        handler, route = self.match(environ)
+        if handler is None:
+            return None
+        endpoint, view_args = route
+        app = self.app
+        with app.request_context(environ):
+            if 'fields' in request.args or 'ids' in request.args:
+                # sparse fieldsets and lookups by id are served by the Flask
+                # application
+                return None
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await self.dispatch(handler, view_args)
+                except Exception as error:
+                    rv = app.handle_user_exception(error)
+                response = app.finalize_request(rv)
+            except Exception as error:
+                response = app.handle_exception(error)
+            headers = [(name.lower().encode('latin1'), value.encode('latin1'))
+                       for name, value in response.headers.items()]
+            return response.status_code, headers, response.get_data()
+
+    async def dispatch(self, handler, view_args):
+        """Run the coroutine of a read endpoint and return its response."""
+        f, schema, pagination_schema, statement_timeout, normalized_schema = \
+            handler
+        g.statement_timeout = statement_timeout
+        if pagination_schema is not None:
+            try:
+                view_args['pagination'] = pagination_schema().load(
+                    request.args, unknown=EXCLUDE)
+            except ValidationError as error:
+                raise apifairy.exceptions.ValidationError(
+                    400, {'query': error.messages})
+            if view_args['pagination'].pop('format', None) == \
+                    'normalized' and normalized_schema is not None:
+                schema = normalized_schema
+        async with self.db.Session() as session:
+            user = await verify_token(session)
+            rv = await f(session, user, **view_args)
+            return encode(schema, rv).response()
+
+
+def create_asgi_app(config_class=Config):
+    # the engine options of the configuration are used without the pool
+    # class that instruments the synchronous engine
+    return AsyncReads(create_app(config_class),
+                      engine_options=config_class.ALCHEMICAL_ENGINE_OPTIONS)
@@ -1,15 +1,18 @@
-from flask import current_app
+from flask import current_app, g
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth
 from werkzeug.exceptions import Unauthorized, Forbidden
 
 from api.app import db
-from api.models import User
+from api.instrumentation import timed
+from api.dates import naive_utcnow
+from api.models import Token, User
 
 basic_auth = HTTPBasicAuth()
 token_auth = HTTPTokenAuth()
 
 
 @basic_auth.verify_password
+@timed('auth')
 def verify_password(username, password):
     if username and password:
         user = db.session.scalar(User.select().filter_by(username=username))
@@ -30,14 +33,26 @@ def basic_auth_error(status=401):
 
 
 @token_auth.verify_token
+@timed('auth')
 def verify_token(access_token):
     if current_app.config['DISABLE_AUTH']:
         user = db.session.get(User, 1)
         user.ping()
         return user
-    if access_token:
+    if not access_token:
+        return None
+    tokens = g.get('batch_tokens')
+    if tokens is None:
         return User.verify_access_token(access_token)
 
+    # batches verify each token once for all their requests, but a token
+    # that is revoked or expires during the batch is rejected
+    if access_token not in tokens:
+        tokens[access_token] = Token.verify_access_token(access_token)
+    token = tokens[access_token]
+    if token is not None and token.access_expiration > naive_utcnow():
+        return token.user
+
 
 @token_auth.error_handler
 def token_auth_error(status=401):
@@ -0,0 +1,103 @@
+from functools import wraps
+import sys
+from urllib.parse import urlsplit
+
+from apifairy import authenticate, body, response
+from flask import Blueprint, abort, current_app, g, request
+from werkzeug.exceptions import InternalServerError
+from werkzeug.test import EnvironBuilder
+
+from api import db
+from api.auth import token_auth
+from api.encoding import EncodedJSON
+from api.schemas import BatchSchema, BatchResponsesSchema
+
+batch = Blueprint('batch', __name__)
+batch_schema = BatchSchema()
+batch_responses_schema = BatchResponsesSchema()
+
+# request globals that the requests of a batch share with it
+SHARED_GLOBALS = ['alchemical_session', 'batch_tokens', 'queries', 'timings']
+
+
+def dispatch(method, url, json=None):
+    """Dispatch a request of a batch and return its response.
+
+    The request runs in its own application context, so that the state that
+    the request hooks keep in ``g`` is not mixed with that of the batch, but
+    it uses the database session and the verified tokens of the batch. The
+    request hooks of the application are not invoked. Errors that the
+    application does not handle are returned as a 500 response.
+    """
+    app = current_app._get_current_object()
+    parts = urlsplit(url)
+    headers = {}
+    if 'Authorization' in request.headers:
+        headers['Authorization'] = request.headers['Authorization']
+    environ = EnvironBuilder(
+        path=parts.path, base_url=request.url_root,
+        query_string=parts.query, method=method, headers=headers,
+        json=json, environ_base={'REMOTE_ADDR': request.remote_addr},
+    ).get_environ()
+    shared = {name: g.get(name) for name in SHARED_GLOBALS if name in g}
+    with app.app_context():
+        g.__dict__.update(shared)
+        try:
+            with app.request_context(environ):
+                try:
+                    if request.blueprint == 'batch':
+                        abort(400)
+                    rv = app.dispatch_request()
+                except Exception as error:
+                    try:
+                        rv = app.handle_user_exception(error)
+                    except Exception:
+                        app.log_exception(sys.exc_info())
+                        db.session.rollback()
+                        rv = app.handle_user_exception(InternalServerError(
+                            original_exception=error))
+                return app.make_response(rv)
+        finally:
+            # the database session is closed by the batch
+            g.pop('alchemical_session', None)
+
+
+def share_tokens(f):
+    """Keep the tokens verified by a batch for its requests."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        g.batch_tokens = {}
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('batch_tokens', None)
+    return wrapper
+
+
+@batch.route('/batch', methods=['POST'])
+@share_tokens
+@authenticate(token_auth)
+@body(batch_schema)
+@response(batch_responses_schema)
+def run(args):
+    """Send several requests at once
+
+    The requests are dispatched in order, with the authentication of the
+    batch, and their responses are returned in the same order. Each request
+    is given as its method, its URL, which must be in the API, and its JSON
+    body, if any. A failed request does not stop the batch.
+    """
+    db.session  # the session is created here to be shared by the requests
+    responses = []
+    for sub_request in args['requests']:
+        rv = dispatch(sub_request['method'], sub_request['url'],
+                      json=sub_request.get('body'))
+        if rv.is_json:
+            data = rv.get_data()
+        elif rv.status_code == 204 or not rv.get_data():
+            data = b'null'
+        else:
+            data = current_app.json.dumps_bytes(rv.get_data(as_text=True))
+        responses.append(b'{"body":%s,"status":%d}' % (
+            data.rstrip(), rv.status_code))
+    return EncodedJSON(b'{"responses":[' + b','.join(responses) + b']}')
@@ -0,0 +1,26 @@
+import click
+from werkzeug.utils import import_string
+
+
+class LazyGroup(click.Group):
+    """Command group that imports the blueprint with its commands the first
+    time it is used.
+
+    This is used for blueprints that only have commands, so that the server
+    does not have to import them.
+    """
+    def __init__(self, name, import_name, **kwargs):
+        super().__init__(name, **kwargs)
+        self.import_name = import_name
+        self.group = None
+
+    def load(self):
+        if self.group is None:
+            self.group = import_string(self.import_name).cli
+        return self.group
+
+    def list_commands(self, ctx):
+        return self.load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.load().get_command(ctx, name)
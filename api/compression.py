@@ -0,0 +1,122 @@
+from collections import OrderedDict
+import gzip
+from hashlib import blake2b
+from threading import Lock
+
+from flask import current_app, request
+
+from api.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ['application/json', 'text/plain', 'text/html']
+
+
+def compress_gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def compress_zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# encodings in order of preference, with the configuration of their levels
+ENCODINGS = {
+    'zstd': (compress_zstd, 'COMPRESS_ZSTD_LEVEL'),
+    'br': (compress_brotli, 'COMPRESS_BROTLI_LEVEL'),
+    'gzip': (compress_gzip, 'COMPRESS_GZIP_LEVEL'),
+}
+AVAILABLE = [encoding for encoding in ENCODINGS
+             if (encoding != 'br' or brotli is not None) and
+             (encoding != 'zstd' or zstandard is not None)]
+
+
+class Compression:
+    """Compress responses with the best encoding accepted by the client.
+
+    The encodings are zstd and brotli, when their packages are installed,
+    and gzip. Only responses of at least ``COMPRESS_MIN_SIZE`` bytes are
+    compressed. The most recently compressed bodies are kept in a cache of
+    ``COMPRESS_CACHE_SIZE`` entries, indexed by a digest of the uncompressed
+    body, so that popular responses are not compressed again.
+    """
+    def __init__(self, app=None):
+        self.lock = Lock()
+        self.cache = OrderedDict()
+        if app:  # pragma: no cover
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.compress_response)
+
+    @staticmethod
+    def negotiate(length, mimetype):
+        """Return the encoding to use for a response to the current request,
+        or ``None`` if the response should not be compressed."""
+        config = current_app.config
+        if not config['COMPRESSION'] or \
+                length < config['COMPRESS_MIN_SIZE'] or \
+                mimetype not in COMPRESSIBLE_TYPES:
+            return None
+        return request.accept_encodings.best_match(AVAILABLE)
+
+    def compress(self, data, encoding):
+        """Compress data, or return it from the cache if it was compressed
+        recently."""
+        compressor, level_option = ENCODINGS[encoding]
+        level = current_app.config[level_option]
+        size = current_app.config['COMPRESS_CACHE_SIZE']
+        if not size:
+            return compressor(data, level)
+        key = (encoding, level, blake2b(data, digest_size=16).digest())
+        with self.lock:
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                self.cache.move_to_end(key)
+        if compressed is not None:
+            metrics.inc('compression_cache_total', result='hit')
+            return compressed
+        metrics.inc('compression_cache_total', result='miss')
+        compressed = compressor(data, level)
+        with self.lock:
+            self.cache[key] = compressed
+            while len(self.cache) > size:
+                self.cache.popitem(last=False)
+        return compressed
+
+    def compress_body(self, data, mimetype):
+        """Return the body of a response to the current request and its
+        content encoding, which is ``None`` if it was not compressed."""
+        encoding = self.negotiate(len(data), mimetype)
+        if encoding is None:
+            return data, None
+        metrics.inc('compressed_responses_total', encoding=encoding)
+        return self.compress(data, encoding), encoding
+
+    def compress_response(self, response):
+        if not current_app.config['COMPRESSION'] or \
+                response.direct_passthrough or response.is_streamed or \
+                'Content-Encoding' in response.headers or \
+                response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        data, encoding = self.compress_body(response.get_data(),
+                                            response.mimetype)
+        if encoding is not None:
+            response.set_data(data)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,134 @@
+from time import perf_counter
+
+from flask import current_app, g, has_app_context
+import sqlalchemy as sa
+
+from api.metrics import metrics
+
+# options that are only accepted by queue based connection pools
+QUEUE_POOL_OPTIONS = ['pool_size', 'max_overflow', 'pool_timeout']
+
+# number of SQLite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_STEPS = 1000
+
+
+class TimedQueuePool(sa.pool.QueuePool):
+    """Queue pool that records how long each connection checkout waited."""
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = perf_counter() - start
+            metrics.observe('db_pool_wait_seconds', wait)
+            if has_app_context():
+                g.pool_wait = g.get('pool_wait', 0.0) + wait
+
+
+def engine_options(config):
+    """Return the engine options to use for the configured database URL.
+
+    Queue pools are replaced with a timed subclass, and pool sizing options
+    are discarded for databases that do not use a queue pool, such as
+    in-memory SQLite.
+    """
+    options = dict(config['ALCHEMICAL_ENGINE_OPTIONS'])
+    url = config['ALCHEMICAL_DATABASE_URL']
+    if url.startswith('postgres://'):  # pragma: no cover
+        url = 'postgresql://' + url[len('postgres://'):]
+    url = sa.engine.make_url(url)
+    pool_class = options.get('poolclass') or \
+        url.get_dialect().get_pool_class(url)
+    if issubclass(pool_class, sa.pool.QueuePool):
+        options.setdefault('poolclass', TimedQueuePool)
+    else:
+        for option in QUEUE_POOL_OPTIONS:
+            options.pop(option, None)
+    return options
+
+
+def collect_pool_metrics(registry):
+    """Report the connection pool usage of the current process."""
+    from api.app import db
+    # engines that have not been created yet have no connections to report
+    for name, engine in (getattr(db, 'engines', None) or {}).items():
+        pool = engine.pool
+        if isinstance(pool, sa.pool.QueuePool):
+            bind = name or 'default'
+            registry.set('db_pool_size', pool.size(), bind=bind)
+            registry.set('db_pool_checked_out', pool.checkedout(), bind=bind)
+            registry.set('db_pool_overflow', max(pool.overflow(), 0),
+                         bind=bind)
+
+
+metrics.collectors.append(collect_pool_metrics)
+
+
+# the configuration of the timeout of endpoints that return large collections
+COLLECTION_STATEMENT_TIMEOUT = 'DATABASE_COLLECTION_STATEMENT_TIMEOUT'
+
+
+def current_statement_timeout():
+    """Return the statement timeout in milliseconds, or 0 for no limit.
+
+    The timeout of an endpoint, given in milliseconds or as the name of a
+    configuration value, can only be stricter than the global limit.
+    """
+    if not has_app_context():
+        return 0
+    default = current_app.config['DATABASE_STATEMENT_TIMEOUT']
+    timeout = g.get('statement_timeout')
+    if timeout is None:
+        return default
+    if isinstance(timeout, str):
+        timeout = current_app.config[timeout]
+    if default and (not timeout or timeout > default):
+        return default
+    return timeout
+
+
+def is_statement_timeout(error):
+    """Check if a database error was caused by a statement timeout."""
+    orig = getattr(error, 'orig', None)
+    if getattr(orig, 'pgcode', None) == '57014' or \
+            getattr(orig, 'sqlstate', None) == '57014':  # pragma: no cover
+        return True
+    return str(orig) == 'interrupted'
+
+
+def is_unique_violation(error):
+    """Check if a database error was caused by a unique constraint."""
+    orig = getattr(error, 'orig', None)
+    code = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    if code is not None:  # pragma: no cover
+        return code == '23505'
+    if getattr(orig, 'args', None) and \
+            orig.args[0] == 1062:  # pragma: no cover
+        return True  # the duplicate entry error of MySQL
+    return str(orig).startswith('UNIQUE constraint failed')
+
+
+@sa.event.listens_for(sa.Engine, 'before_cursor_execute')
+def apply_statement_timeout(conn, cursor, statement, parameters, context,
+                            executemany):
+    timeout = current_statement_timeout()
+    if conn.dialect.name == 'postgresql':  # pragma: no cover
+        if conn.info.get('statement_timeout', 0) != timeout:
+            cursor.execute(f'SET statement_timeout = {int(timeout)}')
+            conn.info['statement_timeout'] = timeout
+    elif conn.dialect.name == 'sqlite' and not conn.dialect.is_async:
+        # the asyncio driver does not expose progress handlers
+        if timeout:
+            deadline = perf_counter() + timeout / 1000
+            cursor.connection.set_progress_handler(
+                lambda: perf_counter() > deadline, SQLITE_PROGRESS_STEPS)
+            conn.info['statement_timeout'] = timeout
+        elif conn.info.pop('statement_timeout', None):
+            cursor.connection.set_progress_handler(None, 0)
+
+
+@sa.event.listens_for(sa.Engine, 'rollback')
+def reset_statement_timeout(conn):
+    # a rollback in Postgres also reverts a SET issued in the transaction
+    if conn.dialect.name == 'postgresql':  # pragma: no cover
+        conn.info.pop('statement_timeout', None)
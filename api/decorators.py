@@ -1,63 +1,214 @@
 from functools import wraps
-from flask import abort
+from flask import abort, g
 from apifairy import arguments, response
+from marshmallow import fields as ma_fields
 import sqlalchemy as sqla
+from sqlalchemy import orm as so
 from api.app import db
-from api.schemas import StringPaginationSchema, PaginatedCollection
+from api.encoding import encode
+from api.schemas import StringPaginationSchema, PaginatedCollection, \
+    SelectedCollection
+
+
+def field_options(schema, fields):
+    """Return the loader options that only load the columns needed to dump
+    the given fields with a SQLAlchemy schema.
+
+    Relationships of nested fields that are not dumped are only loaded with
+    their keys, in case the query loads them eagerly.
+    """
+    model = schema.opts.model
+    mapper = sqla.inspect(model)
+    requested = {}
+    for name in fields:
+        name, _, nested_name = name.partition('.')
+        requested.setdefault(name, [])
+        if nested_name:
+            requested[name].append(nested_name)
+
+    columns = set()
+    options = []
+    field_columns = getattr(schema, 'field_columns', {})
+    for name, field in schema.dump_fields.items():
+        attribute = field.attribute or name
+        if isinstance(field, ma_fields.Nested):
+            relationship = mapper.relationships[attribute]
+            columns.update(column.key
+                           for column in relationship.local_columns)
+            if name not in requested:
+                target = relationship.mapper
+                options.append(so.defaultload(
+                    getattr(model, attribute)).load_only(
+                        *[getattr(target.class_, column.key)
+                          for column in target.primary_key]))
+            elif requested[name]:
+                options.append(so.defaultload(
+                    getattr(model, attribute)).options(
+                        *field_options(field.schema, requested[name])))
+        elif name in requested:
+            columns.update(field_columns.get(name, [attribute]))
+    return [so.load_only(*[getattr(model, column)
+                           for column in sorted(columns)])] + options
+
+
+def sparse_fields(schema, fields_schema):
+    """Return only the fields of the response given in the ``fields``
+    argument of ``fields_schema``.
+
+    The decorated function receives the loader options that load only the
+    columns needed by these fields in the ``options`` keyword argument.
+    """
+    def inner(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            args = list(args)
+            fields = args.pop(-1).get('fields')
+            if not fields:
+                return f(*args, options=[], **kwargs)
+            rv = f(*args, options=field_options(schema, fields), **kwargs)
+            return encode(schema.__class__(only=fields, many=schema.many), rv)
+
+        return arguments(fields_schema)(wrapper)
+
+    return inner
+
+
+def paginate(session, select_query, pagination, max_limit=25,
+             order_by=None, order_direction='asc'):
+    """Return a page of the results of a query, with its pagination
+    details."""
+    # counts are issued without the ordering, which they do not need
+    count = session.scalar(sqla.select(
+        sqla.func.count()).select_from(select_query.subquery()))
+    if order_by is not None:
+        o = order_by.desc() if order_direction == 'desc' else order_by
+        ordered_query = select_query.order_by(o)
+    else:
+        ordered_query = select_query
+
+    limit = pagination.get('limit', max_limit)
+    offset = pagination.get('offset')
+    after = pagination.get('after')
+    if limit > max_limit:
+        limit = max_limit
+    if after is not None:
+        if offset is not None or order_by is None:  # pragma: no cover
+            abort(400)
+        if order_direction != 'desc':
+            order_condition = order_by > after
+            offset_condition = order_by <= after
+        else:
+            order_condition = order_by < after
+            offset_condition = order_by >= after
+        query = ordered_query.limit(limit).filter(order_condition)
+        offset = session.scalar(sqla.select(
+            sqla.func.count()).select_from(select_query.filter(
+                offset_condition).subquery()))
+    else:
+        if offset is None:
+            offset = 0
+        if offset < 0 or (count > 0 and offset >= count) or limit <= 0:
+            abort(400)
+
+        query = ordered_query.limit(limit).offset(offset)
+
+    data = session.scalars(query).all()
+    return {'data': data, 'pagination': {
+        'offset': offset,
+        'limit': limit,
+        'count': len(data),
+        'total': count,
+    }}
+
+
+def get_by_ids(session, select_query, model, ids, schema):
+    """Return the results of a query that have the given ids, encoded with
+    a selected collection schema in the order of the ids and with ``null``
+    for the ids that are not found."""
+    items = {item.id: item for item in session.scalars(
+        select_query.where(model.id.in_(ids)))}
+    return encode(schema, {'data': [items.get(id) for id in ids]})
 
 
 def paginated_response(schema, max_limit=25, order_by=None,
                        order_direction='asc',
-                       pagination_schema=StringPaginationSchema):
+                       pagination_schema=StringPaginationSchema,
+                       normalized_schema=None, includes_schema=None):
+    """Return a page of the results of the query returned by the decorated
+    function.
+
+    When ``normalized_schema`` is given, the ``format`` argument of
+    ``pagination_schema`` selects it in place of ``schema`` to dump the
+    items, with ``includes_schema`` for the ``includes`` of the page. The
+    ``fields`` argument, when the pagination schema has it, selects the
+    fields of the items that are returned. The ``ids`` argument returns the
+    items with the given ids instead of a page, in the order of the ids and
+    with ``null`` for those that are not found. All the possible responses
+    are documented as alternatives.
+    """
+    paginated_schema = PaginatedCollection(
+        schema, pagination_schema=pagination_schema)()
+    response_schemas = {None: (paginated_schema, SelectedCollection(schema)())}
+    if normalized_schema is not None:
+        response_schemas['normalized'] = (
+            PaginatedCollection(normalized_schema,
+                                pagination_schema=pagination_schema,
+                                includes_schema=includes_schema)(),
+            SelectedCollection(normalized_schema,
+                               includes_schema=includes_schema)())
+
     def inner(f):
         @wraps(f)
-        def paginate(*args, **kwargs):
+        def paginated(*args, **kwargs):
             args = list(args)
             pagination = args.pop(-1)
+            page_schema, selected_schema = response_schemas.get(
+                pagination.pop('format', None), response_schemas[None])
+            fields = pagination.pop('fields', None)
+            ids = pagination.pop('ids', None)
             select_query = f(*args, **kwargs)
-            if order_by is not None:
-                o = order_by.desc() if order_direction == 'desc' else order_by
-                select_query = select_query.order_by(o)
-
-            count = db.session.scalar(sqla.select(
-                sqla.func.count()).select_from(select_query.subquery()))
-
-            limit = pagination.get('limit', max_limit)
-            offset = pagination.get('offset')
-            after = pagination.get('after')
-            if limit > max_limit:
-                limit = max_limit
-            if after is not None:
-                if offset is not None or order_by is None:  # pragma: no cover
-                    abort(400)
-                if order_direction != 'desc':
-                    order_condition = order_by > after
-                    offset_condition = order_by <= after
-                else:
-                    order_condition = order_by < after
-                    offset_condition = order_by >= after
-                query = select_query.limit(limit).filter(order_condition)
-                offset = db.session.scalar(sqla.select(
-                    sqla.func.count()).select_from(select_query.filter(
-                        offset_condition).subquery()))
-            else:
-                if offset is None:
-                    offset = 0
-                if offset < 0 or (count > 0 and offset >= count) or limit <= 0:
-                    abort(400)
-
-                query = select_query.limit(limit).offset(offset)
-
-            data = db.session.scalars(query).all()
-            return {'data': data, 'pagination': {
-                'offset': offset,
-                'limit': limit,
-                'count': len(data),
-                'total': count,
-            }}
-
-        # wrap with APIFairy's arguments and response decorators
-        return arguments(pagination_schema)(response(PaginatedCollection(
-            schema, pagination_schema=pagination_schema))(paginate))
+            if fields:
+                select_query = select_query.options(
+                    *field_options(schema, fields))
+                only = ['data.' + name for name in fields]
+                page_schema = page_schema.__class__(only=['pagination'] + only)
+                selected_schema = selected_schema.__class__(only=only)
+            if ids:
+                return get_by_ids(db.session, select_query,
+                                  schema.opts.model, ids, selected_schema)
+
+            page = paginate(db.session, select_query, pagination,
+                            max_limit=max_limit, order_by=order_by,
+                            order_direction=order_direction)
+            if page_schema is paginated_schema:
+                return page
+            return encode(page_schema, page)
+
+        # wrap with APIFairy's arguments and response decorators, and
+        # document all the response schemas as alternatives
+        wrapper = arguments(pagination_schema)(response(paginated_schema)(
+            paginated))
+        wrapper._spec['response'] = {'oneOf': [
+            response_schema for schemas in response_schemas.values()
+            for response_schema in schemas]}
+        return wrapper
+
+    return inner
+
+
+def statement_timeout(milliseconds):
+    """Set a database statement timeout for an endpoint, in milliseconds or
+    as the name of a configuration value."""
+    def inner(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            previous = g.get('statement_timeout')
+            g.statement_timeout = milliseconds
+            try:
+                return f(*args, **kwargs)
+            finally:
+                g.statement_timeout = previous
+
+        return wrapper
 
     return inner
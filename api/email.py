@@ -1,22 +1,313 @@
-from threading import Thread
+import atexit
+from datetime import timedelta
+import os
+from queue import Empty, Full, Queue
+import random
+import smtplib
+from threading import Lock, Thread
+from time import monotonic, sleep
 
-from flask import current_app, render_template
-from flask_mail import Message
+import click
+from flask import Blueprint, current_app, render_template
+from flask_mail import Connection, Message
+from werkzeug.exceptions import ServiceUnavailable
 
-from api.app import mail
+from api.app import db
+from api.dates import naive_utcnow
+from api.metrics import metrics
+from api.models import Outbox
 
+outbox = Blueprint('outbox', __name__, cli_group='mail')
 
-def send_async_email(app, to, subject, template, **kwargs):
-    with app.app_context():  # pragma: no cover
-        msg = Message(subject, recipients=[to])
-        msg.body = render_template(template + '.txt', **kwargs)
-        msg.html = render_template(template + '.html', **kwargs)
-        mail.send(msg)
 
+class EmailQueueFull(ServiceUnavailable):
+    description = 'Too many emails are waiting to be sent. Try again later.'
 
-def send_email(to, subject, template, **kwargs):  # pragma: no cover
-    app = current_app._get_current_object()
-    thread = Thread(target=send_async_email, args=(app, to, subject, template),
-                    kwargs=kwargs)
-    thread.start()
-    return thread
+
+class SMTPConnection(Connection):
+    """Connection to the mail server that gives up on a server that does not
+    respond within ``MAIL_TIMEOUT`` seconds."""
+    def __init__(self, state, timeout):
+        super().__init__(state)
+        self.timeout = timeout
+
+    def configure_host(self):
+        smtp_class = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = smtp_class(self.mail.server, self.mail.port,
+                          timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+def connect():
+    """Return a connection to the mail server of the application."""
+    return SMTPConnection(current_app.extensions['mail'],
+                          current_app.config['MAIL_TIMEOUT'])
+
+
+class EmailWorker(Thread):
+    """Thread that sends queued emails over a persistent SMTP connection.
+
+    The connection is closed when the queue has been empty for
+    ``MAIL_IDLE_TIMEOUT`` seconds, and reopened when more emails arrive.
+    """
+    def __init__(self, queue):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.app = None
+        self.connection = None
+
+    def run(self):
+        running = True
+        while running:
+            timeout = self.app.config['MAIL_IDLE_TIMEOUT'] \
+                if self.connection else None
+            try:
+                batch = [self.queue.get(timeout=timeout)]
+            except Empty:
+                self.disconnect()
+                continue
+            batch_size = batch[0][0].config['MAIL_BATCH_SIZE'] \
+                if batch[0] else 1
+            # a None item asks the worker to exit, so it ends the batch
+            while len(batch) < batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            metrics.set('email_queue_depth', self.queue.qsize())
+            for item in batch:
+                if item is None:
+                    running = False
+                else:
+                    app, msg = item
+                    with app.app_context():
+                        self.deliver(app, msg)
+                self.queue.task_done()
+        self.disconnect()
+
+    def connect(self, app):
+        if self.app is not app:
+            self.disconnect()
+        if self.connection is None:
+            self.app = app
+            self.connection = connect()
+            self.connection.__enter__()
+        return self.connection
+
+    def disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+    def deliver(self, app, msg):
+        # a connection that has been idle may have been closed by the
+        # server, so sending is retried once with a new connection
+        for retry in [True, False]:
+            try:
+                self.connect(app).send(msg)
+                metrics.inc('emails_total', status='sent')
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self.disconnect()
+                if retry:
+                    continue
+                app.logger.exception('Could not send email')
+            except Exception:
+                self.disconnect()
+                app.logger.exception('Could not send email')
+            metrics.inc('emails_total', status='failed')
+            return
+
+
+class EmailQueue:
+    """Bounded queue of emails, sent by a pool of worker threads.
+
+    The queue holds up to ``MAIL_QUEUE_SIZE`` emails. When it is full, the
+    ``MAIL_QUEUE_POLICY`` configuration decides if the request waits for
+    space for up to ``MAIL_QUEUE_TIMEOUT`` seconds (``block``), if the email
+    is discarded (``drop``), or if the request fails with a 503 error
+    (``reject``, also used when a blocked request times out).
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.queue = None
+        self.workers = []
+        self.pid = None
+        self.logger = None
+        self.shutdown_timeout = 0
+
+    def start(self):
+        # worker threads do not survive a fork, so each process starts its
+        # own pool the first time it sends an email
+        with self.lock:
+            if self.pid != os.getpid():
+                config = current_app.config
+                self.queue = Queue(maxsize=config['MAIL_QUEUE_SIZE'])
+                self.workers = [EmailWorker(self.queue)
+                                for _ in range(config['MAIL_WORKERS'])]
+                for worker in self.workers:
+                    worker.start()
+                self.pid = os.getpid()
+                # shutdown runs outside of the application context
+                self.logger = current_app.logger
+                self.shutdown_timeout = config['MAIL_SHUTDOWN_TIMEOUT']
+        return self.queue
+
+    def put(self, msg):
+        """Queue an email. Return ``False`` if the email was dropped."""
+        queue = self.start()
+        config = current_app.config
+        policy = config['MAIL_QUEUE_POLICY']
+        try:
+            queue.put((current_app._get_current_object(), msg),
+                      block=policy == 'block',
+                      timeout=config['MAIL_QUEUE_TIMEOUT'])
+        except Full:
+            if policy == 'drop':
+                metrics.inc('emails_total', status='dropped')
+                current_app.logger.warning(
+                    'Email queue is full, dropped email to %s',
+                    ', '.join(msg.recipients))
+                return False
+            metrics.inc('emails_total', status='rejected')
+            raise EmailQueueFull()
+        metrics.set('email_queue_depth', queue.qsize())
+        return True
+
+    def join(self):
+        """Wait until all the queued emails have been handled."""
+        if self.pid == os.getpid():
+            self.queue.join()
+
+    def shutdown(self):
+        """Send the queued emails and stop the worker threads.
+
+        The emails that are not sent within ``MAIL_SHUTDOWN_TIMEOUT`` seconds
+        are logged and discarded.
+        """
+        with self.lock:
+            if self.pid == os.getpid():
+                deadline = monotonic() + self.shutdown_timeout
+                try:
+                    for worker in self.workers:
+                        self.queue.put(None, timeout=max(
+                            deadline - monotonic(), 0))
+                except Full:
+                    pass
+                for worker in self.workers:
+                    worker.join(timeout=max(deadline - monotonic(), 0))
+                self.discard()
+            self.queue = None
+            self.workers = []
+            self.pid = None
+
+    def discard(self):
+        """Remove the emails that are still queued and log them."""
+        recipients = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                recipients += item[1].recipients
+        if recipients:
+            metrics.inc('emails_total', len(recipients), status='dropped')
+            self.logger.error('Email queue shut down with %d unsent emails '
+                              'to %s', len(recipients), ', '.join(recipients))
+
+
+email_queue = EmailQueue()
+# emails that are still queued are sent before the process exits
+atexit.register(email_queue.shutdown)
+
+
+def send_email(to, subject, template, **kwargs):
+    body = render_template(template + '.txt', **kwargs)
+    html = render_template(template + '.html', **kwargs)
+    if current_app.config['MAIL_OUTBOX']:
+        # the email is committed along with the rest of the request, and
+        # sent later by the "flask mail worker" command
+        db.session.add(Outbox(recipient=to, subject=subject, body=body,
+                              html=html))
+        return True
+    msg = Message(subject, recipients=[to], body=body, html=html)
+    return email_queue.put(msg)
+
+
+def retry_later(email, error):
+    """Schedule another attempt to send an email from the outbox.
+
+    The delay doubles after each attempt, with random jitter. After
+    ``MAIL_OUTBOX_MAX_ATTEMPTS`` attempts the email is kept in the outbox,
+    but it is not attempted again.
+    """
+    config = current_app.config
+    email.attempts += 1
+    email.last_error = str(error)[:256]
+    if email.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+        email.next_attempt = None
+        current_app.logger.error('Giving up sending email %d to %s: %s',
+                                 email.id, email.recipient, error)
+    else:
+        delay = config['MAIL_OUTBOX_RETRY_DELAY'] * 2 ** (email.attempts - 1)
+        email.next_attempt = naive_utcnow() + timedelta(
+            seconds=random.uniform(delay / 2, delay))
+    metrics.inc('emails_total', status='failed')
+
+
+def deliver_outbox(batch_size):
+    """Send a batch of due emails from the outbox over one connection.
+
+    Sent emails are deleted from the outbox. Return the number of emails
+    that were attempted.
+    """
+    emails = db.session.scalars(Outbox.select().where(
+        Outbox.next_attempt <= naive_utcnow()).order_by(
+            Outbox.next_attempt).limit(batch_size).with_for_update(
+                skip_locked=True)).all()
+    if not emails:
+        return 0
+    pending = list(emails)
+    try:
+        with connect() as connection:
+            while pending:
+                email = pending[0]
+                try:
+                    connection.send(Message(
+                        email.subject, recipients=[email.recipient],
+                        body=email.body, html=email.html))
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    # the connection is lost, so the batch is abandoned
+                    raise
+                except Exception as error:
+                    retry_later(email, error)
+                else:
+                    db.session.delete(email)
+                    metrics.inc('emails_total', status='sent')
+                pending.pop(0)
+    except Exception as error:
+        for email in pending:
+            retry_later(email, error)
+    db.session.commit()
+    return len(emails)
+
+
+@outbox.cli.command()
+@click.option('--once', is_flag=True,
+              help='Exit when there are no emails left to send.')
+def worker(once):  # pragma: no cover
+    """Send the emails in the outbox."""
+    while True:
+        if deliver_outbox(current_app.config['MAIL_BATCH_SIZE']) == 0:
+            if once:
+                break
+            sleep(current_app.config['MAIL_OUTBOX_POLL_INTERVAL'])
@@ -0,0 +1,76 @@
+"""JSON encoding of responses.
+
+The ``orjson`` package is used to encode JSON when it is installed, with
+the standard library as a fallback. Handlers and caches that already have
+the encoded JSON of a response can return it as ``EncodedJSON``, which the
+schemas send without encoding it again.
+"""
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:  # pragma: no branch
+    # dates and dataclasses go through the default function, so that they
+    # are encoded as with the standard library
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | \
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class JSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when it is installed.
+
+    The output is equivalent to that of Flask's default provider, but
+    non-ASCII characters are encoded as UTF-8 instead of being escaped.
+    Calls with options that orjson does not support, and objects that it
+    cannot encode, such as integers larger than 64 bits, are handled by the
+    standard library.
+    """
+    def dumps_bytes(self, obj, indent=False):
+        """Serialize data as JSON to UTF-8 bytes."""
+        if orjson is not None:  # pragma: no branch
+            option = ORJSON_OPTIONS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=self.default, option=option)
+            except TypeError:
+                pass
+        if indent:
+            return super().dumps(obj, indent=2).encode()
+        return super().dumps(obj, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs or orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or \
+            self.compact is False
+        return self._app.response_class(
+            self.dumps_bytes(obj, indent=indent) + b'\n',
+            mimetype=self.mimetype)
+
+
+class EncodedJSON:
+    """JSON data that is already encoded, as UTF-8 bytes."""
+    __slots__ = ['data']
+
+    def __init__(self, data):
+        self.data = data
+
+    def response(self):
+        return current_app.response_class(
+            self.data, mimetype=current_app.json.mimetype)
+
+
+def encode(schema, obj):
+    """Dump an object with a schema and encode the result as JSON."""
+    return EncodedJSON(current_app.json.dumps_bytes(schema.dump(obj)))
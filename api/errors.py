@@ -1,8 +1,11 @@
 from flask import Blueprint, current_app
-from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from werkzeug.exceptions import HTTPException, InternalServerError
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from werkzeug.exceptions import HTTPException, InternalServerError, \
+    ServiceUnavailable
 
-from api.app import apifairy
+from api.app import apifairy, db
+from api.database import is_statement_timeout, is_unique_violation
+from api.schemas import UserSchema
 
 errors = Blueprint('errors', __name__)
 
@@ -16,15 +19,44 @@ def http_error(error):
     }, error.code
 
 
+def unique_violation(error):
+    """Return the user field and the error message of a violation of a
+    unique index, or ``None`` for other integrity errors."""
+    # the column is named as "users.email" by SQLite, and by the index name
+    # in the errors of other databases
+    if not is_unique_violation(error):
+        return None
+    message = str(error.orig)
+    for name, text in UserSchema.unique_fields.items():
+        if f'users.{name}' in message or f'ix_users_{name}' in message:
+            return name, text
+
+
 @errors.app_errorhandler(IntegrityError)
-def sqlalchemy_integrity_error(error):  # pragma: no cover
-    return {
+def sqlalchemy_integrity_error(error):
+    violation = unique_violation(error)
+    if violation is not None:
+        db.session.rollback()
+        name, text = violation
+        return validation_error(400, {'json': {name: [text]}})
+    return {  # pragma: no cover
         'code': 400,
         'message': 'Database integrity error',
         'description': str(error.orig),
     }, 400
 
 
+@errors.app_errorhandler(OperationalError)
+def sqlalchemy_operational_error(error):
+    if not is_statement_timeout(error):  # pragma: no cover
+        return sqlalchemy_error(error)
+    return {
+        'code': ServiceUnavailable.code,
+        'message': ServiceUnavailable().name,
+        'description': 'The database took too long to handle this request.',
+    }, ServiceUnavailable.code
+
+
 @errors.app_errorhandler(SQLAlchemyError)
 def sqlalchemy_error(error):  # pragma: no cover
     if current_app.config['DEBUG'] is True:
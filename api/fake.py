@@ -1,46 +1,177 @@
+from itertools import accumulate
+from multiprocessing import Pool
+import os
 import random
 import click
 from flask import Blueprint
-from faker import Faker
+import sqlalchemy as sa
 from api.app import db
-from api.models import User, Post
+from api.models import User, Post, followers
 
 fake = Blueprint('fake', __name__)
-faker = Faker()
+faker = None
+
+CHUNK_SIZE = 10000
+
+
+def get_faker():
+    """Return the Faker instance, which is created on first use because
+    importing the faker package is slow."""
+    global faker
+    if faker is None:
+        from faker import Faker
+        faker = Faker()
+    return faker
+
+
+def zipf_weights(num, exponent=1.0):
+    """Return cumulative weights that make lower ranks more popular."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, num + 1)))
+
+
+def follower_edges(rnd, user_ids, mean_follows=5, alpha=2.0, exponent=1.0):
+    """Generate a follower graph with power-law degree distributions.
+
+    The number of users each user follows has a Pareto distribution with
+    the given mean, and the users that are followed are chosen with a Zipf
+    distribution, so that a few users have many followers and most have
+    very few. Users that come first in ``user_ids`` are the most followed.
+    """
+    cum_weights = zipf_weights(len(user_ids), exponent)
+    scale = mean_follows * (alpha - 1) / alpha
+    for follower_id in user_ids:
+        num_follows = min(int(scale * rnd.paretovariate(alpha)),
+                          len(user_ids) - 1)
+        followed = set(rnd.choices(user_ids, cum_weights=cum_weights,
+                                   k=num_follows))
+        followed.discard(follower_id)
+        for followed_id in sorted(followed):
+            yield follower_id, followed_id
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert_chunks(table, rows, progress=None):
+    """Insert rows in chunks, each in its own transaction."""
+    for chunk in chunks(rows):
+        db.session.execute(sa.insert(table), chunk)
+        db.session.commit()
+        if progress:
+            progress.update(len(chunk))
+
+
+def fake_users(args):
+    """Generate the rows of a range of users.
+
+    The index of each user is added to its username, so that usernames and
+    emails are unique.
+    """
+    start, count, seed = args
+    faker = get_faker()
+    faker.seed_instance(f'{seed}-users-{start}')
+    rows = []
+    for index in range(start, start + count):
+        username = f'{faker.user_name()}_{index}'
+        rows.append({'username': username,
+                     'email': f'{username}@{faker.free_email_domain()}',
+                     'about_me': faker.sentence()})
+    return rows
+
+
+def fake_posts(args):
+    """Generate the text and timestamps of a range of posts."""
+    start, count, seed = args
+    faker = get_faker()
+    faker.seed_instance(f'{seed}-posts-{start}')
+    return [{'text': faker.paragraph()[:280],
+             'timestamp': faker.date_time_this_year()}
+            for _ in range(count)]
+
+
+def generate(function, num, start, seed, processes):
+    """Run a row generator over chunks of ``num`` rows, in parallel."""
+    tasks = [(i, min(CHUNK_SIZE, start + num - i), seed)
+             for i in range(start, start + num, CHUNK_SIZE)]
+    if processes == 1:
+        for task in tasks:
+            yield from function(task)
+        return
+    with Pool(processes) as pool:
+        for rows in pool.imap(function, tasks):
+            yield from rows
+
+
+def options(f):
+    f = click.option('--seed', type=int, default=None,
+                     help='Seed for reproducible data.')(f)
+    f = click.option('--processes', type=int, default=os.cpu_count(),
+                     help='Number of processes that generate data.')(f)
+    return f
 
 
 @fake.cli.command()
 @click.argument('num', type=int)
-def users(num):  # pragma: no cover
+@click.option('--follows', type=float, default=5,
+              help='Mean number of users followed by each new user.')
+@options
+def users(num, follows, seed, processes):
     """Create the given number of fake users."""
-    users = []
-    for i in range(num):
-        user = User(username=faker.user_name(), email=faker.email(),
-                    about_me=faker.sentence())
-        db.session.add(user)
-        users.append(user)
-
-    # create some followers as well
-    for user in users:
-        num_followers = random.randint(0, 5)
-        for i in range(num_followers):
-            following = random.choice(users)
-            if user != following:
-                user.follow(following)
-
-    db.session.commit()
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    start = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+    with click.progressbar(length=num, label='Adding users') as progress:
+        insert_chunks(User, generate(fake_users, num, start, seed, processes),
+                      progress=progress)
+
+    # the new users follow each other, with a few of them being popular
+    user_ids = db.session.scalars(sa.select(User.id).where(
+        User.id >= start).order_by(User.id)).all()
+    rnd = random.Random(seed)
+    with click.progressbar(length=len(user_ids),
+                           label='Adding followers') as progress:
+        def rows():
+            last_follower_id = None
+            for follower_id, followed_id in follower_edges(
+                    rnd, user_ids, mean_follows=follows):
+                if follower_id != last_follower_id:
+                    progress.update(1)
+                    last_follower_id = follower_id
+                yield {'follower_id': follower_id,
+                       'followed_id': followed_id}
+
+        insert_chunks(followers, rows())
+        progress.update(len(user_ids) - progress.pos)
     print(num, 'users added.')
 
 
 @fake.cli.command()
 @click.argument('num', type=int)
-def posts(num):  # pragma: no cover
+@options
+def posts(num, seed, processes):
     """Create the given number of fake posts, assigned to random users."""
-    users = db.session.scalars(User.select()).all()
-    for i in range(num):
-        user = random.choice(users)
-        post = Post(text=faker.paragraph(), author=user,
-                    timestamp=faker.date_time_this_year())
-        db.session.add(post)
-    db.session.commit()
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    user_ids = db.session.scalars(sa.select(User.id).order_by(User.id)).all()
+    if not user_ids:
+        raise click.ClickException('There are no users.')
+    rnd = random.Random(seed)
+    cum_weights = zipf_weights(len(user_ids), 0.8)
+
+    def rows():
+        for row in generate(fake_posts, num, 0, seed, processes):
+            row['user_id'] = rnd.choices(user_ids, cum_weights=cum_weights)[0]
+            yield row
+
+    with click.progressbar(length=num, label='Adding posts') as progress:
+        insert_chunks(Post, rows(), progress=progress)
     print(num, 'posts added.')
@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+import re
+from time import perf_counter
+
+from flask import current_app, g, has_app_context, request
+import sqlalchemy as sa
+
+from api.metrics import metrics
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+'
+                               r'\s*(?:\?|%\(\w+\)s|:\w+)\s*\)')
+
+
+def fingerprint(statement):
+    """Return a normalized version of a SQL statement.
+
+    Literals are replaced with placeholders and lists of placeholders are
+    collapsed, so that statements that only differ in their values share
+    the same fingerprint.
+    """
+    statement = LITERALS.sub('?', ' '.join(statement.split()))
+    return PLACEHOLDER_LISTS.sub('(...)', statement)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in a block or function to a request timing."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if has_app_context() and 'timings' in g:
+            g.timings[name] = g.timings.get(name, 0.0) + \
+                perf_counter() - start
+
+
+@sa.event.listens_for(sa.Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context,
+                      executemany):
+    conn.info.setdefault('query_start', []).append(perf_counter())
+
+
+@sa.event.listens_for(sa.Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context,
+                     executemany):
+    duration = perf_counter() - conn.info['query_start'].pop()
+    if not has_app_context() or 'queries' not in g:
+        return
+    stats = g.queries
+    stats['count'] += 1
+    stats['time'] += duration
+    if duration > stats['slowest'][0]:
+        stats['slowest'] = (duration, statement)
+
+
+@sa.event.listens_for(sa.Engine, 'handle_error')
+def discard_query_timer(context):
+    if context.connection is not None and \
+            context.connection.info.get('query_start'):
+        context.connection.info['query_start'].pop()
+
+
+class Instrumentation:
+    """Record the database queries and timings of each request.
+
+    The results are added to the request metrics, and are returned to the
+    client in a ``Server-Timing`` header when the ``SERVER_TIMING``
+    configuration value is enabled. Requests that take longer than the
+    ``SLOW_REQUEST_THRESHOLD`` configuration value are logged.
+    """
+    def __init__(self, app=None):
+        if app:  # pragma: no cover
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+
+    def start_request(self):
+        g.request_start = perf_counter()
+        g.queries = {'count': 0, 'time': 0.0, 'slowest': (0.0, None)}
+        g.timings = {}
+
+    def end_request(self, response):
+        if 'request_start' not in g:  # pragma: no cover
+            return response
+        total = perf_counter() - g.pop('request_start')
+        queries = g.pop('queries')
+        timings = g.pop('timings')
+        labels = {'blueprint': request.blueprint or '',
+                  'endpoint': request.endpoint or '',
+                  'method': request.method}
+        metrics.observe('http_request_duration_seconds', total, **labels)
+        metrics.inc('http_requests_total', status=response.status_code,
+                    **labels)
+        if current_app.config['SERVER_TIMING']:
+            entries = [f'db;desc="{queries["count"]} queries";'
+                       f'dur={queries["time"] * 1000:.1f}']
+            entries += [f'{name};dur={duration * 1000:.1f}'
+                        for name, duration in timings.items()]
+            entries.append(f'total;dur={total * 1000:.1f}')
+            response.headers['Server-Timing'] = ', '.join(entries)
+        threshold = current_app.config['SLOW_REQUEST_THRESHOLD']
+        if threshold and total * 1000 > threshold:
+            slowest_time, slowest = queries['slowest']
+            current_app.logger.warning(
+                'Slow request: %s %s took %.1fms, %d queries in %.1fms, '
+                'slowest %.1fms: %s', request.method, request.full_path,
+                total * 1000, queries['count'], queries['time'] * 1000,
+                slowest_time * 1000,
+                fingerprint(slowest)[:500] if slowest else None)
+        return response
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,201 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import json
+import os
+from threading import Lock
+from time import monotonic, perf_counter
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class Metrics:
+    """In-process registry of counters, gauges and histograms.
+
+    When several worker processes serve the application, each process
+    writes its metrics to a file in a shared directory, and the files are
+    merged when the metrics are collected.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+        self.last_write = 0.0
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.gauges[key] = value
+
+    def adjust(self, name, delta, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': buckets,
+                    'counts': [0] * (len(buckets) + 1),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            histogram['counts'][bisect_left(histogram['buckets'], value)] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Return the current metrics of this process as a dictionary."""
+        for collector in self.collectors:
+            collector(self)
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value
+                             in self.counters.items()],
+                'gauges': [[name, labels, value] for (name, labels), value
+                           in self.gauges.items()],
+                'histograms': [[name, labels, dict(
+                    histogram, counts=list(histogram['counts']))]
+                    for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def write(self, directory, interval=0):
+        """Write the metrics of this process to the shared directory.
+
+        The file is only written if more than ``interval`` seconds have
+        passed since the last write.
+        """
+        if monotonic() - self.last_write < interval:
+            return
+        self.last_write = monotonic()
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self, directory=None):
+        """Return the metrics of all processes, merged."""
+        if directory is None:
+            return merge([self.snapshot()])
+        self.write(directory)
+        snapshots = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.startswith('metrics-') and \
+                    filename.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):  # pragma: no cover
+                    pass
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    """Merge the metrics from several processes.
+
+    Counters, gauges and histograms with the same name and labels are added
+    together.
+    """
+    merged = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        for kind in ['counters', 'gauges']:
+            for name, labels, value in snapshot[kind]:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged[kind][key] = merged[kind].get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            if key not in merged['histograms']:
+                merged['histograms'][key] = dict(
+                    histogram, counts=list(histogram['counts']))
+                continue
+            total = merged['histograms'][key]
+            total['counts'] = [a + b for a, b in zip(total['counts'],
+                                                     histogram['counts'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    return merged
+
+
+def mark_process_dead(directory, pid):
+    """Discard the gauges of a worker process that has exited.
+
+    The counters and histograms of the process are kept, so that totals do
+    not go backwards.
+    """
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+    snapshot['gauges'] = []
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(path + '.tmp', path)
+
+
+def format_labels(labels, **extra):
+    labels = list(labels) + list(extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace(
+        '\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels) + '}'
+
+
+def render(collected):
+    """Render merged metrics in the Prometheus text exposition format."""
+    lines = []
+    for kind, type_ in [('counters', 'counter'), ('gauges', 'gauge')]:
+        last_name = None
+        for (name, labels), value in sorted(collected[kind].items()):
+            if name != last_name:
+                lines.append(f'# TYPE {name} {type_}')
+                last_name = name
+            lines.append(f'{name}{format_labels(labels)} {value}')
+    last_name = None
+    for (name, labels), histogram in sorted(collected['histograms'].items()):
+        if name != last_name:
+            lines.append(f'# TYPE {name} histogram')
+            last_name = name
+        cumulative = 0
+        for bound, count in zip(list(histogram['buckets']) + ['+Inf'],
+                                histogram['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels, le=bound)} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{format_labels(labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{format_labels(labels)} '
+                     f'{histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
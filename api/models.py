@@ -4,7 +4,7 @@ import secrets
 from time import time
 from typing import Optional
 
-from flask import current_app, url_for
+from flask import current_app
 import jwt
 from alchemical import Model
 import sqlalchemy as sa
@@ -13,6 +13,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 from api.app import db
 from api.dates import naive_utcnow
+from api.metrics import metrics
+from api.urls import url_for
 
 
 class Updateable:
@@ -25,20 +27,25 @@ followers = sa.Table(
     'followers',
     Model.metadata,
     sa.Column('follower_id', sa.ForeignKey('users.id'), primary_key=True),
-    sa.Column('followed_id', sa.ForeignKey('users.id'), primary_key=True)
+    sa.Column('followed_id', sa.ForeignKey('users.id'), primary_key=True),
+    sa.Index('ix_followers_followed_id_follower_id', 'followed_id',
+             'follower_id'),
 )
 
 
 class Token(Model):
     __tablename__ = 'tokens'
+    __table_args__ = (
+        sa.Index('ix_tokens_user_id_refresh_expiration', 'user_id',
+                 'refresh_expiration'),
+    )
 
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     access_token: so.Mapped[str] = so.mapped_column(sa.String(64), index=True)
     access_expiration: so.Mapped[datetime]
     refresh_token: so.Mapped[str] = so.mapped_column(sa.String(64), index=True)
-    refresh_expiration: so.Mapped[datetime]
-    user_id: so.Mapped[int] = so.mapped_column(
-        sa.ForeignKey('users.id'), index=True)
+    refresh_expiration: so.Mapped[datetime] = so.mapped_column(index=True)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey('users.id'))
 
     user: so.Mapped['User'] = so.relationship(back_populates='tokens')
 
@@ -72,17 +79,41 @@ class Token(Model):
 
     @staticmethod
     def from_jwt(access_token_jwt):
-        access_token = None
-        try:
-            access_token = jwt.decode(access_token_jwt,
-                                      current_app.config['SECRET_KEY'],
-                                      algorithms=['HS256'])['token']
+        access_token = Token.decode_jwt(access_token_jwt)
+        if access_token:
             return db.session.scalar(Token.select().filter_by(
                 access_token=access_token))
+
+    @staticmethod
+    def verify_access_token(access_token_jwt):
+        """Return the token of a valid access token, after recording that
+        its user was seen."""
+        token = Token.from_jwt(access_token_jwt)
+        if token:
+            if token.access_expiration > naive_utcnow():
+                token.user.ping()
+                db.session.commit()
+                return token
+
+    @staticmethod
+    def decode_jwt(access_token_jwt):
+        try:
+            return jwt.decode(access_token_jwt,
+                              current_app.config['SECRET_KEY'],
+                              algorithms=['HS256'])['token']
         except jwt.PyJWTError:
             pass
 
 
+def avatar_hash(email):
+    return md5(email.lower().encode('utf-8')).hexdigest()
+
+
+def default_avatar_hash(context):
+    # used for rows inserted without the ORM
+    return avatar_hash(context.get_current_parameters()['email'])
+
+
 class User(Updateable, Model):
     __tablename__ = 'users'
 
@@ -91,6 +122,8 @@ class User(Updateable, Model):
         sa.String(64), index=True, unique=True)
     email: so.Mapped[str] = so.mapped_column(
         sa.String(120), index=True, unique=True)
+    avatar_hash: so.Mapped[str] = so.mapped_column(
+        sa.String(32), default=default_avatar_hash)
     password_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256))
     about_me: so.Mapped[Optional[str]] = so.mapped_column(sa.String(140))
     first_seen: so.Mapped[datetime] = so.mapped_column(default=naive_utcnow)
@@ -112,10 +145,10 @@ class User(Updateable, Model):
         back_populates='following')
 
     def followed_posts_select(self):
-        Author = so.aliased(User)
-        return Post.select().join(Post.author.of_type(Author)).join(
-            Author.followers, isouter=True).group_by(Post).where(
-                sa.or_(Post.author == self, User.id == self.id))
+        followed = sa.select(followers.c.followed_id).where(
+            followers.c.follower_id == self.id)
+        return Post.select().where(sa.or_(
+            Post.user_id == self.id, Post.user_id.in_(followed)))
 
     def __repr__(self):  # pragma: no cover
         return '<User {}>'.format(self.username)
@@ -124,14 +157,23 @@ class User(Updateable, Model):
     def url(self):
         return url_for('users.get', id=self.id)
 
+    @property
+    def posts_url(self):
+        return url_for('posts.user_all', id=self.id)
+
     @property
     def has_password(self):
         return self.password_hash is not None
 
     @property
     def avatar_url(self):
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
-        return f'https://www.gravatar.com/avatar/{digest}?d=identicon'
+        return f'https://www.gravatar.com/avatar/{self.avatar_hash}' \
+            '?d=identicon'
+
+    @so.validates('email')
+    def update_avatar_hash(self, key, email):
+        self.avatar_hash = avatar_hash(email)
+        return email
 
     @property
     def password(self):
@@ -139,11 +181,13 @@ class User(Updateable, Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        with metrics.timer('password_hash_seconds', operation='generate'):
+            self.password_hash = generate_password_hash(password)
 
     def verify_password(self, password):
         if self.password_hash:  # pragma: no branch
-            return check_password_hash(self.password_hash, password)
+            with metrics.timer('password_hash_seconds', operation='verify'):
+                return check_password_hash(self.password_hash, password)
 
     def ping(self):
         self.last_seen = naive_utcnow()
@@ -155,12 +199,9 @@ class User(Updateable, Model):
 
     @staticmethod
     def verify_access_token(access_token_jwt, refresh_token=None):
-        token = Token.from_jwt(access_token_jwt)
+        token = Token.verify_access_token(access_token_jwt)
         if token:
-            if token.access_expiration > naive_utcnow():
-                token.user.ping()
-                db.session.commit()
-                return token.user
+            return token.user
 
     @staticmethod
     def verify_refresh_token(refresh_token, access_token_jwt):
@@ -216,13 +257,16 @@ class User(Updateable, Model):
 
 class Post(Updateable, Model):
     __tablename__ = 'posts'
+    __table_args__ = (
+        sa.Index('ix_posts_user_id_timestamp_id', 'user_id', 'timestamp',
+                 'id'),
+        sa.Index('ix_posts_timestamp_id', 'timestamp', 'id'),
+    )
 
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     text: so.Mapped[str] = so.mapped_column(sa.String(280))
-    timestamp: so.Mapped[datetime] = so.mapped_column(
-        index=True, default=naive_utcnow)
-    user_id: so.Mapped[int] = so.mapped_column(
-        sa.ForeignKey(User.id), index=True)
+    timestamp: so.Mapped[datetime] = so.mapped_column(default=naive_utcnow)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
 
     author: so.Mapped['User'] = so.relationship(back_populates='posts')
 
@@ -232,3 +276,21 @@ class Post(Updateable, Model):
     @property
     def url(self):
         return url_for('posts.get', id=self.id)
+
+
+class Outbox(Model):
+    __tablename__ = 'outbox'
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    recipient: so.Mapped[str] = so.mapped_column(sa.String(120))
+    subject: so.Mapped[str] = so.mapped_column(sa.String(128))
+    body: so.Mapped[str] = so.mapped_column(sa.Text)
+    html: so.Mapped[Optional[str]] = so.mapped_column(sa.Text)
+    created_at: so.Mapped[datetime] = so.mapped_column(default=naive_utcnow)
+    next_attempt: so.Mapped[Optional[datetime]] = so.mapped_column(
+        index=True, default=naive_utcnow)
+    attempts: so.Mapped[int] = so.mapped_column(default=0)
+    last_error: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256))
+
+    def __repr__(self):  # pragma: no cover
+        return '<Outbox {}>'.format(self.recipient)
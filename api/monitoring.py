@@ -0,0 +1,29 @@
+import secrets
+
+from flask import Blueprint, abort, current_app, request
+
+from api.metrics import metrics, render
+
+monitoring = Blueprint('monitoring', __name__)
+
+
+@monitoring.after_app_request
+def write_metrics(response):
+    directory = current_app.config['METRICS_DIR']
+    if directory:
+        metrics.write(directory,
+                      interval=current_app.config['METRICS_WRITE_INTERVAL'])
+    return response
+
+
+@monitoring.route('/metrics')
+def get_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    if token and not secrets.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    collected = metrics.collect(current_app.config['METRICS_DIR'])
+    return render(collected), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,76 @@
+import os
+from threading import Lock
+from time import perf_counter
+
+from flask import current_app
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from api.metrics import metrics
+
+RETRY_BACKOFF = 0.2
+RETRY_JITTER = 0.2
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+sessions = {}
+sessions_lock = Lock()
+
+
+def create_session():
+    """Create a session with a pool of keep-alive connections.
+
+    Connection errors are retried for all requests, as the request has not
+    been sent. Other errors are only retried for GET requests, which do not
+    have side effects.
+    """
+    config = current_app.config
+    retry = Retry(total=config['OAUTH2_RETRIES'], allowed_methods=['GET'],
+                  status_forcelist=RETRY_STATUSES,
+                  backoff_factor=RETRY_BACKOFF, backoff_jitter=RETRY_JITTER,
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1,
+                          pool_maxsize=config['OAUTH2_POOL_SIZE'],
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(provider):
+    """Return the HTTP session for an OAuth2 provider.
+
+    Each process has its own sessions, so that connections are not shared
+    with forked processes.
+    """
+    key = (os.getpid(), provider)
+    session = sessions.get(key)
+    if session is None:
+        with sessions_lock:
+            session = sessions.get(key)
+            if session is None:
+                session = sessions[key] = create_session()
+    return session
+
+
+def oauth2_request(provider, call, method, url, **kwargs):
+    """Send a request to an OAuth2 provider.
+
+    ``call`` names the request in the latency metrics. Timeouts and
+    connection errors are raised as ``requests.RequestException``.
+    """
+    config = current_app.config
+    kwargs.setdefault('timeout', (config['OAUTH2_CONNECT_TIMEOUT'],
+                                  config['OAUTH2_READ_TIMEOUT']))
+    start = perf_counter()
+    status = 'error'
+    try:
+        response = get_session(provider).request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        metrics.observe('oauth2_request_duration_seconds',
+                        perf_counter() - start, provider=provider, call=call)
+        metrics.inc('oauth2_requests_total', provider=provider, call=call,
+                    status=status)
@@ -0,0 +1,25 @@
+import json
+import click
+from flask import Blueprint, current_app
+from api.app import apifairy
+
+openapi = Blueprint('openapi', __name__)
+
+
+@openapi.cli.command()
+@click.option('--output', '-o', help='Output file (default: APISPEC_FILE).')
+def build(output):
+    """Write the OpenAPI document of the API to a file."""
+    output = output or current_app.config['APISPEC_FILE']
+    if not output:
+        raise click.UsageError('No output file given.')
+    # generate the document from the schemas, even if a prebuilt one is
+    # already in use
+    with current_app.test_request_context():
+        apispec = dict(apifairy.generated_apispec)
+    # the server URL is made relative, so that the document is valid for
+    # any host it is served from
+    apispec['servers'] = [{'url': '/'}]
+    with open(output, 'w') as f:
+        json.dump(apispec, f)
+    print('OpenAPI document written to', output)
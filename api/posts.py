@@ -1,17 +1,22 @@
 from flask import Blueprint, abort
 from apifairy import authenticate, body, response, other_responses
+from sqlalchemy import orm as so
 
 from api import db
+from api.database import COLLECTION_STATEMENT_TIMEOUT
 from api.models import User, Post
-from api.schemas import PostSchema
+from api.schemas import PostSchema, NormalizedPostSchema, \
+    PostIncludesSchema, PostFieldsSchema
 from api.auth import token_auth
-from api.decorators import paginated_response
-from api.schemas import DateTimePaginationSchema
+from api.decorators import paginated_response, sparse_fields, \
+    statement_timeout
+from api.schemas import PostPaginationSchema
 
 posts = Blueprint('posts', __name__)
 post_schema = PostSchema()
 posts_schema = PostSchema(many=True)
 update_post_schema = PostSchema(partial=True)
+normalized_posts_schema = NormalizedPostSchema(many=True)
 
 
 @posts.route('/posts', methods=['POST'])
@@ -31,31 +36,38 @@ def new(args):
 @authenticate(token_auth)
 @response(post_schema)
 @other_responses({404: 'Post not found'})
-def get(id):
+@sparse_fields(post_schema, PostFieldsSchema)
+def get(id, options):
     """Retrieve a post by id"""
-    return db.session.get(Post, id) or abort(404)
+    return db.session.get(Post, id, options=options) or abort(404)
 
 
 @posts.route('/posts', methods=['GET'])
 @authenticate(token_auth)
+@statement_timeout(COLLECTION_STATEMENT_TIMEOUT)
 @paginated_response(posts_schema, order_by=Post.timestamp,
                     order_direction='desc',
-                    pagination_schema=DateTimePaginationSchema)
+                    pagination_schema=PostPaginationSchema,
+                    normalized_schema=normalized_posts_schema,
+                    includes_schema=PostIncludesSchema)
 def all():
     """Retrieve all posts"""
-    return Post.select()
+    return Post.select().options(so.selectinload(Post.author))
 
 
 @posts.route('/users/<int:id>/posts', methods=['GET'])
 @authenticate(token_auth)
+@statement_timeout(COLLECTION_STATEMENT_TIMEOUT)
 @paginated_response(posts_schema, order_by=Post.timestamp,
                     order_direction='desc',
-                    pagination_schema=DateTimePaginationSchema)
+                    pagination_schema=PostPaginationSchema,
+                    normalized_schema=normalized_posts_schema,
+                    includes_schema=PostIncludesSchema)
 @other_responses({404: 'User not found'})
 def user_all(id):
     """Retrieve all posts from a user"""
     user = db.session.get(User, id) or abort(404)
-    return user.posts.select()
+    return user.posts.select().options(so.selectinload(Post.author))
 
 
 @posts.route('/posts/<int:id>', methods=['PUT'])
@@ -89,10 +101,14 @@ def delete(id):
 
 @posts.route('/feed', methods=['GET'])
 @authenticate(token_auth)
+@statement_timeout(COLLECTION_STATEMENT_TIMEOUT)
 @paginated_response(posts_schema, order_by=Post.timestamp,
                     order_direction='desc',
-                    pagination_schema=DateTimePaginationSchema)
+                    pagination_schema=PostPaginationSchema,
+                    normalized_schema=normalized_posts_schema,
+                    includes_schema=PostIncludesSchema)
 def feed():
     """Retrieve the user's post feed"""
     user = token_auth.current_user()
-    return user.followed_posts_select()
+    return user.followed_posts_select().options(
+        so.selectinload(Post.author))
@@ -0,0 +1,41 @@
+"""Support for servers that load the application before forking workers.
+
+When the application is preloaded, the work done in ``warm_up`` is shared
+by all the worker processes through copy-on-write memory pages, instead of
+being repeated in each worker. Each worker must then call ``after_fork``, so
+that it does not share database connections with the other processes.
+"""
+import gc
+import sqlalchemy as sa
+from api.app import db
+from api.metrics import metrics
+
+
+def warm_up(app):
+    """Do the work that workers would otherwise do on their first
+    requests."""
+    with app.app_context():
+        sa.orm.configure_mappers()
+        for template in ['reset.txt', 'reset.html']:
+            app.jinja_env.get_template(template)
+        db.get_engine()  # engines are created on first use
+        for engine in db.engines.values():
+            # the first connection initializes the database dialect
+            try:
+                with engine.connect():
+                    pass
+            except sa.exc.DBAPIError as error:
+                app.logger.warning('Could not connect to the database: %s',
+                                   error)
+            engine.dispose()
+    # objects that exist now are never freed, so the garbage collector does
+    # not need to touch them, which would copy their memory pages
+    gc.freeze()
+
+
+def after_fork():
+    """Reset the state inherited from the parent process in a worker."""
+    for engine in (getattr(db, 'engines', None) or {}).values():
+        # connections of the parent process are left for it to close
+        engine.dispose(close=False)
+    metrics.clear()
@@ -0,0 +1,184 @@
+import json
+import os
+import random
+import secrets
+import sys
+from threading import Condition, Thread, get_ident
+from time import monotonic, sleep
+
+import click
+from flask import Blueprint, abort, current_app, g, request
+
+profile = Blueprint('profile', __name__)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return '{}:{}'.format(frame.f_globals.get('__name__', '?'),
+                          getattr(code, 'co_qualname', code.co_name))
+
+
+def collapse(frame):
+    """Return a stack in collapsed format, starting from the outermost
+    frame."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler:
+    """Statistical profiler for a sample of requests.
+
+    A fraction of the requests given by the ``PROFILER_SAMPLE_RATE``
+    configuration value is profiled, along with requests that include the
+    ``PROFILER_SECRET`` value in a ``X-Profile`` header. While a profiled
+    request is running, a background thread records its stack every
+    ``PROFILER_INTERVAL`` milliseconds. The stacks are aggregated per
+    endpoint, in the collapsed format used by flamegraph tools.
+    """
+    def __init__(self, app=None):
+        self.lock = Condition()
+        self.active = {}
+        self.stacks = {}
+        self.interval = 0.005
+        self.thread = None
+        self.last_write = 0.0
+        if app:  # pragma: no cover
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.start_request)
+        app.teardown_request(self.end_request)
+        app.after_request(self.write_request)
+
+    def should_profile(self):
+        secret = current_app.config['PROFILER_SECRET']
+        header = request.headers.get('X-Profile')
+        if secret and header is not None:
+            return secrets.compare_digest(header, secret)
+        rate = current_app.config['PROFILER_SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    def start_request(self):
+        if not self.should_profile():
+            return
+        g.profiled = True
+        with self.lock:
+            self.interval = current_app.config['PROFILER_INTERVAL'] / 1000
+            self.active[get_ident()] = request.endpoint or ''
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.lock.notify()
+
+    def end_request(self, exc):
+        if g.pop('profiled', False):
+            with self.lock:
+                self.active.pop(get_ident(), None)
+
+    def write_request(self, response):
+        directory = current_app.config['METRICS_DIR']
+        if directory and self.stacks:
+            self.write(directory,
+                       interval=current_app.config['METRICS_WRITE_INTERVAL'])
+        return response
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.active:
+                    self.lock.wait()
+                interval = self.interval
+            self.sample()
+            sleep(interval)
+
+    def sample(self):
+        """Record the stacks of the requests that are being profiled."""
+        frames = sys._current_frames()
+        with self.lock:
+            for thread_id, endpoint in self.active.items():
+                if thread_id in frames:
+                    counts = self.stacks.setdefault(endpoint, {})
+                    stack = collapse(frames[thread_id])
+                    counts[stack] = counts.get(stack, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.stacks.clear()
+
+    def write(self, directory, interval=0):
+        """Write the stacks of this process to the shared directory."""
+        if monotonic() - self.last_write < interval:
+            return
+        self.last_write = monotonic()
+        with self.lock:
+            data = json.dumps(self.stacks)
+        path = os.path.join(directory, f'profile-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def collect(self, directory=None, endpoint=None):
+        """Return the stacks of all processes as collapsed stack lines.
+
+        Each stack starts with the name of the endpoint it was recorded
+        in, unless the stacks of a single endpoint are requested.
+        """
+        if directory is None:
+            with self.lock:
+                profiles = [json.loads(json.dumps(self.stacks))]
+        else:
+            self.write(directory)
+            profiles = []
+            for filename in sorted(os.listdir(directory)):
+                if filename.startswith('profile-') and \
+                        filename.endswith('.json'):
+                    try:
+                        with open(os.path.join(directory, filename)) as f:
+                            profiles.append(json.load(f))
+                    except (OSError, ValueError):  # pragma: no cover
+                        pass
+        totals = {}
+        for stacks in profiles:
+            for name, counts in stacks.items():
+                if endpoint is not None and name != endpoint:
+                    continue
+                for stack, count in counts.items():
+                    if endpoint is None:
+                        stack = f'{name};{stack}'
+                    totals[stack] = totals.get(stack, 0) + count
+        return [f'{stack} {count}' for stack, count in sorted(totals.items())]
+
+
+profiler = Profiler()
+
+
+@profile.route('/profile')
+def get_profile():
+    secret = current_app.config['PROFILER_SECRET']
+    if not secret:
+        abort(404)
+    if not secrets.compare_digest(request.headers.get('Authorization', ''),
+                                  f'Bearer {secret}'):
+        abort(401)
+    lines = profiler.collect(current_app.config['METRICS_DIR'],
+                             endpoint=request.args.get('endpoint'))
+    return ''.join(line + '\n' for line in lines), 200, {
+        'Content-Type': 'text/plain; charset=utf-8'}
+
+
+@profile.cli.command()
+@click.option('--endpoint', help='Only dump the stacks of this endpoint.')
+@click.option('--output', type=click.File('w'), default='-',
+              help='File to write the stacks to.')
+def dump(endpoint, output):  # pragma: no cover
+    """Dump the collected stacks in collapsed format."""
+    directory = current_app.config['METRICS_DIR']
+    if not directory:
+        raise click.ClickException(
+            'METRICS_DIR must be set to dump the stacks of the server '
+            'processes.')
+    for line in profiler.collect(directory, endpoint=endpoint):
+        output.write(line + '\n')
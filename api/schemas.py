@@ -1,16 +1,96 @@
+from flask import current_app
 from marshmallow import validate, validates, validates_schema, \
-    ValidationError, post_dump
+    ValidationError, post_dump, pre_dump
+import sqlalchemy as sa
+from webargs.fields import DelimitedList
 from api import ma, db
 from api.auth import token_auth
+from api.encoding import EncodedJSON
+from api.instrumentation import timed
 from api.models import User, Post
 
 paginated_schema_cache = {}
+selected_schema_cache = {}
 
 
-class EmptySchema(ma.Schema):
+class JsonifyMixin:
+    """Hook into the serialization of schemas used in responses.
+
+    Objects that are already encoded as ``EncodedJSON`` are returned as they
+    are.
+    """
+    def jsonify(self, obj, *args, **kwargs):
+        if isinstance(obj, EncodedJSON):
+            return obj.response()
+        with timed('ser'):
+            return super().jsonify(obj, *args, **kwargs)
+
+
+class EmptySchema(JsonifyMixin, ma.Schema):
     pass
 
 
+def is_dump_field(schema, name):
+    """Check if a schema dumps a field, given with a dotted name for the
+    fields of nested schemas."""
+    name, _, nested_name = name.partition('.')
+    field = schema.dump_fields.get(name)
+    if field is None:
+        return False
+    if nested_name:
+        return isinstance(field, ma.Nested) and \
+            is_dump_field(field.schema, nested_name)
+    return True
+
+
+class FieldNames(validate.Validator):
+    """Validate a list of the names of the fields dumped by a schema."""
+    def __init__(self, schema_class):
+        self.schema_class = schema_class
+
+    def __call__(self, value):
+        schema = self.schema_class()
+        invalid = [name for name in value if not is_dump_field(schema, name)]
+        if invalid:
+            raise ValidationError('Unknown fields: {}.'.format(
+                ', '.join(invalid)))
+        return value
+
+
+def FieldsArgument(schema_class):
+    return DelimitedList(ma.String(), load_only=True, validate=FieldNames(
+        schema_class), metadata={'description': (
+            'A comma separated list of the fields to return, with dotted '
+            'names for the fields of nested objects, such as '
+            '"author.username".')})
+
+
+def validate_ids(value):
+    limit = current_app.config['BATCH_MAX_IDS']
+    if len(value) > limit:
+        raise ValidationError(f'Cannot request more than {limit} ids.')
+
+
+def IdsArgument():
+    return DelimitedList(ma.Integer(), load_only=True, validate=validate_ids,
+                         metadata={'description': (
+                             'A comma separated list of ids. The items with '
+                             'these ids are returned instead of a page: '
+                             '"data" has them in the order of the ids, with '
+                             'null for the ids that are not found, and there '
+                             'is no "pagination". It cannot be combined with '
+                             'limit, offset or after.')})
+
+
+def validate_ids_pagination(data):
+    if data.get('ids') is not None:
+        given = [name for name in ['limit', 'offset', 'after']
+                 if data.get(name) is not None]
+        if given:
+            raise ValidationError('Cannot specify {} with ids'.format(
+                ', '.join(given)))
+
+
 class DateTimePaginationSchema(ma.Schema):
     class Meta:
         ordered = True
@@ -43,23 +123,69 @@ class StringPaginationSchema(ma.Schema):
             raise ValidationError('Cannot specify both offset and after')
 
 
-def PaginatedCollection(schema, pagination_schema=StringPaginationSchema):
-    if schema in paginated_schema_cache:
-        return paginated_schema_cache[schema]
+def PaginatedCollection(schema, pagination_schema=StringPaginationSchema,
+                        includes_schema=None):
+    """Return the schema of a page of a collection.
+
+    When ``includes_schema`` is given, the page has an ``includes`` field
+    that is dumped from the list of items with this schema.
+    """
+    key = (schema, includes_schema)
+    if key in paginated_schema_cache:
+        return paginated_schema_cache[key]
 
-    class PaginatedSchema(ma.Schema):
+    class PaginatedSchema(JsonifyMixin, ma.Schema):
         class Meta:
             ordered = True
 
         pagination = ma.Nested(pagination_schema)
-        data = ma.Nested(schema, many=True)
+        data = ma.Nested(schema.__class__, many=True)
+
+    if includes_schema is not None:
+        class PaginatedSchema(PaginatedSchema):
+            includes = ma.Nested(includes_schema)
+
+            @pre_dump
+            def add_includes(self, page, **kwargs):
+                return dict(page, includes=page['data'])
 
     PaginatedSchema.__name__ = 'Paginated{}'.format(schema.__class__.__name__)
-    paginated_schema_cache[schema] = PaginatedSchema
+    paginated_schema_cache[key] = PaginatedSchema
     return PaginatedSchema
 
 
-class UserSchema(ma.SQLAlchemySchema):
+def SelectedCollection(schema, includes_schema=None):
+    """Return the schema of the items of a collection selected by their ids.
+
+    The items are given in the order of the ids, with ``None`` for the ids
+    that are not found, and are dumped as ``null``. When ``includes_schema``
+    is given, it dumps the ``includes`` field from the items that are found.
+    """
+    key = (schema, includes_schema)
+    if key in selected_schema_cache:
+        return selected_schema_cache[key]
+
+    class SelectedSchema(JsonifyMixin, ma.Schema):
+        class Meta:
+            ordered = True
+
+        data = ma.List(ma.Nested(schema.__class__, allow_none=True))
+
+    if includes_schema is not None:
+        class SelectedSchema(SelectedSchema):
+            includes = ma.Nested(includes_schema)
+
+            @pre_dump
+            def add_includes(self, selection, **kwargs):
+                return dict(selection, includes=[
+                    item for item in selection['data'] if item is not None])
+
+    SelectedSchema.__name__ = 'Selected{}'.format(schema.__class__.__name__)
+    selected_schema_cache[key] = SelectedSchema
+    return SelectedSchema
+
+
+class UserSchema(JsonifyMixin, ma.SQLAlchemySchema):
     class Meta:
         model = User
         ordered = True
@@ -77,31 +203,47 @@ class UserSchema(ma.SQLAlchemySchema):
     about_me = ma.auto_field()
     first_seen = ma.auto_field(dump_only=True)
     last_seen = ma.auto_field(dump_only=True)
-    posts_url = ma.URLFor('posts.user_all', values={'id': '<id>'},
-                          dump_only=True)
+    posts_url = ma.String(dump_only=True)
+
+    # fields that are unique in the database, with their error messages
+    unique_fields = {'username': 'Use a different username.',
+                     'email': 'Use a different email.'}
 
     @validates('username')
     def validate_username(self, value):
         if not value[0].isalpha():
             raise ValidationError('Username must start with a letter')
-        user = token_auth.current_user()
-        old_username = user.username if user else None
-        if value != old_username and \
-                db.session.scalar(User.select().filter_by(username=value)):
-            raise ValidationError('Use a different username.')
 
-    @validates('email')
-    def validate_email(self, value):
+    @validates_schema(skip_on_field_errors=False)
+    def validate_unique(self, data, **kwargs):
+        # the unique fields are checked with a single query, but concurrent
+        # requests can still insert duplicates, which are rejected by the
+        # unique indexes of the database with the same errors; fields that
+        # failed validation are not in data, so they are not checked
         user = token_auth.current_user()
-        old_email = user.email if user else None
-        if value != old_email and \
-                db.session.scalar(User.select().filter_by(email=value)):
-            raise ValidationError('Use a different email.')
+        values = {name: data[name] for name in self.unique_fields
+                  if name in data and
+                  (user is None or data[name] != getattr(user, name))}
+        if not values:
+            return
+        rows = db.session.execute(sa.select(User.username, User.email).where(
+            sa.or_(*[getattr(User, name) == value
+                     for name, value in values.items()]))).all()
+        errors = {name: [self.unique_fields[name]] for name, value
+                  in values.items() if any(getattr(row, name) == value
+                                           for row in rows)}
+        if errors:
+            raise ValidationError(errors)
+
+    # columns that are needed to dump the fields that are not columns
+    field_columns = {'url': ['id'], 'has_password': ['password_hash'],
+                     'avatar_url': ['avatar_hash'], 'posts_url': ['id']}
 
     @post_dump
     def fix_datetimes(self, data, **kwargs):
-        data['first_seen'] += 'Z'
-        data['last_seen'] += 'Z'
+        for field in ['first_seen', 'last_seen']:
+            if field in data:
+                data[field] += 'Z'
         return data
 
 
@@ -114,7 +256,7 @@ class UpdateUserSchema(UserSchema):
             raise ValidationError('Password is incorrect')
 
 
-class PostSchema(ma.SQLAlchemySchema):
+class PostSchema(JsonifyMixin, ma.SQLAlchemySchema):
     class Meta:
         model = Post
         include_fk = True
@@ -127,13 +269,108 @@ class PostSchema(ma.SQLAlchemySchema):
     timestamp = ma.auto_field(dump_only=True)
     author = ma.Nested(UserSchema, dump_only=True)
 
+    field_columns = {'url': ['id']}
+
     @post_dump
     def fix_datetimes(self, data, **kwargs):
-        data['timestamp'] += 'Z'
+        if 'timestamp' in data:
+            data['timestamp'] += 'Z'
         return data
 
 
-class TokenSchema(ma.Schema):
+class UserPaginationSchema(StringPaginationSchema):
+    fields = FieldsArgument(UserSchema)
+    ids = IdsArgument()
+
+    @validates_schema
+    def validate_ids_arguments(self, data, **kwargs):
+        validate_ids_pagination(data)
+
+
+class UserFieldsSchema(ma.Schema):
+    fields = FieldsArgument(UserSchema)
+
+
+class PostPaginationSchema(DateTimePaginationSchema):
+    format = ma.String(load_only=True, validate=validate.OneOf(
+        ['nested', 'normalized']), metadata={'description': (
+            'With "normalized", the author of each post is given as '
+            '"author_id", and the authors are returned once in '
+            '"includes.users", indexed by their id.')})
+    fields = FieldsArgument(PostSchema)
+    ids = IdsArgument()
+
+    @validates_schema
+    def validate_format(self, data, **kwargs):
+        if data.get('format') == 'normalized' and data.get('fields'):
+            raise ValidationError('Cannot specify fields with the normalized '
+                                  'format')
+
+    @validates_schema
+    def validate_ids_arguments(self, data, **kwargs):
+        validate_ids_pagination(data)
+
+
+class PostFieldsSchema(ma.Schema):
+    fields = FieldsArgument(PostSchema)
+
+
+class NormalizedPostSchema(PostSchema):
+    """Post schema that references the author by id."""
+    class Meta(PostSchema.Meta):
+        exclude = ['author']
+
+    author_id = ma.Integer(attribute='user_id', dump_only=True)
+
+
+class PostIncludesSchema(ma.Schema):
+    """The authors of a list of posts, each included once."""
+    users = ma.Dict(keys=ma.String(), values=ma.Nested(UserSchema))
+
+    @pre_dump
+    def collect_authors(self, posts, **kwargs):
+        return {'users': {post.user_id: post.author for post in posts}}
+
+
+class BatchRequestSchema(ma.Schema):
+    class Meta:
+        ordered = True
+
+    method = ma.String(load_default='GET', validate=validate.OneOf(
+        ['GET', 'POST', 'PUT', 'DELETE']))
+    url = ma.String(required=True, validate=validate.Regexp(
+        '^/api/', error='The URL must start with /api/.'), metadata={
+            'description': 'The URL of the request, with its query string.'})
+    body = ma.Raw(allow_none=True, metadata={
+        'description': 'The JSON body of the request.'})
+
+
+class BatchSchema(ma.Schema):
+    requests = ma.List(ma.Nested(BatchRequestSchema), required=True)
+
+    @validates('requests')
+    def validate_requests(self, value):
+        limit = current_app.config['BATCH_MAX_REQUESTS']
+        if not value:
+            raise ValidationError('At least one request is required.')
+        if len(value) > limit:
+            raise ValidationError(f'Cannot send more than {limit} requests.')
+
+
+class BatchResponseSchema(ma.Schema):
+    class Meta:
+        ordered = True
+
+    status = ma.Integer()
+    body = ma.Raw(metadata={
+        'description': 'The JSON body of the response, or null.'})
+
+
+class BatchResponsesSchema(JsonifyMixin, ma.Schema):
+    responses = ma.List(ma.Nested(BatchResponseSchema))
+
+
+class TokenSchema(JsonifyMixin, ma.Schema):
     class Meta:
         ordered = True
 
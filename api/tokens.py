@@ -10,6 +10,7 @@ from api.app import db
 from api.auth import basic_auth, token_auth
 from api.email import send_email
 from api.models import User, Token
+from api.oauth2 import oauth2_request
 from api.schemas import TokenSchema, PasswordResetRequestSchema, \
     PasswordResetSchema, OAuth2Schema, EmptySchema
 
@@ -109,6 +110,7 @@ def reset(args):
             '?token=' + reset_token
         send_email(args['email'], 'Reset Your Password', 'reset',
                    username=user.username, token=reset_token, url=reset_url)
+        db.session.commit()
     return {}
 
 
@@ -152,7 +154,8 @@ def oauth2_authorize(provider):
 @body(oauth2_schema)
 @response(token_schema)
 @other_responses({401: 'Invalid code or state',
-                  404: 'Unknown OAuth2 provider'})
+                  404: 'Unknown OAuth2 provider',
+                  503: 'OAuth2 provider unavailable'})
 def oauth2_new(args, provider):
     """Create new access and refresh tokens with OAuth2 authentication
 
@@ -166,23 +169,30 @@ def oauth2_new(args, provider):
         abort(404)
     if args['state'] != session.get('oauth2_state'):
         abort(401)
-    response = requests.post(provider_data['access_token_url'], data={
-        'client_id': provider_data['client_id'],
-        'client_secret': provider_data['client_secret'],
-        'code': args['code'],
-        'grant_type': 'authorization_code',
-        'redirect_uri': current_app.config['OAUTH2_REDIRECT_URI'].format(
-            provider=provider),
-    }, headers={'Accept': 'application/json'})
-    if response.status_code != 200:
-        abort(401)
-    oauth2_token = response.json().get('access_token')
-    if not oauth2_token:
-        abort(401)
-    response = requests.get(provider_data['get_user']['url'], headers={
-        'Authorization': 'Bearer ' + oauth2_token,
-        'Accept': 'application/json',
-    })
+    try:
+        response = oauth2_request(
+            provider, 'token', 'POST', provider_data['access_token_url'],
+            data={
+                'client_id': provider_data['client_id'],
+                'client_secret': provider_data['client_secret'],
+                'code': args['code'],
+                'grant_type': 'authorization_code',
+                'redirect_uri': current_app.config[
+                    'OAUTH2_REDIRECT_URI'].format(provider=provider),
+            }, headers={'Accept': 'application/json'})
+        if response.status_code != 200:
+            abort(401)
+        oauth2_token = response.json().get('access_token')
+        if not oauth2_token:
+            abort(401)
+        response = oauth2_request(
+            provider, 'user', 'GET', provider_data['get_user']['url'],
+            headers={
+                'Authorization': 'Bearer ' + oauth2_token,
+                'Accept': 'application/json',
+            })
+    except requests.RequestException:
+        abort(503)
     if response.status_code != 200:
         abort(401)
     email = provider_data['get_user']['email'](response.json())
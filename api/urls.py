@@ -0,0 +1,45 @@
+"""URLs of the resources of the API.
+
+Flask's ``url_for`` matches the arguments against the rules of the endpoint
+each time it builds a URL. The URLs of resources are built for each item of
+a response, so the rules of their endpoints are converted once per
+application into format strings, which are then filled with the arguments.
+"""
+import re
+
+from flask import current_app, has_request_context, request
+from flask import url_for as flask_url_for
+
+ARGUMENT_RE = re.compile(r'<(?:(\w+)(?:\([^)]*\))?:)?(\w+)>')
+
+
+def url_template(endpoint):
+    """Return a format string for the URLs of an endpoint and the names of
+    its arguments, or ``None`` if the endpoint does not have a single rule
+    with integer arguments."""
+    rules = list(current_app.url_map.iter_rules(endpoint))
+    if len(rules) != 1:
+        return None
+    rule = rules[0].rule
+    arguments = ARGUMENT_RE.findall(rule)
+    if any(converter != 'int' for converter, _ in arguments):
+        return None
+    return ARGUMENT_RE.sub(r'{\2}', rule), {name for _, name in arguments}
+
+
+def url_for(endpoint, **values):
+    """Return the URL of an endpoint, relative to the server.
+
+    Outside of requests, for endpoints that do not have a template, and
+    for arguments that are not those of the rule, the URL is built by Flask.
+    """
+    if not has_request_context():
+        return flask_url_for(endpoint, **values)
+    templates = current_app.extensions.setdefault('url_templates', {})
+    try:
+        template = templates[endpoint]
+    except KeyError:
+        template = templates[endpoint] = url_template(endpoint)
+    if template is None or values.keys() != template[1]:
+        return flask_url_for(endpoint, **values)
+    return request.script_root + template[0].format(**values)
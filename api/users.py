@@ -3,10 +3,13 @@ from flask import Blueprint, abort
 from apifairy import authenticate, body, response
 
 from api import db
+from api.database import COLLECTION_STATEMENT_TIMEOUT
 from api.models import User
-from api.schemas import UserSchema, UpdateUserSchema, EmptySchema
+from api.schemas import UserSchema, UpdateUserSchema, EmptySchema, \
+    UserPaginationSchema, UserFieldsSchema
 from api.auth import token_auth
-from api.decorators import paginated_response
+from api.decorators import paginated_response, sparse_fields, \
+    statement_timeout
 
 users = Blueprint('users', __name__)
 user_schema = UserSchema()
@@ -27,7 +30,8 @@ def new(args):
 
 @users.route('/users', methods=['GET'])
 @authenticate(token_auth)
-@paginated_response(users_schema)
+@statement_timeout(COLLECTION_STATEMENT_TIMEOUT)
+@paginated_response(users_schema, pagination_schema=UserPaginationSchema)
 def all():
     """Retrieve all users"""
     return User.select()
@@ -37,25 +41,28 @@ def all():
 @authenticate(token_auth)
 @response(user_schema)
 @other_responses({404: 'User not found'})
-def get(id):
+@sparse_fields(user_schema, UserFieldsSchema)
+def get(id, options):
     """Retrieve a user by id"""
-    return db.session.get(User, id) or abort(404)
+    return db.session.get(User, id, options=options) or abort(404)
 
 
 @users.route('/users/<username>', methods=['GET'])
 @authenticate(token_auth)
 @response(user_schema)
 @other_responses({404: 'User not found'})
-def get_by_username(username):
+@sparse_fields(user_schema, UserFieldsSchema)
+def get_by_username(username, options):
     """Retrieve a user by username"""
-    return db.session.scalar(User.select().filter_by(username=username)) or \
-        abort(404)
+    return db.session.scalar(User.select().filter_by(
+        username=username).options(*options)) or abort(404)
 
 
 @users.route('/me', methods=['GET'])
 @authenticate(token_auth)
 @response(user_schema)
-def me():
+@sparse_fields(user_schema, UserFieldsSchema)
+def me(options):
     """Retrieve the authenticated user"""
     return token_auth.current_user()
 
@@ -77,7 +84,8 @@ def put(data):
 
 @users.route('/me/following', methods=['GET'])
 @authenticate(token_auth)
-@paginated_response(users_schema, order_by=User.username)
+@paginated_response(users_schema, order_by=User.username,
+                    pagination_schema=UserPaginationSchema)
 def my_following():
     """Retrieve the users the logged in user is following"""
     user = token_auth.current_user()
@@ -86,7 +94,8 @@ def my_following():
 
 @users.route('/me/followers', methods=['GET'])
 @authenticate(token_auth)
-@paginated_response(users_schema, order_by=User.username)
+@paginated_response(users_schema, order_by=User.username,
+                    pagination_schema=UserPaginationSchema)
 def my_followers():
     """Retrieve the followers of the logged in user"""
     user = token_auth.current_user()
@@ -141,7 +150,8 @@ def unfollow(id):
 
 @users.route('/users/<int:id>/following', methods=['GET'])
 @authenticate(token_auth)
-@paginated_response(users_schema, order_by=User.username)
+@paginated_response(users_schema, order_by=User.username,
+                    pagination_schema=UserPaginationSchema)
 @other_responses({404: 'User not found'})
 def following(id):
     """Retrieve the users this user is following"""
@@ -151,7 +161,8 @@ def following(id):
 
 @users.route('/users/<int:id>/followers', methods=['GET'])
 @authenticate(token_auth)
-@paginated_response(users_schema, order_by=User.username)
+@paginated_response(users_schema, order_by=User.username,
+                    pagination_schema=UserPaginationSchema)
 @other_responses({404: 'User not found'})
 def followers(id):
     """Retrieve the followers of the user"""
@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+from tempfile import TemporaryDirectory
+
+import click
+
+from benchmarks.suite import BENCHMARKS, compare, run
+
+
+@click.command()
+@click.argument('names', nargs=-1, type=click.Choice(list(BENCHMARKS)))
+@click.option('--users', default=1000, help='Number of users to generate.')
+@click.option('--posts', default=20000, help='Number of posts to generate.')
+@click.option('--follows', default=20,
+              help='Mean number of users followed by each user.')
+@click.option('--seed', default=42, help='Seed for the dataset generator.')
+@click.option('--repeat', default=5, help='Number of timing runs.')
+@click.option('--output', type=click.Path(),
+              help='File to write the results to, in JSON format.')
+@click.option('--compare', 'baseline', type=click.File(),
+              help='Results of a previous run to compare against.')
+@click.option('--threshold', default=0.1,
+              help='Slowdown reported as a regression, as a fraction.')
+def main(names, users, posts, follows, seed, repeat, output, baseline,
+         threshold):
+    """Run the benchmarks on a generated dataset.
+
+    The dataset is created in the database given in the TEST_DATABASE_URL
+    environment variable, which is emptied, or in a temporary SQLite
+    database.
+    """
+    with TemporaryDirectory() as directory:
+        database_url = os.environ.get('TEST_DATABASE_URL') or \
+            'sqlite:///' + os.path.join(directory, 'benchmarks.sqlite')
+        results = run(database_url, names=names, num_users=users,
+                      num_posts=posts, mean_follows=follows, seed=seed,
+                      repeat=repeat)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        regressions = compare(json.load(baseline), results,
+                              threshold=threshold)
+        for name, old, new, ratio in regressions:
+            print('Regression in {}: {:.1f}us -> {:.1f}us ({:+.0%})'.format(
+                name, old * 1e6, new * 1e6, ratio - 1))
+        if regressions:
+            sys.exit(1)
+
+
+main()
@@ -0,0 +1,44 @@
+"""Generation of reproducible synthetic datasets for benchmarking."""
+from datetime import timedelta
+import random
+
+from werkzeug.security import generate_password_hash
+
+from api.dates import naive_utcnow
+from api.fake import follower_edges, insert_chunks, zipf_weights
+from api.models import User, Post, followers
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua enim '
+         'ad minim veniam quis nostrud exercitation ullamco laboris nisi '
+         'aliquip ex ea commodo consequat').split()
+PASSWORD = 'benchmark'
+
+
+def generate(num_users=1000, num_posts=20000, mean_follows=20, seed=42):
+    """Add users, posts and followers to an empty database.
+
+    All the users have ``benchmark`` as password. Users with lower ids
+    have more followers and write more posts.
+    """
+    rnd = random.Random(seed)
+    now = naive_utcnow()
+    password_hash = generate_password_hash(PASSWORD)
+    insert_chunks(User, ({
+        'username': f'user{i}', 'email': f'user{i}@example.com',
+        'password_hash': password_hash, 'about_me': f'I am user {i}',
+        'first_seen': now, 'last_seen': now,
+    } for i in range(1, num_users + 1)))
+
+    cum_weights = zipf_weights(num_users, 0.8)
+    user_ids = range(1, num_users + 1)
+    insert_chunks(Post, ({
+        'text': ' '.join(rnd.choices(WORDS, k=rnd.randint(5, 40)))[:280],
+        'user_id': rnd.choices(user_ids, cum_weights=cum_weights)[0],
+        'timestamp': now - timedelta(seconds=rnd.randint(0, 365 * 86400)),
+    } for _ in range(num_posts)))
+
+    insert_chunks(followers, ({
+        'follower_id': follower_id, 'followed_id': followed_id,
+    } for follower_id, followed_id in follower_edges(
+        rnd, user_ids, mean_follows=mean_follows)))
@@ -0,0 +1,339 @@
+"""Load tests that drive the API with a mix of realistic requests.
+
+The requests are sent to an application running in this process, or to a
+server given by its URL. Examples::
+
+    python -m benchmarks.loadtest run --concurrency 8 --duration 30
+    python -m benchmarks.loadtest run --url http://localhost:5000 \\
+        --mix feed=10,post=1
+    python -m benchmarks.loadtest replay access.log --url http://localhost:5000
+
+Runs against a server log in as the ``user<n>`` users generated by the
+benchmarks dataset, so the server database must be populated with it first::
+
+    alembic upgrade head
+    python -m benchmarks.loadtest seed --users 1000 --posts 20000
+"""
+from contextlib import contextmanager
+import json
+import os
+import random
+import re
+from tempfile import TemporaryDirectory
+from threading import Lock, Thread
+from time import monotonic, perf_counter
+
+import click
+
+from benchmarks.dataset import PASSWORD
+
+DEFAULT_MIX = 'login=2,feed=40,profile=30,post=10,follow=18'
+ACCESS_LOG_REQUEST = re.compile(r'"(GET|HEAD) (/\S*) HTTP/[\d.]+"')
+IDS = re.compile(r'/\d+(?=/|$)')
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a scenario of the traffic mix."""
+    def decorator(f):
+        SCENARIOS[name] = f
+        return f
+    return decorator
+
+
+class WSGITransport:
+    """Send requests to an application in this process."""
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def open(self, method, path, auth=None, headers=None, json=None):
+        rv = self.client.open(path, method=method, auth=auth,
+                              headers=headers, json=json)
+        return rv.status_code, rv.json if rv.is_json and rv.data else None
+
+
+class HTTPTransport:
+    """Send requests to a server."""
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def open(self, method, path, auth=None, headers=None, json=None):
+        rv = self.session.request(method, self.url + path, auth=auth,
+                                  headers=headers, json=json, timeout=60)
+        is_json = rv.headers.get('Content-Type', '').startswith(
+            'application/json')
+        return rv.status_code, rv.json() if is_json and rv.content else None
+
+
+class Stats:
+    """Latencies and errors of the requests, grouped by endpoint."""
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = {}
+        self.start = monotonic()
+        self.end = None
+
+    def add(self, endpoint, latency, error):
+        with self.lock:
+            self.requests.setdefault(endpoint, []).append((latency, error))
+
+    @staticmethod
+    def summarize(requests, elapsed):
+        latencies = sorted(latency for latency, _ in requests)
+
+        def percentile(p):
+            return latencies[max(int(len(latencies) * p / 100 + 0.5) - 1,
+                                 0)]
+
+        return {
+            'requests': len(requests),
+            'throughput': len(requests) / elapsed,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'error_rate': sum(error for _, error in requests) /
+            len(requests),
+        }
+
+    def report(self):
+        elapsed = (self.end or monotonic()) - self.start
+        report = {endpoint: self.summarize(requests, elapsed)
+                  for endpoint, requests in sorted(self.requests.items())}
+        all_requests = [r for requests in self.requests.values()
+                        for r in requests]
+        if all_requests:
+            report['total'] = self.summarize(all_requests, elapsed)
+        return report
+
+
+class Worker:
+    """Client that logs in as a user and sends requests on its behalf."""
+    def __init__(self, transport, stats, username, num_users, rnd):
+        self.transport = transport
+        self.stats = stats
+        self.username = username
+        self.num_users = num_users
+        self.rnd = rnd
+        self.headers = {}
+
+    def request(self, method, path, expected=(), **kwargs):
+        endpoint = '{} {}'.format(method, IDS.sub('/<id>',
+                                                  path.split('?')[0]))
+        start = perf_counter()
+        try:
+            status, body = self.transport.open(
+                method, path, headers=self.headers, **kwargs)
+        except Exception:
+            status, body = None, None
+        self.stats.add(endpoint, perf_counter() - start,
+                       status is None or
+                       (status >= 400 and status not in expected))
+        return status, body
+
+    def random_user_id(self):
+        return self.rnd.randint(1, self.num_users)
+
+
+@scenario('login')
+def login(worker):
+    status, body = worker.request('POST', '/api/tokens',
+                                  auth=(worker.username, PASSWORD))
+    if status == 200:
+        worker.headers = {
+            'Authorization': f'Bearer {body["access_token"]}'}
+
+
+@scenario('feed')
+def feed(worker):
+    worker.request('GET', '/api/feed')
+
+
+@scenario('profile')
+def profile(worker):
+    id = worker.random_user_id()
+    status, _ = worker.request('GET', f'/api/users/{id}', expected=(404,))
+    if status == 200:
+        worker.request('GET', f'/api/users/{id}/posts')
+
+
+@scenario('post')
+def post(worker):
+    worker.request('POST', '/api/posts', json={
+        'text': 'load test post {}'.format(worker.rnd.random())})
+
+
+@scenario('follow')
+def follow(worker):
+    # the follow state of a user is not known in advance, so conflicts are
+    # expected and resolved by reverting the follow
+    id = worker.random_user_id()
+    status, _ = worker.request('POST', f'/api/me/following/{id}',
+                               expected=(404, 409))
+    if status == 409:
+        worker.request('DELETE', f'/api/me/following/{id}',
+                       expected=(404, 409))
+
+
+def parse_mix(mix):
+    weights = {}
+    for item in mix.split(','):
+        name, weight = item.split('=')
+        if name not in SCENARIOS:
+            raise click.BadParameter(f'Unknown scenario {name}.')
+        weights[name] = float(weight)
+    return weights
+
+
+@contextmanager
+def transports(url, num_users, num_posts, seed):
+    """Yield a function that creates a transport for each worker.
+
+    Without a URL, a temporary database is populated with the benchmarks
+    dataset and requests are sent to an application in this process.
+    """
+    if url:
+        yield lambda: HTTPTransport(url)
+        return
+
+    from api.app import create_app, db
+    from benchmarks.dataset import generate
+    from config import Config
+
+    with TemporaryDirectory() as directory:
+        class LoadTestConfig(Config):
+            ALCHEMICAL_DATABASE_URL = 'sqlite:///' + os.path.join(
+                directory, 'loadtest.sqlite')
+            SLOW_REQUEST_THRESHOLD = 0
+
+        app = create_app(LoadTestConfig)
+        with app.app_context():
+            db.create_all()
+            generate(num_users=num_users, num_posts=num_posts, seed=seed)
+        try:
+            yield lambda: WSGITransport(app)
+        finally:
+            with app.app_context():
+                db.get_engine().dispose()
+
+
+def run_workers(concurrency, work):
+    threads = [Thread(target=work, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def print_report(report, output):
+    print('{:<40}{:>9}{:>9}{:>9}{:>9}{:>9}{:>8}'.format(
+        'endpoint', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms',
+        'errors'))
+    for endpoint, s in report.items():
+        print('{:<40}{:>9}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>8.1%}'.format(
+            endpoint, s['requests'], s['throughput'], s['p50'] * 1000,
+            s['p95'] * 1000, s['p99'] * 1000, s['error_rate']))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def common_options(f):
+    for option in reversed([
+            click.option('--url', help='URL of the server to test. When '
+                         'not given, the application runs in this process.'),
+            click.option('--concurrency', default=8,
+                         help='Number of concurrent clients.'),
+            click.option('--users', default=1000,
+                         help='Number of users in the dataset.'),
+            click.option('--posts', default=20000,
+                         help='Number of posts in the generated dataset.'),
+            click.option('--seed', default=42, help='Random seed.'),
+            click.option('--output', type=click.Path(),
+                         help='File to write the results to, as JSON.')]):
+        f = option(f)
+    return f
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@common_options
+@click.option('--duration', default=30.0, help='Duration in seconds.')
+@click.option('--mix', default=DEFAULT_MIX,
+              help='Relative weights of the scenarios.')
+def run(url, concurrency, users, posts, seed, output, duration, mix):
+    """Send a mix of requests for a given time."""
+    weights = parse_mix(mix)
+    stats = Stats()
+    with transports(url, users, posts, seed) as transport:
+        def work(i):
+            rnd = random.Random(seed + i)
+            worker = Worker(transport(), stats, f'user{i % users + 1}',
+                            users, rnd)
+            login(worker)
+            while monotonic() - stats.start < duration:
+                name = rnd.choices(list(weights),
+                                   weights=list(weights.values()))[0]
+                SCENARIOS[name](worker)
+
+        stats.start = monotonic()
+        run_workers(concurrency, work)
+        stats.end = monotonic()
+    print_report(stats.report(), output)
+
+
+@cli.command()
+@click.option('--users', default=1000, help='Number of users to generate.')
+@click.option('--posts', default=20000, help='Number of posts to generate.')
+@click.option('--seed', default=42, help='Random seed.')
+def seed(users, posts, seed):
+    """Add the benchmarks dataset to the configured database.
+
+    The database must be empty.
+    """
+    from api.app import create_app
+    from benchmarks.dataset import generate
+
+    with create_app().app_context():
+        generate(num_users=users, num_posts=posts, seed=seed)
+
+
+@cli.command()
+@click.argument('log', type=click.File())
+@common_options
+def replay(log, url, concurrency, users, posts, seed, output):
+    """Replay the GET requests of a gunicorn access log.
+
+    The requests are sent as fast as the clients can send them, each client
+    logged in as a different user.
+    """
+    paths = [match.group(2) for match in map(ACCESS_LOG_REQUEST.search, log)
+             if match]
+    lock = Lock()
+    stats = Stats()
+    with transports(url, users, posts, seed) as transport:
+        def work(i):
+            worker = Worker(transport(), stats, f'user{i % users + 1}',
+                            users, random.Random(seed + i))
+            login(worker)
+            while True:
+                with lock:
+                    if not paths:
+                        break
+                    path = paths.pop()
+                worker.request('GET', path, expected=(404,))
+
+        paths.reverse()
+        stats.start = monotonic()
+        run_workers(concurrency, work)
+        stats.end = monotonic()
+    print_report(stats.report(), output)
+
+
+if __name__ == '__main__':
+    cli()
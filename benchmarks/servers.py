@@ -0,0 +1,133 @@
+"""Compare the throughput of the synchronous and asynchronous deployments.
+
+Each server runs with the same number of worker processes on a database
+with the benchmarks dataset, while the load test sends read requests from
+many concurrent clients::
+
+    python -m benchmarks.servers --workers 2 --concurrency 64
+
+The dataset is created in the database given in the TEST_DATABASE_URL
+environment variable, which is emptied, or in a temporary SQLite database.
+The asynchronous server requires the packages of the ``async`` extra.
+"""
+from contextlib import contextmanager
+import json
+import os
+import socket
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import monotonic, sleep
+from urllib.error import URLError
+from urllib.request import urlopen
+
+import click
+
+from benchmarks import loadtest
+
+READ_MIX = 'feed=60,profile=40'
+SERVERS = {
+    'sync': ['gunicorn', '-c', 'gunicorn.conf.py', '-k', 'sync',
+             '-b', '127.0.0.1:{port}', 'microblog:app'],
+    'gthread': ['gunicorn', '-c', 'gunicorn.conf.py', '-k', 'gthread',
+                '-b', '127.0.0.1:{port}', 'microblog:app'],
+    'async': ['uvicorn', '--host', '127.0.0.1', '--port', '{port}',
+              '--workers', '{workers}', '--log-level', 'warning',
+              'microblog_asgi:app'],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def server(name, database_url, workers):
+    """Start a server and yield its URL once it accepts requests."""
+    port = free_port()
+    command = [arg.format(port=port, workers=workers)
+               for arg in SERVERS[name]]
+    env = dict(os.environ, DATABASE_URL=database_url,
+               WEB_CONCURRENCY=str(workers), SLOW_REQUEST_THRESHOLD='0')
+    process = subprocess.Popen([sys.executable, '-m'] + command, env=env,
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = monotonic() + 30
+        while True:
+            try:
+                urlopen(url + '/apispec.json', timeout=1).close()
+                break
+            except (URLError, OSError):
+                if process.poll() is not None or monotonic() > deadline:
+                    raise click.ClickException(f'The {name} server did not '
+                                               'start.')
+                sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@click.command()
+@click.argument('names', nargs=-1, type=click.Choice(list(SERVERS)))
+@click.option('--workers', default=2, help='Worker processes per server.')
+@click.option('--concurrency', default=64,
+              help='Number of concurrent clients.')
+@click.option('--duration', default=20.0, help='Seconds per server.')
+@click.option('--users', default=1000, help='Number of users to generate.')
+@click.option('--posts', default=20000, help='Number of posts to generate.')
+@click.option('--seed', default=42, help='Random seed.')
+@click.option('--mix', default=READ_MIX,
+              help='Relative weights of the load test scenarios.')
+@click.option('--output', type=click.Path(),
+              help='File to write the results to, in JSON format.')
+def main(names, workers, concurrency, duration, users, posts, seed, mix,
+         output):
+    """Run the load test against each server."""
+    from api.app import create_app, db
+    from benchmarks.dataset import generate
+    from config import Config
+
+    results = {}
+    with TemporaryDirectory() as directory:
+        database_url = os.environ.get('TEST_DATABASE_URL') or \
+            'sqlite:///' + os.path.join(directory, 'servers.sqlite')
+
+        class ServersConfig(Config):
+            ALCHEMICAL_DATABASE_URL = database_url
+
+        app = create_app(ServersConfig)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            generate(num_users=users, num_posts=posts, seed=seed)
+            db.get_engine().dispose()
+
+        for name in names or SERVERS:
+            print(f'\n{name} server, {workers} workers:')
+            with server(name, database_url, workers) as url:
+                report = os.path.join(directory, f'{name}.json')
+                loadtest.run.callback(
+                    url=url, concurrency=concurrency, users=users,
+                    posts=posts, seed=seed, output=report, duration=duration,
+                    mix=mix)
+            with open(report) as f:
+                results[name] = json.load(f)['total']
+
+    print('\n{:<10}{:>9}{:>9}{:>9}{:>9}{:>8}'.format(
+        'server', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for name, s in results.items():
+        print('{:<10}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>8.1%}'.format(
+            name, s['throughput'], s['p50'] * 1000, s['p95'] * 1000,
+            s['p99'] * 1000, s['error_rate']))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Micro-benchmarks for the hot paths of the API."""
+from datetime import datetime, timezone
+from hashlib import md5
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from timeit import Timer
+
+from flask import url_for
+from flask.json.provider import DefaultJSONProvider
+import sqlalchemy as sa
+from sqlalchemy import orm as so
+
+from api.app import create_app, db
+from api.models import User, Post, followers
+from api.posts import posts_schema
+from api.schemas import DateTimePaginationSchema, PaginatedCollection, \
+    PostSchema
+from benchmarks.dataset import generate
+from config import Config
+
+BENCHMARKS = {}
+
+
+def benchmark(name, app_context=True):
+    """Register a benchmark.
+
+    The decorated function receives the benchmark context and returns the
+    function to time. Benchmarks that send requests through the test client
+    are timed outside of an application context, so that each request gets
+    its own context, as it would in a server.
+    """
+    def decorator(f):
+        BENCHMARKS[name] = (f, app_context)
+        return f
+    return decorator
+
+
+class BenchmarkConfig(Config):
+    SERVER_NAME = 'localhost'
+    SLOW_REQUEST_THRESHOLD = 0
+    REFRESH_TOKEN_IN_BODY = True
+
+
+class Context:
+    """Application, client and sample data shared by the benchmarks."""
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.data = {}
+
+        # the most followed user, and the user that follows the most users
+        self.user_id = 1
+        self.follower_id = db.session.scalar(
+            sa.select(followers.c.follower_id).group_by(
+                followers.c.follower_id).order_by(
+                    sa.func.count().desc()).limit(1)) or 1
+        self.post_count = db.session.scalar(
+            sa.select(sa.func.count()).select_from(Post))
+
+        user = db.session.get(User, self.follower_id)
+        token = user.generate_auth_token()
+        db.session.add(token)
+        db.session.commit()
+        self.access_token = token.access_token_jwt
+        self.headers = {'Authorization': f'Bearer {self.access_token}'}
+
+    def get(self, url):
+        rv = self.client.get(url, headers=self.headers)
+        assert rv.status_code == 200, (url, rv.status_code)
+        return rv
+
+
+def recent_posts():
+    return db.session.scalars(Post.select().options(
+        so.selectinload(Post.author)).order_by(
+            Post.timestamp.desc()).limit(25)).all()
+
+
+@benchmark('post_schema_dump')
+def post_schema_dump(ctx):
+    posts = recent_posts()
+    schema = PostSchema(many=True)
+    return lambda: schema.dump(posts)
+
+
+@benchmark('post_item_urls')
+def post_item_urls(ctx):
+    posts = recent_posts()
+
+    def urls():
+        with ctx.app.test_request_context():
+            return [(post.url, post.author.url, post.author.posts_url,
+                     post.author.avatar_url) for post in posts]
+
+    return urls
+
+
+@benchmark('post_item_urls_url_for')
+def post_item_urls_url_for(ctx):
+    # the URLs of a page of posts, built as they were before the URL
+    # templates and the avatar hash column were added
+    posts = recent_posts()
+
+    def urls():
+        with ctx.app.test_request_context():
+            return [(
+                url_for('posts.get', id=post.id),
+                url_for('users.get', id=post.author.id),
+                url_for('posts.user_all', id=post.author.id),
+                'https://www.gravatar.com/avatar/{}?d=identicon'.format(
+                    md5(post.author.email.lower().encode(
+                        'utf-8')).hexdigest()),
+            ) for post in posts]
+
+    return urls
+
+
+def posts_page():
+    posts = recent_posts()
+    return PaginatedCollection(
+        posts_schema, pagination_schema=DateTimePaginationSchema)().dump({
+            'data': posts,
+            'pagination': {'offset': 0, 'limit': 25, 'count': len(posts),
+                           'total': len(posts)},
+        })
+
+
+@benchmark('paginated_posts_encode')
+def paginated_posts_encode(ctx):
+    page = posts_page()
+    return lambda: ctx.app.json.dumps_bytes(page)
+
+
+@benchmark('paginated_posts_encode_stdlib')
+def paginated_posts_encode_stdlib(ctx):
+    page = posts_page()
+    provider = DefaultJSONProvider(ctx.app)
+    return lambda: provider.dumps(page, separators=(',', ':')).encode()
+
+
+@benchmark('paginated_response_shallow', app_context=False)
+def paginated_response_shallow(ctx):
+    return lambda: ctx.get('/api/posts')
+
+
+@benchmark('paginated_response_deep', app_context=False)
+def paginated_response_deep(ctx):
+    url = '/api/posts?offset={}'.format(max(ctx.post_count - 25, 0))
+    return lambda: ctx.get(url)
+
+
+@benchmark('followed_posts_select')
+def followed_posts_select(ctx):
+    user = db.session.get(User, ctx.follower_id)
+    query = user.followed_posts_select().order_by(
+        Post.timestamp.desc()).limit(25)
+    return lambda: db.session.scalars(query).all()
+
+
+@benchmark('verify_token')
+def verify_token(ctx):
+    return lambda: User.verify_access_token(ctx.access_token)
+
+
+@benchmark('follow_unfollow')
+def follow_unfollow(ctx):
+    user = db.session.get(User, ctx.follower_id)
+    other = db.session.scalar(User.select().where(
+        User.id != user.id, ~User.followers.contains(user)).limit(1))
+
+    def follow_unfollow():
+        user.follow(other)
+        db.session.commit()
+        user.unfollow(other)
+        db.session.commit()
+
+    return follow_unfollow
+
+
+@benchmark('cold_start', app_context=False)
+def cold_start(ctx):
+    # a new interpreter is used, so that the imports are not cached
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return lambda: subprocess.run(
+        [sys.executable, '-c', 'from api.app import create_app; create_app()'],
+        check=True, cwd=root)
+
+
+def time_function(f, number=None, repeat=5):
+    """Return timing statistics for a function, in seconds per call."""
+    timer = Timer(f)
+    if number is None:
+        number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'median': statistics.median(times),
+        'min': min(times),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run(database_url, names=None, num_users=1000, num_posts=20000,
+        mean_follows=20, seed=42, number=None, repeat=5, log=print):
+    """Generate a dataset in the given database and run the benchmarks.
+
+    Any tables already in the database are dropped.
+    """
+    class Config(BenchmarkConfig):
+        ALCHEMICAL_DATABASE_URL = database_url
+
+    app = create_app(Config)
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(num_users=num_users, num_posts=num_posts,
+                 mean_follows=mean_follows, seed=seed)
+        ctx = Context(app)
+        dialect = db.get_engine().dialect.name
+    try:
+        for name, (setup, app_context) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            app_ctx = app.app_context()
+            app_ctx.push()
+            try:
+                f = setup(ctx)
+                if not app_context:
+                    app_ctx.pop()
+                    app_ctx = None
+                results[name] = time_function(f, number=number,
+                                              repeat=repeat)
+            finally:
+                if app_ctx is not None:
+                    db.session.rollback()
+                    app_ctx.pop()
+            log('{:<32}{:>12.1f}us'.format(
+                name, results[name]['median'] * 1e6))
+    finally:
+        with app.app_context():
+            db.drop_all()
+            db.get_engine().dispose()
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'database': dialect,
+            'users': num_users,
+            'posts': num_posts,
+            'mean_follows': mean_follows,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, results, threshold=0.1):
+    """Return the benchmarks that are slower than in a baseline run.
+
+    A benchmark is a regression when its median time grew by more than the
+    threshold, given as a fraction of the baseline time.
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = result['median'] / old['median']
+        if ratio > 1 + threshold:
+            regressions.append((name, old['median'], result['median'],
+                                ratio))
+    return regressions
@@ -1,3 +1,3 @@
 #!/bin/sh
 alembic upgrade head
-exec gunicorn -b :5000 --access-logfile - --error-logfile - microblog:app
+exec gunicorn -c gunicorn.conf.py -b :5000 microblog:app
@@ -11,11 +11,53 @@ def as_bool(value):
     return False
 
 
+def pool_options():
+    options = {
+        'pool_pre_ping': as_bool(os.environ.get('DATABASE_POOL_PRE_PING')),
+    }
+    for option in ['pool_size', 'max_overflow', 'pool_recycle',
+                   'pool_timeout']:
+        value = os.environ.get('DATABASE_' + option.upper())
+        if value:
+            options[option] = int(value)
+    return options
+
+
 class Config:
     # database options
     ALCHEMICAL_DATABASE_URL = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'db.sqlite')
-    ALCHEMICAL_ENGINE_OPTIONS = {'echo': as_bool(os.environ.get('SQL_ECHO'))}
+    ALCHEMICAL_ENGINE_OPTIONS = {'echo': as_bool(os.environ.get('SQL_ECHO')),
+                                 **pool_options()}
+    DATABASE_STATEMENT_TIMEOUT = int(
+        os.environ.get('DATABASE_STATEMENT_TIMEOUT') or '0')
+    DATABASE_COLLECTION_STATEMENT_TIMEOUT = int(
+        os.environ.get('DATABASE_COLLECTION_STATEMENT_TIMEOUT') or '5000')
+
+    # load shedding options
+    ADMISSION_LIMITS = {
+        'auth': int(os.environ.get('ADMISSION_AUTH_LIMIT') or '0'),
+        'write': int(os.environ.get('ADMISSION_WRITE_LIMIT') or '0'),
+        'read': int(os.environ.get('ADMISSION_READ_LIMIT') or '0'),
+    }
+    ADMISSION_MAX_POOL_WAIT = int(
+        os.environ.get('ADMISSION_MAX_POOL_WAIT') or '0')
+    ADMISSION_POOL_WAIT_HALF_LIFE = 5
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or '1')
+
+    # instrumentation options
+    SERVER_TIMING = as_bool(os.environ.get('SERVER_TIMING') or 'no')
+    SLOW_REQUEST_THRESHOLD = int(
+        os.environ.get('SLOW_REQUEST_THRESHOLD') or '500')
+    METRICS_ENABLED = as_bool(os.environ.get('METRICS_ENABLED') or 'no')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_WRITE_INTERVAL = int(
+        os.environ.get('METRICS_WRITE_INTERVAL') or '5')
+    PROFILER_SAMPLE_RATE = float(
+        os.environ.get('PROFILER_SAMPLE_RATE') or '0')
+    PROFILER_SECRET = os.environ.get('PROFILER_SECRET')
+    PROFILER_INTERVAL = int(os.environ.get('PROFILER_INTERVAL') or '5')
 
     # security options
     SECRET_KEY = os.environ.get('SECRET_KEY', 'top-secret!')
@@ -29,7 +71,21 @@ class Config:
     PASSWORD_RESET_URL = os.environ.get('PASSWORD_RESET_URL') or \
         'http://localhost:3000/reset'
     USE_CORS = as_bool(os.environ.get('USE_CORS') or 'yes')
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or
+                             '1048576') or None
+    REQUEST_DRAIN_LIMIT = int(os.environ.get('REQUEST_DRAIN_LIMIT') or
+                              '65536')
     CORS_SUPPORTS_CREDENTIALS = True
+    BATCH_MAX_IDS = int(os.environ.get('BATCH_MAX_IDS') or '100')
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS') or '20')
+
+    # compression options
+    COMPRESSION = as_bool(os.environ.get('COMPRESSION') or 'yes')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or '500')
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL') or '6')
+    COMPRESS_BROTLI_LEVEL = int(os.environ.get('COMPRESS_BROTLI_LEVEL') or '4')
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL') or '3')
+    COMPRESS_CACHE_SIZE = int(os.environ.get('COMPRESS_CACHE_SIZE') or '256')
     OAUTH2_PROVIDERS = {
         # https://developers.google.com/identity/protocols/oauth2/web-server
         # #httprest
@@ -60,12 +116,18 @@ class Config:
     }
     OAUTH2_REDIRECT_URI = os.environ.get('OAUTH2_REDIRECT_URI') or \
         'http://localhost:3000/oauth2/{provider}/callback'
+    OAUTH2_CONNECT_TIMEOUT = float(
+        os.environ.get('OAUTH2_CONNECT_TIMEOUT') or '3')
+    OAUTH2_READ_TIMEOUT = float(os.environ.get('OAUTH2_READ_TIMEOUT') or '10')
+    OAUTH2_RETRIES = int(os.environ.get('OAUTH2_RETRIES') or '2')
+    OAUTH2_POOL_SIZE = int(os.environ.get('OAUTH2_POOL_SIZE') or '10')
 
     # API documentation
     APIFAIRY_TITLE = 'Microblog API'
     APIFAIRY_VERSION = '1.0'
     APIFAIRY_UI = os.environ.get('DOCS_UI', 'elements')
-    APIFAIRY_TAGS = ['tokens', 'users', 'posts']
+    APIFAIRY_TAGS = ['tokens', 'users', 'posts', 'batch']
+    APISPEC_FILE = os.environ.get('APISPEC_FILE')
 
     # email options
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
@@ -75,3 +137,19 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER=os.environ.get('MAIL_DEFAULT_SENDER',
                                        'donotreply@microblog.example.com')
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS') or '2')
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or '100')
+    MAIL_QUEUE_POLICY = os.environ.get('MAIL_QUEUE_POLICY') or 'block'
+    MAIL_QUEUE_TIMEOUT = int(os.environ.get('MAIL_QUEUE_TIMEOUT') or '5')
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or '20')
+    MAIL_IDLE_TIMEOUT = int(os.environ.get('MAIL_IDLE_TIMEOUT') or '30')
+    MAIL_TIMEOUT = int(os.environ.get('MAIL_TIMEOUT') or '10')
+    MAIL_SHUTDOWN_TIMEOUT = float(
+        os.environ.get('MAIL_SHUTDOWN_TIMEOUT') or '10')
+    MAIL_OUTBOX = as_bool(os.environ.get('MAIL_OUTBOX'))
+    MAIL_OUTBOX_MAX_ATTEMPTS = int(
+        os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS') or '10')
+    MAIL_OUTBOX_RETRY_DELAY = int(
+        os.environ.get('MAIL_OUTBOX_RETRY_DELAY') or '30')
+    MAIL_OUTBOX_POLL_INTERVAL = int(
+        os.environ.get('MAIL_OUTBOX_POLL_INTERVAL') or '1')
@@ -0,0 +1,69 @@
+"""Gunicorn configuration.
+
+The number of workers, the worker class and the number of threads or
+connections of each worker can be configured with environment variables.
+"""
+import os
+
+from config import as_bool
+
+
+def cpu_count():
+    try:
+        # only the CPUs this process can run on, which can be fewer than the
+        # CPUs of the host in a container
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover
+        return os.cpu_count() or 1
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or 'gthread'
+if worker_class == 'sync':
+    default_workers = cpu_count() * 2 + 1
+else:
+    default_workers = cpu_count() + 1
+workers = int(os.environ.get('WEB_CONCURRENCY') or default_workers)
+threads = int(os.environ.get('GUNICORN_THREADS') or '4')
+worker_connections = int(
+    os.environ.get('GUNICORN_WORKER_CONNECTIONS') or '1000')
+preload_app = as_bool(os.environ.get('GUNICORN_PRELOAD') or 'yes')
+accesslog = '-'
+errorlog = '-'
+
+if worker_class == 'gevent':  # pragma: no cover
+    # the standard library must be patched before the application is loaded
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    # remove the metrics and profiles of a previous run
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.endswith('.json'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from api.prefork import warm_up
+        warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    from api.prefork import after_fork
+    after_fork()
+
+
+def worker_exit(server, worker):
+    # send the emails that are still queued in the worker
+    from api.email import email_queue
+    email_queue.shutdown()
+
+
+def child_exit(server, worker):
+    metrics_dir = os.environ.get('METRICS_DIR')
+    if metrics_dir:
+        from api.metrics import mark_process_dead
+        mark_process_dead(metrics_dir, worker.pid)
@@ -0,0 +1,47 @@
+"""outbox
+
+Revision ID: 013c7abfe4f2
+Revises: 9c4e1f7a2d35
+Create Date: 2026-10-19 14:20:51.262839
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '013c7abfe4f2'
+down_revision = '9c4e1f7a2d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipient', sa.String(length=120), nullable=False),
+        sa.Column('subject', sa.String(length=128), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('html', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('next_attempt', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.String(length=256), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_outbox_next_attempt'), 'outbox',
+                    ['next_attempt'], unique=False)
+
+
+def downgrade_() -> None:
+    op.drop_index(op.f('ix_outbox_next_attempt'), table_name='outbox')
+    op.drop_table('outbox')
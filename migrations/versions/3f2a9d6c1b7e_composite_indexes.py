@@ -0,0 +1,77 @@
+"""composite indexes
+
+Revision ID: 3f2a9d6c1b7e
+Revises: 5adf634a5e8b
+Create Date: 2026-10-19 10:12:44.218530
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9d6c1b7e'
+down_revision = '5adf634a5e8b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def online():
+    # Postgres builds indexes without locking out writes only when it runs
+    # outside of a transaction, so each statement gets its own commit
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block()
+    return nullcontext()
+
+
+def upgrade_() -> None:
+    with online():
+        op.create_index('ix_posts_user_id_timestamp_id', 'posts',
+                        ['user_id', 'timestamp', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_posts_timestamp_id', 'posts',
+                        ['timestamp', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_followers_followed_id_follower_id', 'followers',
+                        ['followed_id', 'follower_id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_tokens_user_id_refresh_expiration', 'tokens',
+                        ['user_id', 'refresh_expiration'], unique=False,
+                        postgresql_concurrently=True)
+
+        # these are now covered by the leading columns of the new indexes
+        op.drop_index('ix_posts_user_id', table_name='posts',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_posts_timestamp', table_name='posts',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_tokens_user_id', table_name='tokens',
+                      postgresql_concurrently=True)
+
+
+def downgrade_() -> None:
+    with online():
+        op.create_index('ix_tokens_user_id', 'tokens', ['user_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_posts_timestamp', 'posts', ['timestamp'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_posts_user_id', 'posts', ['user_id'],
+                        unique=False, postgresql_concurrently=True)
+
+        op.drop_index('ix_tokens_user_id_refresh_expiration',
+                      table_name='tokens', postgresql_concurrently=True)
+        op.drop_index('ix_followers_followed_id_follower_id',
+                      table_name='followers', postgresql_concurrently=True)
+        op.drop_index('ix_posts_timestamp_id', table_name='posts',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_posts_user_id_timestamp_id', table_name='posts',
+                      postgresql_concurrently=True)
@@ -0,0 +1,58 @@
+"""user avatar hash
+
+Revision ID: 7d1b5e3a9c42
+Revises: 013c7abfe4f2
+Create Date: 2026-10-19 15:02:37.518204
+
+"""
+from hashlib import md5
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1b5e3a9c42'
+down_revision = '013c7abfe4f2'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade(engine_name: str) -> None:
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name: str) -> None:
+    globals()["downgrade_%s" % engine_name]()
+
+
+def upgrade_() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_hash', sa.String(length=32),
+                                      nullable=True))
+
+    # calculate the hashes of the existing users, updating them in batches
+    users = sa.table('users', sa.column('id', sa.Integer),
+                     sa.column('email', sa.String),
+                     sa.column('avatar_hash', sa.String))
+    update = users.update().where(users.c.id == sa.bindparam('user_id')) \
+        .values(avatar_hash=sa.bindparam('hash'))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(users.c.id, users.c.email)).all()
+    for i in range(0, len(rows), BATCH_SIZE):
+        connection.execute(update, [
+            {'user_id': id,
+             'hash': md5(email.lower().encode('utf-8')).hexdigest()}
+            for id, email in rows[i:i + BATCH_SIZE]])
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('avatar_hash',
+                              existing_type=sa.String(length=32),
+                              nullable=False)
+
+
+def downgrade_() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('avatar_hash')
@@ -1,4 +1,6 @@
+from contextlib import contextmanager
 import unittest
+import sqlalchemy as sa
 from api.app import create_app, db
 from api.models import User
 from config import Config
@@ -47,3 +49,28 @@ class BaseTestCase(unittest.TestCase):
         db.session.close()
         db.drop_all()
         self.app_context.pop()
+
+    @contextmanager
+    def capture_queries(self):
+        queries = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            if not executemany:
+                queries.append((statement, parameters))
+
+        engine = db.get_engine()
+        sa.event.listen(engine, 'before_cursor_execute',
+                        before_cursor_execute)
+        try:
+            yield queries
+        finally:
+            sa.event.remove(engine, 'before_cursor_execute',
+                            before_cursor_execute)
+
+    @contextmanager
+    def assert_max_queries(self, max_queries):
+        with self.capture_queries() as queries:
+            yield queries
+        assert len(queries) <= max_queries, \
+            [' '.join(statement.split()) for statement, _ in queries]
@@ -0,0 +1,76 @@
+"""A local stand-in for an OAuth2 provider, used in tests."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qs
+
+
+class OAuth2Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_request(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode()
+        with server.lock:
+            server.requests.append((self.command, self.path,
+                                    dict(self.headers), parse_qs(body)))
+            responses = server.responses.get((self.command, self.path))
+            status, data = responses.pop(0) if len(responses) > 1 \
+                else responses[0]
+        if server.delay:
+            sleep(server.delay)
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = handle_request
+
+
+class OAuth2Provider(ThreadingHTTPServer):
+    """HTTP server with a token endpoint at ``/token`` and a user endpoint
+    at ``/me``.
+
+    The responses of each endpoint are given as a list of status code and
+    JSON data pairs, which are returned in order, with the last one repeated.
+    Received requests are stored in ``requests``.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('localhost', 0), OAuth2Handler)
+        self.lock = Lock()
+        self.requests = []
+        self.connections = 0
+        self.delay = 0
+        self.responses = {
+            ('POST', '/token'): [(200, {'access_token': 'foo-token'})],
+            ('GET', '/me'): [(200, {'email': 'foo@foo.com'})],
+        }
+
+    def url(self, path):
+        return f'http://localhost:{self.server_address[1]}{path}'
+
+    def handle_error(self, request, client_address):
+        # clients that time out close the connection before the response
+        pass
+
+    def get_request(self):
+        with self.lock:
+            self.connections += 1
+        return super().get_request()
+
+    def __enter__(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
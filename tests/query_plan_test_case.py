@@ -0,0 +1,113 @@
+from datetime import timedelta
+import os
+import random
+import re
+import sqlalchemy as sa
+from api.app import db
+from api.dates import naive_utcnow
+from api.models import User, Post, followers
+from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+
+SQLITE_TABLE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW$)(?!anon_\d+$)\S+$')
+SQLITE_TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (.*)$')
+POSTGRES_TABLE_SCAN = re.compile(r'Seq Scan on (\S+)')
+POSTGRES_SORT = re.compile(r'^(->\s+)?(Incremental )?Sort\b')
+
+
+class QueryPlanTestConfig(TestConfigWithAuth):
+    # set TEST_DATABASE_URL to check the plans on another database, such as
+    # a local Postgres server
+    ALCHEMICAL_DATABASE_URL = os.environ.get('TEST_DATABASE_URL') or \
+        'sqlite://'
+
+
+class QueryPlanTestCase(BaseTestCase):
+    """Base class for tests that check the plans of the queries issued by
+    the API endpoints against a seeded dataset."""
+    config = QueryPlanTestConfig
+    num_users = 300
+    num_posts = 5000
+    num_follows = 3000
+
+    def setUp(self):
+        super().setUp()
+        self.seed()
+        rv = self.client.post('/api/tokens', auth=('test', 'foo'))
+        self.access_token = rv.json['access_token']
+        self.refresh_token = rv.json['refresh_token']
+
+    def seed(self):
+        rnd = random.Random(42)
+        now = naive_utcnow()
+        db.session.execute(sa.insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com',
+             'first_seen': now, 'last_seen': now}
+            for i in range(2, self.num_users + 1)])
+        db.session.execute(sa.insert(Post), [
+            {'text': f'Post {i}', 'user_id': rnd.randint(1, self.num_users),
+             'timestamp': now - timedelta(minutes=i)}
+            for i in range(self.num_posts)])
+        edges = {(1, i) for i in range(2, 52)} | \
+            {(i, 1) for i in range(100, 150)}
+        while len(edges) < self.num_follows:
+            edge = (rnd.randint(1, self.num_users),
+                    rnd.randint(1, self.num_users))
+            if edge[0] != edge[1]:
+                edges.add(edge)
+        db.session.execute(followers.insert(), [
+            {'follower_id': follower, 'followed_id': followed}
+            for follower, followed in sorted(edges)])
+        db.session.commit()
+
+    def explain(self, statement, parameters):
+        """Return the plan of a query as a list of lines."""
+        with db.get_engine().connect() as conn:
+            if conn.dialect.name == 'postgresql':  # pragma: no cover
+                # make the planner use an index or avoid sorting whenever
+                # it is possible, so that only unavoidable cases show up
+                conn.exec_driver_sql('SET enable_seqscan = off')
+                conn.exec_driver_sql('SET enable_sort = off')
+                return [line.strip() for line in conn.exec_driver_sql(
+                    'EXPLAIN ' + statement, parameters).scalars()]
+            return [row[3] for row in conn.exec_driver_sql(
+                'EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+    def plan_problems(self, plan, allow_scans=(), allow_sort=False):
+        problems = []
+        for line in plan:
+            scan = SQLITE_TABLE_SCAN.match(line) or \
+                POSTGRES_TABLE_SCAN.search(line)
+            if scan and scan.group(0).split()[-1] not in allow_scans:
+                problems.append(line)
+            sort = SQLITE_TEMP_SORT.match(line)
+            if sort and (not allow_sort or sort.group(1) != 'ORDER BY'):
+                problems.append(line)
+            if POSTGRES_SORT.match(line) and \
+                    not allow_sort:  # pragma: no cover
+                problems.append(line)
+        return problems
+
+    def assert_query_plans(self, method, url, allow_scans=(),
+                           allow_sort=False, authenticated=True,
+                           **kwargs):
+        """Send a request and check the plans of the queries it issued.
+
+        A query fails the check if it scans a whole table, or if it needs a
+        temporary sort. Tables given in ``allow_scans`` can be scanned, and
+        ``allow_sort`` permits sorting the final results of a query.
+        """
+        if authenticated:
+            kwargs.setdefault('headers', {})['Authorization'] = \
+                f'Bearer {self.access_token}'
+        with self.capture_queries() as queries:
+            rv = self.client.open(url, method=method, **kwargs)
+        assert rv.status_code < 400, (url, rv.status_code)
+        for statement, parameters in queries:
+            if statement.lstrip().split()[0].upper() not in [
+                    'SELECT', 'UPDATE', 'DELETE']:
+                continue
+            plan = self.explain(statement, parameters)
+            problems = self.plan_problems(plan, allow_scans=allow_scans,
+                                          allow_sort=allow_sort)
+            assert problems == [], (url, ' '.join(statement.split()), plan)
+        return rv
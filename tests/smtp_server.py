@@ -0,0 +1,109 @@
+"""A minimal SMTP server that keeps received messages in memory.
+
+It can be used in tests, or started on its own to see the emails sent by a
+local server that has ``MAIL_SERVER=localhost`` and ``MAIL_PORT=8025``::
+
+    python -m tests.smtp_server --port 8025
+"""
+import argparse
+from email import message_from_bytes
+import socketserver
+from threading import Lock, Thread
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost SMTP ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif verb in ['HELO', 'NOOP']:
+                self.reply('250 OK')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip())
+                self.reply('250 OK')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in [b'.\r\n', b'.\n', b'']:
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                server.received(sender, recipients,
+                                message_from_bytes(b''.join(data)))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP server that runs in a background thread.
+
+    Received messages are stored in ``messages`` as tuples with the sender,
+    the recipients and the parsed message. ``connections`` counts the
+    connections made to the server.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='localhost', port=0):
+        super().__init__((host, port), SMTPHandler)
+        self.lock = Lock()
+        self.messages = []
+        self.connections = 0
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def received(self, sender, recipients, message):
+        with self.lock:
+            self.messages.append((sender, recipients, message))
+
+    def __enter__(self):
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    class PrintingSMTPServer(SMTPServer):
+        def received(self, sender, recipients, message):
+            print(f'From: {sender}\nTo: {", ".join(recipients)}\n'
+                  f'Subject: {message["Subject"]}\n')
+
+    with PrintingSMTPServer(port=args.port) as server:
+        print(f'SMTP server listening on port {server.port}')
+        server.thread.join()
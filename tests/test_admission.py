@@ -0,0 +1,71 @@
+from time import monotonic
+from api.admission import admission
+from tests.base_test_case import BaseTestCase
+
+
+class AdmissionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['ADMISSION_LIMITS'] = {
+            'auth': 4, 'write': 3, 'read': 2}
+
+    def tearDown(self):
+        admission.in_flight = {name: 0 for name in admission.in_flight}
+        admission.pool_wait = {name: (0.0, 0.0)
+                               for name in admission.pool_wait}
+        super().tearDown()
+
+    def test_admitted(self):
+        rv = self.client.get('/api/users')
+        assert rv.status_code == 200
+        assert admission.in_flight == {'auth': 0, 'write': 0, 'read': 0}
+
+    def test_reads_shed_first(self):
+        admission.in_flight['read'] = 2
+        rv = self.client.get('/api/users')
+        assert rv.status_code == 503
+        assert rv.headers['Retry-After'] == '1'
+        rv = self.client.post('/api/posts', json={'text': 'hello'})
+        assert rv.status_code == 201
+        assert admission.in_flight == {'auth': 0, 'write': 0, 'read': 2}
+
+    def test_batch_of_reads(self):
+        admission.in_flight['read'] = 2
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/api/users'}, {'method': 'GET', 'url': '/api/posts'}]})
+        assert rv.status_code == 503
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/api/users'},
+            {'method': 'POST', 'url': '/api/posts', 'body': {'text': 'hi'}}]})
+        assert rv.status_code == 200
+        assert [r['status'] for r in rv.json['responses']] == [200, 201]
+        assert admission.in_flight == {'auth': 0, 'write': 0, 'read': 2}
+
+        admission.in_flight['read'] = 0
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/api/users'}]})
+        assert rv.status_code == 200
+        assert admission.in_flight == {'auth': 0, 'write': 0, 'read': 0}
+
+    def test_writes_shed_before_auth(self):
+        admission.in_flight['write'] = 3
+        rv = self.client.post('/api/posts', json={'text': 'hello'})
+        assert rv.status_code == 503
+        rv = self.client.put('/api/tokens', json={'access_token': 'x'})
+        assert rv.status_code == 401
+
+        admission.in_flight['write'] = 4
+        rv = self.client.put('/api/tokens', json={'access_token': 'x'})
+        assert rv.status_code == 503
+
+    def test_pool_wait(self):
+        self.app.config['ADMISSION_MAX_POOL_WAIT'] = 100
+        admission.pool_wait['write'] = (0.5, monotonic())
+        rv = self.client.get('/api/users')
+        assert rv.status_code == 503
+        rv = self.client.post('/api/posts', json={'text': 'hello'})
+        assert rv.status_code == 201
+
+        admission.pool_wait['write'] = (0.5, monotonic() - 60)
+        rv = self.client.get('/api/users')
+        assert rv.status_code == 200
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+from tempfile import TemporaryDirectory
+from api.admission import admission
+from api.app import db
+from api.asgi import AsyncReads
+from api.metrics import metrics
+from api.models import Post, User
+from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+
+
+class AsyncTests(BaseTestCase):
+    def setUp(self):
+        # the asyncio engine needs a database that it can share with the
+        # synchronous engine
+        self.directory = TemporaryDirectory()
+
+        class Config(TestConfigWithAuth):
+            ALCHEMICAL_DATABASE_URL = 'sqlite:///' + os.path.join(
+                self.directory.name, 'db.sqlite')
+            CORS_ORIGINS = ['https://example.com']
+
+        self.config = Config
+        super().setUp()
+        self.asgi = AsyncReads(self.app)
+        user = db.session.get(User, 1)
+        token = user.generate_auth_token()
+        db.session.add(token)
+        db.session.commit()
+        self.headers = {'Authorization': f'Bearer {token.access_token_jwt}'}
+
+    def tearDown(self):
+        super().tearDown()
+        asyncio.run(self.asgi.db.get_engine().dispose())
+        db.get_engine().dispose()
+        self.directory.cleanup()
+
+    def request(self, method, path, headers=None, query_string='',
+                fallback=True):
+        async def request():
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await self.asgi({
+                'type': 'http', 'http_version': '1.1', 'method': method,
+                'scheme': 'http', 'path': path, 'root_path': '',
+                'query_string': query_string.encode(),
+                'headers': [(name.lower().encode(), value.encode())
+                            for name, value in (headers or {}).items()],
+                'server': ('localhost', 5000),
+            }, receive, send)
+            return messages
+
+        # without a fallback, requests that reach the Flask application fail
+        wsgi = self.asgi.wsgi
+        if not fallback:
+            self.asgi.wsgi = None
+        try:
+            messages = asyncio.run(request())
+        finally:
+            self.asgi.wsgi = wsgi
+        body = b''.join(m.get('body', b'') for m in messages[1:])
+        self.headers_received = {name.decode(): value.decode()
+                                 for name, value in messages[0]['headers']}
+        return messages[0]['status'], json.loads(body) if body else None
+
+    def test_async_reads(self):
+        user = db.session.get(User, 1)
+        for i in range(30):
+            db.session.add(Post(author=user, text=f'post {i}'))
+        db.session.commit()
+
+        status, data = self.request('GET', '/api/me', headers=self.headers,
+                                    fallback=False)
+        assert status == 200
+        assert data['username'] == 'test'
+        assert data['url'] == '/api/users/1'
+
+        status, data = self.request('GET', '/api/users/test',
+                                    headers=self.headers, fallback=False)
+        assert status == 200
+        assert data['id'] == 1
+
+        status, data = self.request('GET', '/api/feed', headers=self.headers,
+                                    query_string='limit=10&offset=5',
+                                    fallback=False)
+        assert status == 200
+        rv = self.client.get('/api/feed?limit=10&offset=5',
+                             headers=self.headers)
+        assert data['pagination'] == rv.json['pagination']
+        assert [post['id'] for post in data['data']] == \
+            [post['id'] for post in rv.json['data']]
+        assert data['data'][0]['author']['username'] == 'test'
+
+        status, data = self.request('GET', '/api/users/1/posts',
+                                    headers=self.headers, fallback=False)
+        assert status == 200
+        assert data['pagination']['total'] == 30
+
+        status, data = self.request('GET', '/api/posts', headers=self.headers,
+                                    query_string='format=normalized',
+                                    fallback=False)
+        assert status == 200
+        assert data['data'][0]['author_id'] == 1
+        assert data['includes']['users']['1']['username'] == 'test'
+
+    def test_errors(self):
+        status, data = self.request('GET', '/api/me', fallback=False)
+        assert status == 401
+        assert data['code'] == 401
+        status, data = self.request('GET', '/api/users/2',
+                                    headers=self.headers, fallback=False)
+        assert status == 404
+        assert data['message'] == 'Not Found'
+        status, data = self.request('GET', '/api/feed', headers=self.headers,
+                                    query_string='limit=foo', fallback=False)
+        assert status == 400
+        assert 'limit' in data['errors']['query']
+
+    def test_fallback(self):
+        status, data = self.request('GET', '/api/users', headers=self.headers,
+                                    query_string='fields=id')
+        assert status == 200
+        assert data['data'] == [{'id': 1}]
+
+    def test_request_hooks(self):
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+        self.app.config['SERVER_TIMING'] = True
+        status, data = self.request('GET', '/api/me', headers=self.headers,
+                                    fallback=False)
+        assert status == 200
+        assert self.headers_received['server-timing'].startswith('db;')
+        assert metrics.counters[('http_requests_total', (
+            ('blueprint', 'users'), ('endpoint', 'users.me'),
+            ('method', 'GET'), ('status', 200)))] == 1
+
+        # requests are subject to admission control
+        self.app.config['ADMISSION_LIMITS'] = {'auth': 0, 'write': 0,
+                                               'read': 1}
+        with admission.lock:
+            admission.in_flight['read'] += 1
+        try:
+            status, data = self.request('GET', '/api/me',
+                                        headers=self.headers, fallback=False)
+        finally:
+            with admission.lock:
+                admission.in_flight['read'] -= 1
+        assert status == 503
+        assert self.headers_received['retry-after'] == '1'
+        assert admission.in_flight['read'] == 0
+
+    def test_cors(self):
+        headers = {'Origin': 'https://example.com', **self.headers}
+        status, data = self.request('GET', '/api/me', headers=headers,
+                                    fallback=False)
+        assert status == 200
+        assert self.headers_received['access-control-allow-origin'] == \
+            'https://example.com'
+
+        headers = {'Origin': 'https://evil.example.org', **self.headers}
+        status, data = self.request('GET', '/api/me', headers=headers,
+                                    fallback=False)
+        assert status == 200
+        assert 'access-control-allow-origin' not in self.headers_received
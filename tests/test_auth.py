@@ -1,7 +1,9 @@
 from datetime import timedelta
 from unittest import mock
 from api.dates import naive_utcnow
+from api.metrics import metrics
 from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+from tests.oauth2_provider import OAuth2Provider
 
 
 class AuthTests(BaseTestCase):
@@ -239,128 +241,126 @@ class AuthTests(BaseTestCase):
         rv = self.client.post('/api/tokens/oauth2/foo',
                               json={'code': '123', 'state': 'not-the-state'})
         assert rv.status_code == 401
-        with mock.patch('api.tokens.requests.post') as requests_post:
-            requests_post.return_value.status_code = 401
+        with OAuth2Provider() as provider:
+            self.use_provider(provider)
+            token_request = ('POST', '/token')
+            user_request = ('GET', '/me')
+
+            provider.responses[token_request] = [(401, {})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 401
+            method, path, headers, data = provider.requests[-1]
+            assert (method, path) == token_request
+            assert headers['Accept'] == 'application/json'
+            assert data == {
+                'client_id': ['foo-id'],
+                'client_secret': ['foo-secret'],
+                'code': ['123'],
+                'grant_type': ['authorization_code'],
+                'redirect_uri': ['http://localhost/oauth2/foo/callback'],
+            }
+
+            # auth with authorization code (failure case)
+            provider.responses[token_request] = [
+                (200, {'access_token': 'foo-token'})]
+            provider.responses[user_request] = [(401, {})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 401
+            method, path, headers, _ = provider.requests[-1]
+            assert (method, path) == user_request
+            assert headers['Authorization'] == 'Bearer foo-token'
+            assert headers['Accept'] == 'application/json'
+
+            # auth with authorization code (failure case)
+            provider.requests = []
+            provider.responses[token_request] = [
+                (200, {'not_access_token': 'foo-token'})]
+            provider.responses[user_request] = [(200, {})]
             rv = self.client.post('/api/tokens/oauth2/foo',
                                   json={'code': '123', 'state': state})
             assert rv.status_code == 401
-            requests_post.assert_called_with(
-                'https://foo.com/token', data={
-                    'client_id': 'foo-id',
-                    'client_secret': 'foo-secret',
-                    'code': '123',
-                    'grant_type': 'authorization_code',
-                    'redirect_uri': 'http://localhost/oauth2/foo/callback',
-                }, headers={'Accept': 'application/json'})
-
-        # auth with authorization code (failure case)
-        with mock.patch('api.tokens.requests.post') as requests_post:
-            with mock.patch('api.tokens.requests.get') as requests_get:
-                requests_post.return_value.status_code = 200
-                requests_post.return_value.json.return_value = {
-                    'access_token': 'foo-token',
-                }
-                requests_get.return_value.status_code = 401
-                rv = self.client.post('/api/tokens/oauth2/foo',
-                                      json={'code': '123', 'state': state})
-                assert rv.status_code == 401
-                requests_post.assert_called_with(
-                    'https://foo.com/token', data={
-                        'client_id': 'foo-id',
-                        'client_secret': 'foo-secret',
-                        'code': '123',
-                        'grant_type': 'authorization_code',
-                        'redirect_uri': 'http://localhost/oauth2/foo/callback',
-                    }, headers={'Accept': 'application/json'})
-
-        # auth with authorization code (failure case)
-        with mock.patch('api.tokens.requests.post') as requests_post:
-            with mock.patch('api.tokens.requests.get') as requests_get:
-                requests_post.return_value.status_code = 200
-                requests_post.return_value.json.return_value = {
-                    'not_access_token': 'foo-token',
-                }
-                requests_get.return_value.status_code = 200
-                rv = self.client.post('/api/tokens/oauth2/foo',
-                                      json={'code': '123', 'state': state})
-                assert rv.status_code == 401
-                requests_post.assert_called_with(
-                    'https://foo.com/token', data={
-                        'client_id': 'foo-id',
-                        'client_secret': 'foo-secret',
-                        'code': '123',
-                        'grant_type': 'authorization_code',
-                        'redirect_uri': 'http://localhost/oauth2/foo/callback',
-                    }, headers={'Accept': 'application/json'})
-
-        # auth with authorization code (success case with new user)
-        with mock.patch('api.tokens.requests.post') as requests_post:
-            with mock.patch('api.tokens.requests.get') as requests_get:
-                requests_post.return_value.status_code = 200
-                requests_post.return_value.json.return_value = {
-                    'access_token': 'foo-token',
-                }
-                requests_get.return_value.status_code = 200
-                requests_get.return_value.json.return_value = {
-                    'id': 'user-id',
-                    'email': 'foo@foo.com',
-                }
-                rv = self.client.post('/api/tokens/oauth2/foo',
-                                      json={'code': '123', 'state': state})
-                assert rv.status_code == 200
-                requests_post.assert_called_with(
-                    'https://foo.com/token', data={
-                        'client_id': 'foo-id',
-                        'client_secret': 'foo-secret',
-                        'code': '123',
-                        'grant_type': 'authorization_code',
-                        'redirect_uri': 'http://localhost/oauth2/foo/callback',
-                    }, headers={'Accept': 'application/json'})
-                requests_get.assert_called_with(
-                    'https://foo.com/me', headers={
-                        'Authorization': 'Bearer foo-token',
-                        'Accept': 'application/json',
-                    })
-                access_token = rv.json['access_token']
-
-                # test the access token
-                rv = self.client.get('/api/me', headers={
-                    'Authorization': f'Bearer {access_token}'})
-                assert rv.status_code == 200
-                assert rv.json['username'] == 'foo'
-
-        # auth with authorization code (success case with existing user)
-        with mock.patch('api.tokens.requests.post') as requests_post:
-            with mock.patch('api.tokens.requests.get') as requests_get:
-                requests_post.return_value.status_code = 200
-                requests_post.return_value.json.return_value = {
-                    'access_token': 'foo-token',
-                }
-                requests_get.return_value.status_code = 200
-                requests_get.return_value.json.return_value = {
-                    'id': 'user-id',
-                    'email': 'test@example.com',
-                }
-                rv = self.client.post('/api/tokens/oauth2/foo',
-                                      json={'code': '123', 'state': state})
-                assert rv.status_code == 200
-                requests_post.assert_called_with(
-                    'https://foo.com/token', data={
-                        'client_id': 'foo-id',
-                        'client_secret': 'foo-secret',
-                        'code': '123',
-                        'grant_type': 'authorization_code',
-                        'redirect_uri': 'http://localhost/oauth2/foo/callback',
-                    }, headers={'Accept': 'application/json'})
-                requests_get.assert_called_with(
-                    'https://foo.com/me', headers={
-                        'Authorization': 'Bearer foo-token',
-                        'Accept': 'application/json',
-                    })
-                access_token = rv.json['access_token']
-
-                # test the access token
-                rv = self.client.get('/api/me', headers={
-                    'Authorization': f'Bearer {access_token}'})
-                assert rv.status_code == 200
-                assert rv.json['username'] == 'test'
+            assert [r[:2] for r in provider.requests] == [token_request]
+
+            # auth with authorization code (success case with new user)
+            provider.responses[token_request] = [
+                (200, {'access_token': 'foo-token'})]
+            provider.responses[user_request] = [
+                (200, {'id': 'user-id', 'email': 'foo@foo.com'})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 200
+            access_token = rv.json['access_token']
+
+            # test the access token
+            rv = self.client.get('/api/me', headers={
+                'Authorization': f'Bearer {access_token}'})
+            assert rv.status_code == 200
+            assert rv.json['username'] == 'foo'
+
+            # auth with authorization code (success case with existing user)
+            provider.responses[user_request] = [
+                (200, {'id': 'user-id', 'email': 'test@example.com'})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 200
+            access_token = rv.json['access_token']
+
+            # test the access token
+            rv = self.client.get('/api/me', headers={
+                'Authorization': f'Bearer {access_token}'})
+            assert rv.status_code == 200
+            assert rv.json['username'] == 'test'
+
+        # connections to the provider are reused
+        assert provider.connections == 1
+
+    def oauth2_state(self):
+        rv = self.client.get('/api/tokens/oauth2/foo')
+        return rv.headers['Location'].split('state=')[1]
+
+    def use_provider(self, provider):
+        providers = self.app.config['OAUTH2_PROVIDERS']
+        self.app.config['OAUTH2_PROVIDERS'] = {'foo': dict(
+            providers['foo'], access_token_url=provider.url('/token'),
+            get_user=dict(providers['foo']['get_user'],
+                          url=provider.url('/me')))}
+
+    def test_oauth_retries(self):
+        state = self.oauth2_state()
+        with OAuth2Provider() as provider:
+            self.use_provider(provider)
+
+            # user requests are retried
+            provider.responses[('GET', '/me')] = [
+                (503, {}), (502, {}), (200, {'email': 'test@example.com'})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 200
+            assert [r[:2] for r in provider.requests] == [
+                ('POST', '/token'), ('GET', '/me'), ('GET', '/me'),
+                ('GET', '/me')]
+
+            # token requests are not idempotent, so they are not retried
+            provider.requests = []
+            provider.responses[('POST', '/token')] = [(503, {})]
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 401
+            assert [r[:2] for r in provider.requests] == [('POST', '/token')]
+
+    def test_oauth_timeout(self):
+        state = self.oauth2_state()
+        self.app.config['OAUTH2_READ_TIMEOUT'] = 0.1
+        metrics.clear()
+        with OAuth2Provider() as provider:
+            self.use_provider(provider)
+            provider.delay = 0.5
+            rv = self.client.post('/api/tokens/oauth2/foo',
+                                  json={'code': '123', 'state': state})
+            assert rv.status_code == 503
+        assert metrics.counters[('oauth2_requests_total', (
+            ('call', 'token'), ('provider', 'foo'), ('status', 'error')))] == 1
+        assert metrics.histograms[('oauth2_request_duration_seconds', (
+            ('call', 'token'), ('provider', 'foo')))]['count'] == 1
@@ -0,0 +1,109 @@
+from unittest import mock
+from flask import g
+from api.models import Token
+from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+
+
+class BatchTests(BaseTestCase):
+    def test_batch(self):
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'method': 'POST', 'url': '/api/posts',
+             'body': {'text': 'first post'}},
+            {'url': '/api/posts?limit=1'},
+            {'url': '/api/users/1?fields=id,username'},
+            {'url': '/api/users/2'},
+            {'method': 'POST', 'url': '/api/posts', 'body': {}},
+            {'method': 'PUT', 'url': '/api/me',
+             'body': {'about_me': 'I am testing batches'}},
+            {'method': 'DELETE', 'url': '/api/posts/1'},
+        ]})
+        assert rv.status_code == 200
+        responses = rv.json['responses']
+        assert [response['status'] for response in responses] == [
+            201, 200, 200, 404, 400, 200, 204]
+        assert responses[0]['body']['text'] == 'first post'
+        assert responses[1]['body']['data'][0]['text'] == 'first post'
+        assert responses[2]['body'] == {'id': 1, 'username': 'test'}
+        assert responses[3]['body']['code'] == 404
+        assert 'text' in responses[4]['body']['errors']['json']
+        assert responses[5]['body']['about_me'] == 'I am testing batches'
+        assert responses[6]['body'] is None
+
+        rv = self.client.get('/api/posts')
+        assert rv.json['data'] == []
+
+    def test_invalid_batch(self):
+        rv = self.client.post('/api/batch', json={'requests': []})
+        assert rv.status_code == 400
+
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/docs'}]})
+        assert rv.status_code == 400
+
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'method': 'PATCH', 'url': '/api/me'}]})
+        assert rv.status_code == 400
+
+        self.app.config['BATCH_MAX_REQUESTS'] = 2
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/api/me'}] * 3})
+        assert rv.status_code == 400
+        assert 'requests' in rv.json['errors']['json']
+
+    def test_unhandled_error(self):
+        def fail(**kwargs):
+            raise KeyError('id')
+
+        with mock.patch.dict(self.app.view_functions, {'posts.get': fail}):
+            rv = self.client.post('/api/batch', json={'requests': [
+                {'url': '/api/posts/1'}, {'url': '/api/me'}]})
+        assert rv.status_code == 200
+        responses = rv.json['responses']
+        assert responses[0]['status'] == 500
+        assert responses[0]['body']['code'] == 500
+        assert responses[1]['status'] == 200
+
+    def test_nested_batch(self):
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'method': 'POST', 'url': '/api/batch',
+             'body': {'requests': [{'url': '/api/me'}]}}]})
+        assert rv.status_code == 200
+        assert rv.json['responses'][0]['status'] == 400
+
+
+class BatchAuthTests(BaseTestCase):
+    config = TestConfigWithAuth
+
+    def test_token_verified_once(self):
+        rv = self.client.post('/api/tokens', auth=('test', 'foo'))
+        access_token = rv.json['access_token']
+        headers = {'Authorization': f'Bearer {access_token}'}
+
+        rv = self.client.post('/api/batch', json={'requests': [
+            {'url': '/api/me'}]})
+        assert rv.status_code == 401
+
+        with mock.patch.object(Token, 'verify_access_token',
+                               wraps=Token.verify_access_token) as verify:
+            rv = self.client.post('/api/batch', headers=headers, json={
+                'requests': [{'url': '/api/me'}, {'url': '/api/users'}]})
+        assert rv.status_code == 200
+        assert [response['status'] for response in rv.json['responses']] == \
+            [200, 200]
+        assert rv.json['responses'][0]['body']['username'] == 'test'
+        assert verify.call_count == 1
+        assert 'batch_tokens' not in g
+
+        # the verified tokens are not used after the batch
+        rv = self.client.get('/api/me')
+        assert rv.status_code == 401
+
+    def test_revoked_token(self):
+        rv = self.client.post('/api/tokens', auth=('test', 'foo'))
+        headers = {'Authorization': f'Bearer {rv.json["access_token"]}'}
+        rv = self.client.post('/api/batch', headers=headers, json={
+            'requests': [{'method': 'DELETE', 'url': '/api/tokens'},
+                         {'url': '/api/me'}]})
+        assert rv.status_code == 200
+        assert [response['status'] for response in rv.json['responses']] == \
+            [204, 401]
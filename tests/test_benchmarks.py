@@ -0,0 +1,25 @@
+import os
+from tempfile import TemporaryDirectory
+import unittest
+from benchmarks.suite import BENCHMARKS, compare, run
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_run(self):
+        with TemporaryDirectory() as directory:
+            results = run('sqlite:///' + os.path.join(directory, 'b.sqlite'),
+                          num_users=30, num_posts=100, mean_follows=5,
+                          number=1, repeat=1, log=lambda *args: None)
+        assert results['meta']['database'] == 'sqlite'
+        assert list(results['results']) == list(BENCHMARKS)
+        for result in results['results'].values():
+            assert result['median'] > 0
+
+    def test_compare(self):
+        baseline = {'results': {'a': {'median': 1.0}, 'b': {'median': 1.0},
+                                'c': {'median': 1.0}}}
+        results = {'results': {'a': {'median': 1.05}, 'b': {'median': 1.5},
+                               'd': {'median': 2.0}}}
+        assert compare(baseline, results) == [('b', 1.0, 1.5, 1.5)]
+        assert [name for name, *_ in compare(
+            baseline, results, threshold=0.01)] == ['a', 'b']
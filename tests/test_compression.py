@@ -0,0 +1,97 @@
+import gzip
+from unittest import mock
+import pytest
+from api.app import db
+from api.compression import compression
+from api.metrics import metrics
+from api.models import Post, User
+from tests.base_test_case import BaseTestCase
+
+
+class CompressionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        user = db.session.get(User, 1)
+        for i in range(10):
+            db.session.add(Post(author=user, text=f'post {i}'))
+        db.session.commit()
+
+        # keep the last seen time of the user, so that responses do not change
+        patcher = mock.patch.object(User, 'ping')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        compression.cache.clear()
+        metrics.clear()
+        super().tearDown()
+
+    def test_negotiation(self):
+        uncompressed = self.client.get('/api/posts')
+        assert 'Content-Encoding' not in uncompressed.headers
+        assert uncompressed.headers['Vary'] == 'Accept-Encoding'
+
+        rv = self.client.get('/api/posts',
+                             headers={'Accept-Encoding': 'gzip, deflate'})
+        assert rv.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(rv.data) == uncompressed.data
+        assert int(rv.headers['Content-Length']) < len(uncompressed.data)
+
+        rv = self.client.get('/api/posts', headers={
+            'Accept-Encoding': 'gzip;q=1.0, br;q=0.5, zstd;q=0.5'})
+        assert rv.headers['Content-Encoding'] == 'gzip'
+
+    def test_brotli(self):
+        brotli = pytest.importorskip('brotli')
+        uncompressed = self.client.get('/api/posts')
+        rv = self.client.get('/api/posts',
+                             headers={'Accept-Encoding': 'gzip, br'})
+        assert rv.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(rv.data) == uncompressed.data
+
+    def test_zstd(self):
+        zstandard = pytest.importorskip('zstandard')
+        uncompressed = self.client.get('/api/posts')
+        rv = self.client.get('/api/posts',
+                             headers={'Accept-Encoding': 'gzip, br, zstd'})
+        assert rv.headers['Content-Encoding'] == 'zstd'
+        assert zstandard.ZstdDecompressor().decompress(rv.data) == \
+            uncompressed.data
+
+    def test_thresholds(self):
+        # small responses are not compressed
+        rv = self.client.get('/api/me', headers={'Accept-Encoding': 'gzip'})
+        assert rv.status_code == 200
+        assert 'Content-Encoding' not in rv.headers
+
+        self.app.config['COMPRESS_MIN_SIZE'] = 10
+        rv = self.client.get('/api/me', headers={'Accept-Encoding': 'gzip'})
+        assert rv.headers['Content-Encoding'] == 'gzip'
+
+        self.app.config['COMPRESSION'] = False
+        rv = self.client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in rv.headers
+        assert 'Vary' not in rv.headers
+
+    def test_cache(self):
+        headers = {'Accept-Encoding': 'gzip'}
+        first = self.client.get('/api/posts', headers=headers)
+        second = self.client.get('/api/posts', headers=headers)
+        assert first.data == second.data
+        assert len(compression.cache) == 1
+        assert metrics.counters[('compression_cache_total', (
+            ('result', 'miss'),))] == 1
+        assert metrics.counters[('compression_cache_total', (
+            ('result', 'hit'),))] == 1
+
+        # a different level is a different entry
+        self.app.config['COMPRESS_GZIP_LEVEL'] = 9
+        self.client.get('/api/posts', headers=headers)
+        assert len(compression.cache) == 2
+
+        # the least recently used entries are evicted
+        self.app.config['COMPRESS_CACHE_SIZE'] = 1
+        self.app.config['COMPRESS_GZIP_LEVEL'] = 1
+        self.client.get('/api/posts', headers=headers)
+        assert len(compression.cache) == 1
+        assert next(iter(compression.cache))[:2] == ('gzip', 1)
@@ -0,0 +1,77 @@
+import sqlalchemy as sa
+from api.app import db
+from flask import g
+from api.database import COLLECTION_STATEMENT_TIMEOUT, TimedQueuePool, \
+    current_statement_timeout, engine_options
+from api.decorators import statement_timeout
+from api.metrics import metrics
+from tests.base_test_case import BaseTestCase
+
+SLOW_QUERY = sa.text(
+    'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c '
+    'WHERE x < 100000000) SELECT count(*) FROM c')
+
+
+class DatabaseTests(BaseTestCase):
+    def test_engine_options(self):
+        options = engine_options({
+            'ALCHEMICAL_DATABASE_URL': 'sqlite:///db.sqlite',
+            'ALCHEMICAL_ENGINE_OPTIONS': {'pool_size': 3, 'max_overflow': 2},
+        })
+        assert options['poolclass'] == TimedQueuePool
+        assert options['pool_size'] == 3
+        assert options['max_overflow'] == 2
+
+        options = engine_options({
+            'ALCHEMICAL_DATABASE_URL': 'sqlite://',
+            'ALCHEMICAL_ENGINE_OPTIONS': {'pool_size': 3, 'max_overflow': 2,
+                                          'pool_pre_ping': True},
+        })
+        assert options == {'pool_pre_ping': True}
+
+    def test_pool_wait_metric(self):
+        metrics.clear()
+        engine = sa.create_engine('sqlite://', poolclass=TimedQueuePool)
+        with engine.connect() as conn:
+            conn.execute(sa.text('SELECT 1'))
+        engine.dispose()
+        histogram = metrics.histograms[('db_pool_wait_seconds', ())]
+        assert histogram['count'] == 1
+
+    def test_statement_timeout(self):
+        @self.app.route('/slow')
+        @statement_timeout(10)
+        def slow():
+            return {'count': db.session.scalar(SLOW_QUERY)}
+
+        @self.app.route('/fast')
+        def fast():
+            return {'count': db.session.scalar(sa.text('SELECT 1'))}
+
+        rv = self.client.get('/slow')
+        assert rv.status_code == 503
+        rv = self.client.get('/fast')
+        assert rv.status_code == 200
+
+    def test_collection_statement_timeout(self):
+        with self.app.test_request_context():
+            g.statement_timeout = COLLECTION_STATEMENT_TIMEOUT
+            assert current_statement_timeout() == 5000
+
+            # endpoints cannot have a looser limit than the global one
+            self.app.config['DATABASE_STATEMENT_TIMEOUT'] = 1000
+            assert current_statement_timeout() == 1000
+            self.app.config['DATABASE_COLLECTION_STATEMENT_TIMEOUT'] = 0
+            assert current_statement_timeout() == 1000
+            self.app.config['DATABASE_COLLECTION_STATEMENT_TIMEOUT'] = 500
+            assert current_statement_timeout() == 500
+
+    def test_default_statement_timeout(self):
+        self.app.config['DATABASE_STATEMENT_TIMEOUT'] = 10
+
+        @self.app.route('/slow')
+        def slow():
+            return {'count': db.session.scalar(SLOW_QUERY)}
+
+        rv = self.client.get('/slow')
+        assert rv.status_code == 503
@@ -0,0 +1,115 @@
+from threading import Event
+from time import monotonic
+from unittest import mock
+from api.app import mail
+from api.email import EmailQueueFull, EmailWorker, connect, email_queue, \
+    send_email
+from api.metrics import metrics
+from tests.base_test_case import BaseTestCase
+from tests.smtp_server import SMTPServer
+
+
+class EmailTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.smtp_server = SMTPServer().__enter__()
+        state = self.app.extensions['mail']
+        state.server = 'localhost'
+        state.port = self.smtp_server.port
+        state.suppress = False
+
+    def tearDown(self):
+        email_queue.shutdown()
+        self.smtp_server.__exit__()
+        super().tearDown()
+
+    def send(self, i):
+        return send_email(f'user{i}@example.com', 'Reset Your Password',
+                          'reset', username=f'user{i}', token='x',
+                          url='http://example.com')
+
+    def test_send(self):
+        self.app.config['MAIL_BATCH_SIZE'] = 3
+        with mail.record_messages() as outbox:
+            for i in range(10):
+                assert self.send(i)
+            email_queue.join()
+        assert len(outbox) == 10
+        assert sorted(recipients[0] for _, recipients, _ in
+                      self.smtp_server.messages) == sorted(
+            f'<user{i}@example.com>' for i in range(10))
+        _, _, message = self.smtp_server.messages[0]
+        assert message['Subject'] == 'Reset Your Password'
+
+        # each worker thread reuses its connection
+        assert self.smtp_server.connections <= \
+            self.app.config['MAIL_WORKERS']
+
+    def test_shutdown(self):
+        for i in range(5):
+            assert self.send(i)
+        email_queue.shutdown()
+        assert len(self.smtp_server.messages) == 5
+        assert email_queue.workers == []
+
+    def test_shutdown_timeout(self):
+        # a worker that is stuck sending an email with a full queue
+        self.app.config['MAIL_WORKERS'] = 1
+        self.app.config['MAIL_QUEUE_SIZE'] = 1
+        self.app.config['MAIL_SHUTDOWN_TIMEOUT'] = 0.2
+        sending = Event()
+        release = Event()
+        self.addCleanup(release.set)
+
+        def deliver(worker, app, msg):
+            sending.set()
+            release.wait()
+
+        with mock.patch.object(EmailWorker, 'deliver', deliver):
+            assert self.send(1)
+            assert sending.wait(5)
+            assert self.send(2)
+            start = monotonic()
+            with self.assertLogs(self.app.logger, 'ERROR') as logs:
+                email_queue.shutdown()
+        assert monotonic() - start < 2
+        assert 'user2@example.com' in logs.output[0]
+        assert 'user1@example.com' not in logs.output[0]
+
+    def test_connection_timeout(self):
+        self.app.config['MAIL_TIMEOUT'] = 3
+        with connect() as connection:
+            assert connection.host.timeout == 3
+
+    def test_reconnect(self):
+        assert self.send(1)
+        email_queue.join()
+        for worker in email_queue.workers:
+            if worker.connection:
+                worker.connection.host.close()
+        assert self.send(2)
+        email_queue.join()
+        assert len(self.smtp_server.messages) == 2
+
+    def test_full_queue(self):
+        self.app.config['MAIL_WORKERS'] = 0
+        self.app.config['MAIL_QUEUE_SIZE'] = 2
+        self.app.config['MAIL_QUEUE_TIMEOUT'] = 0
+        assert self.send(1)
+        assert self.send(2)
+
+        self.app.config['MAIL_QUEUE_POLICY'] = 'drop'
+        metrics.clear()
+        assert not self.send(3)
+        assert metrics.counters[('emails_total',
+                                 (('status', 'dropped'),))] == 1
+
+        for policy in ['block', 'reject']:
+            self.app.config['MAIL_QUEUE_POLICY'] = policy
+            with self.assertRaises(EmailQueueFull):
+                self.send(3)
+
+        rv = self.client.post('/api/tokens/reset',
+                              json={'email': 'test@example.com'})
+        assert rv.status_code == 503
+        assert rv.json['description'] == EmailQueueFull.description
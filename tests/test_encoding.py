@@ -0,0 +1,43 @@
+from datetime import datetime
+from unittest import mock
+from flask.json.provider import DefaultJSONProvider
+from api.encoding import EncodedJSON, encode
+from api.posts import post_schema
+from api.models import Post
+from api.schemas import EmptySchema
+from tests.base_test_case import BaseTestCase
+
+
+class EncodingTests(BaseTestCase):
+    def test_provider(self):
+        stdlib = DefaultJSONProvider(self.app)
+        data = {'b': [1, 2.5, None, True], 'a': {'z': 'x', 'y': 1},
+                'date': datetime(2024, 1, 2, 3, 4, 5)}
+        expected = stdlib.dumps(data, separators=(',', ':'))
+        assert self.app.json.dumps(data) == expected
+        assert self.app.json.dumps_bytes(data) == expected.encode()
+        with mock.patch('api.encoding.orjson', None):
+            assert self.app.json.dumps_bytes(data) == expected.encode()
+
+        # integers that orjson cannot encode use the standard library
+        assert self.app.json.dumps({'n': 2 ** 70}) == '{"n":%d}' % 2 ** 70
+        assert self.app.json.loads(self.app.json.dumps('año')) == 'año'
+        assert self.app.json.dumps({'a': 1}, indent=2) == '{\n  "a": 1\n}'
+
+        with self.app.test_request_context():
+            rv = self.app.json.response(data)
+            assert rv.mimetype == 'application/json'
+            assert rv.get_data() == stdlib.response(data).get_data()
+
+    def test_encoded_response(self):
+        post = Post(text='hello', user_id=1)
+        post.id = 1
+        post.timestamp = datetime(2024, 1, 2)
+        with self.app.test_request_context():
+            encoded = encode(post_schema, post)
+            assert isinstance(encoded, EncodedJSON)
+            assert self.app.json.loads(encoded.data)['text'] == 'hello'
+
+            rv = EmptySchema().jsonify(encoded)
+            assert rv.mimetype == 'application/json'
+            assert rv.get_data() == encoded.data
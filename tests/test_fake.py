@@ -0,0 +1,38 @@
+import random
+import sqlalchemy as sa
+from api.app import db
+from api.fake import follower_edges
+from api.models import User, Post, followers
+from tests.base_test_case import BaseTestCase
+
+
+class FakeTests(BaseTestCase):
+    def test_fake_users_and_posts(self):
+        runner = self.app.test_cli_runner()
+        rv = runner.invoke(args=['fake', 'users', '50', '--seed', '1',
+                                 '--processes', '1'])
+        assert rv.exit_code == 0, rv.output
+        rv = runner.invoke(args=['fake', 'posts', '120', '--seed', '1',
+                                 '--processes', '1'])
+        assert rv.exit_code == 0, rv.output
+
+        usernames = db.session.scalars(sa.select(User.username)).all()
+        assert len(usernames) == 51
+        assert len(set(usernames)) == 51
+        assert db.session.scalar(sa.select(sa.func.count()).select_from(
+            Post)) == 120
+        edges = db.session.execute(sa.select(followers)).all()
+        assert len(edges) > 0
+        assert all(follower != followed for follower, followed in edges)
+        assert all(follower > 1 and followed > 1
+                   for follower, followed in edges)
+
+    def test_follower_edges(self):
+        user_ids = list(range(1, 1001))
+        edges = list(follower_edges(random.Random(1), user_ids,
+                                    mean_follows=10))
+        assert edges == list(follower_edges(random.Random(1), user_ids,
+                                            mean_follows=10))
+        followed = [followed_id for _, followed_id in edges]
+        # the most popular users get a large share of the followers
+        assert followed.count(1) > 10 * followed.count(500)
@@ -0,0 +1,58 @@
+from api.app import db
+from api.instrumentation import fingerprint
+from api.models import User, Post
+from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+
+
+class InstrumentationTests(BaseTestCase):
+    config = TestConfigWithAuth
+
+    def setUp(self):
+        super().setUp()
+        for i in range(10):
+            user = User(username=f'user{i}', email=f'user{i}@example.com')
+            db.session.add(user)
+            db.session.add_all([Post(text=f'Post {j}', author=user)
+                                for j in range(3)])
+        db.session.commit()
+        rv = self.client.post('/api/tokens', auth=('test', 'foo'))
+        self.headers = {
+            'Authorization': f'Bearer {rv.json["access_token"]}'}
+
+    def test_server_timing(self):
+        rv = self.client.get('/api/posts', headers=self.headers)
+        assert rv.status_code == 200
+        assert 'Server-Timing' not in rv.headers
+
+        self.app.config['SERVER_TIMING'] = True
+        rv = self.client.get('/api/posts', headers=self.headers)
+        entries = [entry.split(';')[0]
+                   for entry in rv.headers['Server-Timing'].split(', ')]
+        assert entries == ['db', 'auth', 'ser', 'total']
+        assert rv.headers['Server-Timing'].startswith('db;desc="')
+
+        self.app.config['SERVER_TIMING'] = False
+        rv = self.client.get('/api/posts', headers=self.headers)
+        assert 'Server-Timing' not in rv.headers
+
+    def test_slow_request(self):
+        self.app.config['SLOW_REQUEST_THRESHOLD'] = 0.001
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            rv = self.client.get('/api/users', headers=self.headers)
+            assert rv.status_code == 200
+        assert 'Slow request: GET /api/users?' in logs.output[0]
+        assert 'slowest' in logs.output[0]
+
+    def test_fingerprint(self):
+        assert fingerprint(
+            "SELECT *  FROM users\n WHERE id IN (?, ?, ?) AND name = 'x' "
+            "LIMIT 25") == 'SELECT * FROM users WHERE id IN (...) AND ' \
+            'name = ? LIMIT ?'
+
+    def test_query_budgets(self):
+        for url, max_queries in [('/api/posts', 8), ('/api/feed', 8),
+                                 ('/api/users/2/posts', 8),
+                                 ('/api/users', 6), ('/api/me', 4)]:
+            with self.assert_max_queries(max_queries):
+                rv = self.client.get(url, headers=self.headers)
+                assert rv.status_code == 200
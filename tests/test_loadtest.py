@@ -0,0 +1,29 @@
+import unittest
+from click.testing import CliRunner
+from benchmarks.loadtest import Stats, cli
+
+
+class LoadTestTests(unittest.TestCase):
+    def test_stats(self):
+        stats = Stats()
+        for i in range(1, 101):
+            stats.add('GET /api/feed', i / 1000, i > 98)
+        stats.add('POST /api/posts', 0.5, False)
+        stats.end = stats.start + 2
+        report = stats.report()
+        assert report['GET /api/feed']['p50'] == 0.05
+        assert report['GET /api/feed']['p95'] == 0.095
+        assert report['GET /api/feed']['p99'] == 0.099
+        assert report['GET /api/feed']['error_rate'] == 0.02
+        assert report['GET /api/feed']['throughput'] == 50
+        assert report['total']['requests'] == 101
+
+    def test_run(self):
+        rv = CliRunner().invoke(cli, [
+            'run', '--duration', '0.5', '--concurrency', '2', '--users', '20',
+            '--posts', '50', '--mix', 'feed=1,follow=1'])
+        assert rv.exit_code == 0, rv.output
+        lines = rv.output.splitlines()
+        assert lines[0].split()[0] == 'endpoint'
+        assert lines[-1].split()[0] == 'total'
+        assert lines[-1].endswith(' 0.0%')
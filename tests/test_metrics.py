@@ -0,0 +1,84 @@
+import os
+from tempfile import TemporaryDirectory
+from api.metrics import Metrics, mark_process_dead, metrics
+from tests.base_test_case import BaseTestCase, TestConfigWithAuth
+
+
+class MetricsTests(BaseTestCase):
+    config = TestConfigWithAuth
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['METRICS_ENABLED'] = True
+        metrics.clear()
+
+    def tearDown(self):
+        metrics.clear()
+        super().tearDown()
+
+    def get_metrics(self, **kwargs):
+        rv = self.client.get('/metrics', **kwargs)
+        assert rv.status_code == 200
+        assert rv.headers['Content-Type'].startswith('text/plain')
+        return rv.get_data(as_text=True).splitlines()
+
+    def test_request_metrics(self):
+        rv = self.client.post('/api/tokens', auth=('test', 'foo'))
+        assert rv.status_code == 200
+        headers = {'Authorization': f'Bearer {rv.json["access_token"]}'}
+        self.client.get('/api/posts', headers=headers)
+        self.client.get('/api/posts', headers=headers)
+        self.client.get('/api/posts/123', headers=headers)
+
+        lines = self.get_metrics()
+        assert '# TYPE http_requests_total counter' in lines
+        assert 'http_requests_total{blueprint="posts",endpoint="posts.all",' \
+            'method="GET",status="200"} 2' in lines
+        assert 'http_requests_total{blueprint="posts",endpoint="posts.get",' \
+            'method="GET",status="404"} 1' in lines
+        assert '# TYPE http_request_duration_seconds histogram' in lines
+        assert 'http_request_duration_seconds_bucket{blueprint="posts",' \
+            'endpoint="posts.all",method="GET",le="+Inf"} 2' in lines
+        assert 'http_request_duration_seconds_count{blueprint="posts",' \
+            'endpoint="posts.all",method="GET"} 2' in lines
+        assert 'password_hash_seconds_count{operation="verify"} 1' in lines
+
+    def test_metrics_token(self):
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        rv = self.client.get('/metrics')
+        assert rv.status_code == 401
+        rv = self.client.get('/metrics',
+                             headers={'Authorization': 'Bearer bad'})
+        assert rv.status_code == 401
+        self.get_metrics(headers={'Authorization': 'Bearer secret'})
+
+    def test_metrics_disabled(self):
+        self.app.config['METRICS_ENABLED'] = False
+        rv = self.client.get('/metrics')
+        assert rv.status_code == 404
+
+    def test_multiprocess(self):
+        with TemporaryDirectory() as directory:
+            other = Metrics()
+            other.inc('http_requests_total', endpoint='posts.all')
+            other.set('email_queue_depth', 3)
+            other.observe('db_pool_wait_seconds', 0.02)
+            other.write(directory)
+            os.rename(os.path.join(directory, f'metrics-{os.getpid()}.json'),
+                      os.path.join(directory, 'metrics-1.json'))
+
+            self.app.config['METRICS_DIR'] = directory
+            metrics.inc('http_requests_total', 2, endpoint='posts.all')
+            metrics.set('email_queue_depth', 1)
+            metrics.observe('db_pool_wait_seconds', 0.2)
+            lines = self.get_metrics()
+            assert 'http_requests_total{endpoint="posts.all"} 3' in lines
+            assert 'email_queue_depth 4' in lines
+            assert 'db_pool_wait_seconds_bucket{le="0.025"} 1' in lines
+            assert 'db_pool_wait_seconds_bucket{le="0.25"} 2' in lines
+            assert 'db_pool_wait_seconds_count 2' in lines
+
+            mark_process_dead(directory, 1)
+            lines = self.get_metrics()
+            assert 'http_requests_total{endpoint="posts.all"} 3' in lines
+            assert 'email_queue_depth 1' in lines
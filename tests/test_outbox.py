@@ -0,0 +1,76 @@
+from datetime import timedelta
+import socket
+from api.app import db, mail
+from api.dates import naive_utcnow
+from api.email import deliver_outbox
+from api.models import Outbox
+from tests.base_test_case import BaseTestCase
+from tests.smtp_server import SMTPServer
+
+
+class OutboxTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['MAIL_OUTBOX'] = True
+        state = self.app.extensions['mail']
+        state.server = 'localhost'
+        state.suppress = False
+
+    def request_reset(self):
+        with mail.record_messages() as sent:
+            rv = self.client.post('/api/tokens/reset',
+                                  json={'email': 'test@example.com'})
+            assert rv.status_code == 204
+        assert sent == []
+
+    def test_deliver(self):
+        self.request_reset()
+        self.request_reset()
+        emails = db.session.scalars(Outbox.select()).all()
+        assert [email.recipient for email in emails] == \
+            ['test@example.com'] * 2
+        assert emails[0].subject == 'Reset Your Password'
+        assert '/reset?token=' in emails[0].body
+
+        with SMTPServer() as smtp_server:
+            self.app.extensions['mail'].port = smtp_server.port
+            assert deliver_outbox(10) == 2
+            assert deliver_outbox(10) == 0
+        assert len(smtp_server.messages) == 2
+        assert smtp_server.connections == 1
+        assert db.session.scalars(Outbox.select()).all() == []
+
+    def test_retry(self):
+        self.app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = 2
+        self.request_reset()
+
+        # send to a port that is not listening
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            self.app.extensions['mail'].port = sock.getsockname()[1]
+        assert deliver_outbox(10) == 1
+        email = db.session.scalar(Outbox.select())
+        assert email.attempts == 1
+        assert email.last_error
+        assert naive_utcnow() + timedelta(seconds=14) < email.next_attempt < \
+            naive_utcnow() + timedelta(seconds=31)
+
+        # the email is not due yet
+        assert deliver_outbox(10) == 0
+
+        email.next_attempt = naive_utcnow()
+        db.session.commit()
+        assert deliver_outbox(10) == 1
+        email = db.session.scalar(Outbox.select())
+        assert email.attempts == 2
+        assert email.next_attempt is None
+        assert deliver_outbox(10) == 0
+
+    def test_worker_command(self):
+        self.request_reset()
+        with SMTPServer() as smtp_server:
+            self.app.extensions['mail'].port = smtp_server.port
+            rv = self.app.test_cli_runner().invoke(
+                args=['mail', 'worker', '--once'])
+            assert rv.exit_code == 0, rv.output
+        assert len(smtp_server.messages) == 1
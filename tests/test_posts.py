@@ -90,6 +90,87 @@ class PostTests(BaseTestCase):
         assert rv.json['data'][2]['text'] == 'Post 1'
         assert rv.json['data'][2]['author']['username'] == 'susan'
 
+        rv = self.client.get('/api/feed?format=normalized')
+        assert rv.status_code == 200
+        assert rv.json['pagination']['total'] == 3
+        assert [post['author_id'] for post in rv.json['data']] == [2, 1, 2]
+        assert 'author' not in rv.json['data'][0]
+        assert sorted(rv.json['includes']['users']) == ['1', '2']
+        assert rv.json['includes']['users']['2']['username'] == 'susan'
+
+        rv = self.client.get('/api/feed?format=nested')
+        assert rv.status_code == 200
+        assert rv.json['data'][0]['author']['username'] == 'susan'
+        assert 'includes' not in rv.json
+
+        rv = self.client.get('/api/feed?format=flat')
+        assert rv.status_code == 400
+
+        rv = self.client.get('/apispec.json')
+        schema = rv.json['paths']['/api/feed']['get']['responses']['200'][
+            'content']['application/json']['schema']
+        assert schema == {'oneOf': [
+            {'$ref': '#/components/schemas/PaginatedPost'},
+            {'$ref': '#/components/schemas/SelectedPost'},
+            {'$ref': '#/components/schemas/PaginatedNormalizedPost'},
+            {'$ref': '#/components/schemas/SelectedNormalizedPost'}]}
+        assert 'includes' in rv.json['components']['schemas'][
+            'PaginatedNormalizedPost']['properties']
+
+    def test_sparse_fields(self):
+        user = db.session.get(User, 1)
+        post = Post(text='Post 1', author=user)
+        db.session.add(post)
+        db.session.commit()
+
+        rv = self.client.get('/api/posts?fields=id,text,author.username')
+        assert rv.status_code == 200
+        assert rv.json['data'] == [
+            {'id': post.id, 'text': 'Post 1', 'author': {'username': 'test'}}]
+        assert rv.json['pagination']['total'] == 1
+
+        rv = self.client.get(f'/api/posts/{post.id}?fields=timestamp')
+        assert rv.status_code == 200
+        assert list(rv.json) == ['timestamp']
+        assert rv.json['timestamp'].endswith('Z')
+
+        rv = self.client.get('/api/feed?fields=author.password_hash')
+        assert rv.status_code == 400
+        rv = self.client.get('/api/feed?fields=id&format=normalized')
+        assert rv.status_code == 400
+
+    def test_get_posts_by_ids(self):
+        user = db.session.get(User, 1)
+        posts = [Post(text=f'Post {i}', author=user) for i in range(3)]
+        db.session.add_all(posts)
+        db.session.commit()
+
+        ids = [posts[2].id, posts[0].id + 100, posts[0].id]
+        rv = self.client.get('/api/posts?ids=' + ','.join(map(str, ids)))
+        assert rv.status_code == 200
+        assert [post and post['text'] for post in rv.json['data']] == \
+            ['Post 2', None, 'Post 0']
+        assert rv.json['data'][0]['author']['username'] == 'test'
+
+        rv = self.client.get('/api/posts?format=normalized&ids=' +
+                             ','.join(map(str, ids)))
+        assert rv.status_code == 200
+        assert [post and post['author_id'] for post in rv.json['data']] == \
+            [1, None, 1]
+        assert list(rv.json['includes']['users']) == ['1']
+
+        rv = self.client.get('/apispec.json')
+        schema = rv.json['components']['schemas']['SelectedPost']
+        assert list(schema['properties']) == ['data']
+        assert schema['properties']['data']['items']['nullable'] is True
+
+        rv = self.client.get('/api/posts?ids=1,foo')
+        assert rv.status_code == 400
+        rv = self.client.get('/api/posts?ids=1&after=2021-01-01T00:00:00')
+        assert rv.status_code == 400
+        assert rv.json['errors']['query']['_schema'] == [
+            'Cannot specify after with ids']
+
     def test_permissions(self):
         user = User(username='susan', email='susan@example.com',
                     password='dog')
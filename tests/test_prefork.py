@@ -0,0 +1,48 @@
+import gc
+import os
+import runpy
+from unittest import mock
+from api.app import db
+from api.metrics import metrics
+from api.prefork import after_fork, warm_up
+from tests.base_test_case import BaseTestCase
+
+GUNICORN_CONFIG = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+
+class PreforkTests(BaseTestCase):
+    def test_warm_up_and_after_fork(self):
+        try:
+            warm_up(self.app)
+            assert gc.get_freeze_count() > 0
+        finally:
+            gc.unfreeze()
+
+        engine = db.get_engine()
+        pool = engine.pool
+        metrics.inc('test_total')
+        after_fork()
+        assert engine.pool is not pool
+        assert metrics.snapshot()['counters'] == []
+
+    def test_gunicorn_config(self):
+        with mock.patch.dict(os.environ, {'GUNICORN_WORKER_CLASS': 'sync',
+                                          'WEB_CONCURRENCY': '',
+                                          'GUNICORN_PRELOAD': 'no'}):
+            config = runpy.run_path(GUNICORN_CONFIG)
+        assert config['workers'] == config['cpu_count']() * 2 + 1
+        assert config['preload_app'] is False
+
+        with mock.patch.dict(os.environ, {'GUNICORN_WORKER_CLASS': '',
+                                          'WEB_CONCURRENCY': '3',
+                                          'GUNICORN_THREADS': '8'}):
+            config = runpy.run_path(GUNICORN_CONFIG)
+        assert config['worker_class'] == 'gthread'
+        assert config['workers'] == 3
+        assert config['threads'] == 8
+        assert config['preload_app'] is True
+
+        with mock.patch('api.email.email_queue.shutdown') as shutdown:
+            config['worker_exit'](None, None)
+        shutdown.assert_called_once_with()
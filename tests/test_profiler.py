@@ -0,0 +1,89 @@
+from tempfile import TemporaryDirectory
+from threading import get_ident
+from unittest import mock
+from api.profiler import profiler
+from tests.base_test_case import BaseTestCase
+
+
+class ProfilerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['PROFILER_SECRET'] = 'secret'
+        self.app.config['PROFILER_INTERVAL'] = 1
+        profiler.clear()
+
+        # profiled requests are sampled once before they end, instead of
+        # by the sampling thread
+        patcher = mock.patch.object(profiler, 'run')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @self.app.after_request
+        def sample(response):
+            profiler.sample()
+            return response
+
+    def tearDown(self):
+        profiler.clear()
+        super().tearDown()
+
+    def test_sample(self):
+        # hold the lock so that the sampling thread cannot run
+        with profiler.lock:
+            profiler.active[get_ident()] = 'posts.all'
+            profiler.sample()
+            del profiler.active[get_ident()]
+        lines = profiler.collect()
+        assert len(lines) == 1
+        assert lines[0].startswith('posts.all;')
+        assert 'test_sample;api.profiler:' in lines[0]
+        assert lines[0].endswith(' 1')
+
+    def test_not_profiled(self):
+        for headers in [{}, {'X-Profile': 'wrong'}]:
+            rv = self.client.get('/api/users', headers=headers)
+            assert rv.status_code == 200
+            assert profiler.active == {}
+        assert profiler.stacks == {}
+
+    def test_sample_rate(self):
+        self.app.config['PROFILER_SAMPLE_RATE'] = 1
+        rv = self.client.get('/api/users')
+        assert rv.status_code == 200
+        assert list(profiler.stacks) == ['users.all']
+        assert profiler.active == {}
+
+    def test_header(self):
+        rv = self.client.get('/api/users', headers={'X-Profile': 'secret'})
+        assert rv.status_code == 200
+        assert list(profiler.stacks) == ['users.all']
+        assert profiler.active == {}
+
+    def test_profile_endpoint(self):
+        profiler.stacks = {'users.all': {'a;b': 2, 'a;c': 1},
+                           'posts.all': {'a;b': 3}}
+        rv = self.client.get('/profile')
+        assert rv.status_code == 401
+        rv = self.client.get('/profile',
+                             headers={'Authorization': 'Bearer secret'})
+        assert rv.status_code == 200
+        assert rv.get_data(as_text=True) == \
+            'posts.all;a;b 3\nusers.all;a;b 2\nusers.all;a;c 1\n'
+        rv = self.client.get('/profile?endpoint=users.all',
+                             headers={'Authorization': 'Bearer secret'})
+        assert rv.get_data(as_text=True) == 'a;b 2\na;c 1\n'
+
+        self.app.config['PROFILER_SECRET'] = None
+        rv = self.client.get('/profile',
+                             headers={'Authorization': 'Bearer secret'})
+        assert rv.status_code == 404
+
+    def test_multiprocess(self):
+        with TemporaryDirectory() as directory:
+            profiler.stacks = {'users.all': {'a;b': 2}}
+            profiler.write(directory)
+            profiler.stacks = {'users.all': {'a;b': 1}}
+            with open(f'{directory}/profile-1.json', 'w') as f:
+                f.write('{"users.all": {"a;b": 4, "a;c": 1}}')
+            assert profiler.collect(directory) == [
+                'users.all;a;b 5', 'users.all;a;c 1']
@@ -0,0 +1,69 @@
+from unittest import mock
+from tests.query_plan_test_case import QueryPlanTestCase
+
+
+class QueryPlanTests(QueryPlanTestCase):
+    def test_posts(self):
+        rv = self.assert_query_plans('POST', '/api/posts',
+                                     json={'text': 'hello'})
+        id = rv.json['id']
+        self.assert_query_plans('GET', f'/api/posts/{id}')
+        self.assert_query_plans('PUT', f'/api/posts/{id}',
+                                json={'text': 'bye'})
+        self.assert_query_plans('DELETE', f'/api/posts/{id}')
+        self.assert_query_plans('GET', '/api/posts')
+        self.assert_query_plans('GET', '/api/posts?offset=4000')
+        self.assert_query_plans('GET', '/api/posts?after=2021-01-01T00:00:00')
+        self.assert_query_plans('GET', '/api/users/2/posts')
+        self.assert_query_plans('GET',
+                                '/api/users/2/posts?after=2021-01-01T00:00:00')
+
+    def test_feed(self):
+        # the posts from the followed users are merged with a top-N sort
+        self.assert_query_plans('GET', '/api/feed', allow_sort=True)
+        self.assert_query_plans('GET', '/api/feed?after=2021-01-01T00:00:00',
+                                allow_sort=True)
+
+    def test_users(self):
+        self.assert_query_plans('POST', '/api/users', authenticated=False,
+                                json={'username': 'john',
+                                      'email': 'john@example.com',
+                                      'password': 'cat'})
+        # unfiltered listing, which only reads the requested page
+        self.assert_query_plans('GET', '/api/users', allow_scans=['users'])
+        self.assert_query_plans('GET', '/api/users/2')
+        self.assert_query_plans('GET', '/api/users/user2')
+        self.assert_query_plans('GET', '/api/me')
+        self.assert_query_plans('PUT', '/api/me', json={'about_me': 'hi'})
+
+    def test_follows(self):
+        self.assert_query_plans('GET', '/api/me/following/2')
+        self.assert_query_plans('DELETE', '/api/me/following/2')
+        self.assert_query_plans('POST', '/api/me/following/2')
+
+        # follow lists are sorted by username, so they need to sort the
+        # users in the list
+        for url in ['/api/me/following', '/api/me/followers',
+                    '/api/users/2/following', '/api/users/2/followers',
+                    '/api/users/1/followers?after=user120']:
+            self.assert_query_plans('GET', url, allow_sort=True)
+
+    def test_tokens(self):
+        self.assert_query_plans('POST', '/api/tokens', authenticated=False,
+                                auth=('test', 'foo'))
+        rv = self.assert_query_plans('PUT', '/api/tokens',
+                                     authenticated=False, json={
+                                         'access_token': self.access_token,
+                                         'refresh_token': self.refresh_token})
+        self.access_token = rv.json['access_token']
+        self.assert_query_plans('DELETE', '/api/tokens')
+
+    def test_password_reset(self):
+        with mock.patch('api.tokens.send_email') as send_email:
+            self.assert_query_plans('POST', '/api/tokens/reset',
+                                    authenticated=False,
+                                    json={'email': 'test@example.com'})
+        self.assert_query_plans('PUT', '/api/tokens/reset',
+                                authenticated=False, json={
+                                    'token': send_email.call_args[1]['token'],
+                                    'new_password': 'bar'})
@@ -0,0 +1,44 @@
+from tests.base_test_case import BaseTestCase, TestConfig
+
+
+class RequestBodyConfig(TestConfig):
+    MAX_CONTENT_LENGTH = 1000
+    REQUEST_DRAIN_LIMIT = 100
+
+
+class RequestBodyTests(BaseTestCase):
+    config = RequestBodyConfig
+
+    def unread(self, rv):
+        stream = rv.request.environ['wsgi.input']
+        return len(stream.getvalue()) - stream.tell()
+
+    def test_no_body(self):
+        rv = self.client.get('/api/posts')
+        assert rv.status_code == 200
+        assert 'Connection' not in rv.headers
+
+    def test_body_used(self):
+        rv = self.client.post('/api/posts', json={'text': 'x' * 200})
+        assert rv.status_code == 201
+        assert 'Connection' not in rv.headers
+        assert self.unread(rv) == 0
+
+    def test_body_drained(self):
+        # the delete endpoint does not read the request body
+        rv = self.client.delete('/api/posts/1', data='x' * 100)
+        assert rv.status_code == 404
+        assert 'Connection' not in rv.headers
+        assert self.unread(rv) == 0
+
+    def test_body_too_large_to_drain(self):
+        rv = self.client.delete('/api/posts/1', data='x' * 101)
+        assert rv.status_code == 404
+        assert rv.headers['Connection'] == 'close'
+        assert self.unread(rv) == 101
+
+    def test_body_too_large(self):
+        rv = self.client.post('/api/posts', json={'text': 'x' * 1000})
+        assert rv.status_code == 413
+        assert rv.headers['Connection'] == 'close'
+        assert self.unread(rv) > 1000
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from api.app import create_app
+from tests.base_test_case import BaseTestCase, TestConfig
+
+# modules that only command line tools use, which the server must not import
+CLI_MODULES = ['faker', 'api.fake', 'api.openapi']
+
+STARTUP_SCRIPT = '''
+import json, sys
+from api.app import create_app
+create_app()
+print(json.dumps([m for m in %r if m in sys.modules]))
+'''
+
+
+class StartupTests(BaseTestCase):
+    def test_startup_imports(self):
+        # a new interpreter is used, as other tests import these modules
+        rv = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT % CLI_MODULES],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        assert json.loads(rv.stdout.splitlines()[-1]) == []
+
+    def test_prebuilt_apispec(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'apispec.json')
+            runner = self.app.test_cli_runner()
+            rv = runner.invoke(args=['openapi', 'build', '--output', path])
+            assert rv.exit_code == 0, rv.output
+            with open(path) as f:
+                apispec = json.load(f)
+            assert apispec['servers'] == [{'url': '/'}]
+            assert '/api/users' in apispec['paths']
+
+            apispec['info']['title'] = 'Prebuilt'
+            with open(path, 'w') as f:
+                json.dump(apispec, f)
+
+            class Config(TestConfig):
+                APISPEC_FILE = path
+
+            app = create_app(Config)
+            rv = app.test_client().get('/apispec.json')
+            assert rv.status_code == 200
+            assert rv.json['info']['title'] == 'Prebuilt'
+
+            # other applications still generate their document
+            rv = self.client.get('/apispec.json')
+            assert rv.json['info']['title'] != 'Prebuilt'
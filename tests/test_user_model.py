@@ -1,4 +1,5 @@
 from datetime import timedelta
+from flask import Flask
 import sqlalchemy as sa
 import pytest
 from api.app import db
@@ -20,12 +21,32 @@ class UserModelTests(BaseTestCase):
         db.session.add(u)
         db.session.commit()
         assert u.url == 'http://localhost:5000/api/users/' + str(u.id)
+        with self.app.test_request_context(
+                base_url='http://localhost:5000/microblog'):
+            assert u.url == '/microblog/api/users/' + str(u.id)
+            assert u.posts_url == f'/microblog/api/users/{u.id}/posts'
+
+        # the templates of another application are built from its own rules
+        app = Flask(__name__)
+        app.add_url_rule('/v2/users/<int:id>', 'users.get')
+        with app.test_request_context():
+            assert u.url == '/v2/users/' + str(u.id)
+        with self.app.test_request_context():
+            assert u.url == '/api/users/' + str(u.id)
 
     def test_avatar(self):
         u = User(username='john', email='john@example.com')
         assert u.avatar_url == ('https://www.gravatar.com/avatar/'
                                 'd4c74594d841139328695756648b6bd6'
                                 '?d=identicon')
+        u.update({'email': 'Susan@Example.com'})
+        assert u.avatar_hash == 'f3fc30174d7fd74ab6ca3c36d198fcb9'
+
+        # users inserted without the ORM also get their avatar hash
+        db.session.execute(sa.insert(User), [
+            {'username': 'mary', 'email': 'John@Example.com'}])
+        assert db.session.scalar(sa.select(User.avatar_hash).filter_by(
+            username='mary')) == 'd4c74594d841139328695756648b6bd6'
 
     def test_follow(self):
         u1 = User(username='john', email='john@example.com')
@@ -1,3 +1,9 @@
+import sqlite3
+from unittest import mock
+from marshmallow import validates_schema
+from sqlalchemy.exc import IntegrityError
+from api.errors import unique_violation
+from api.schemas import UserSchema
 from tests.base_test_case import BaseTestCase
 
 
@@ -22,11 +28,61 @@ class UserTests(BaseTestCase):
             'password': 'dog'
         })
         assert rv.status_code == 400
+        assert rv.json['errors']['json'] == {
+            'email': ['Use a different email.']}
+        rv = self.client.post('/api/users', json={
+            'username': 'user',
+            'email': 'user@example.com',
+            'password': 'dog'
+        })
+        assert rv.status_code == 400
+        assert rv.json['errors']['json'] == {
+            'username': ['Use a different username.'],
+            'email': ['Use a different email.']}
         rv = self.client.get(f'/api/users/{user_id}')
         assert rv.status_code == 200
         assert rv.json['username'] == 'user'
         assert rv.json['email'] == 'user@example.com'
 
+    def test_create_duplicate_user_race(self):
+        # a user that is inserted after the request is validated is rejected
+        # by the unique indexes of the database
+        with mock.patch.object(UserSchema, 'validate_unique', validates_schema(
+                lambda self, data, **kwargs: None)):
+            rv = self.client.post('/api/users', json={
+                'username': 'test',
+                'email': 'user@example.com',
+                'password': 'dog'
+            })
+            assert rv.status_code == 400
+            assert rv.json['errors']['json'] == {
+                'username': ['Use a different username.']}
+            rv = self.client.post('/api/users', json={
+                'username': 'susan',
+                'email': 'susan@example.com',
+                'password': 'dog'
+            })
+            assert rv.status_code == 201
+            rv = self.client.put('/api/me', json={
+                'email': 'susan@example.com',
+            })
+            assert rv.status_code == 400
+            assert rv.json['errors']['json'] == {
+                'email': ['Use a different email.']}
+        rv = self.client.get('/api/me')
+        assert rv.json['email'] == 'test@example.com'
+
+    def test_integrity_errors(self):
+        def integrity_error(message):
+            return IntegrityError('INSERT', {}, sqlite3.IntegrityError(
+                message))
+
+        assert unique_violation(integrity_error(
+            'UNIQUE constraint failed: users.email')) == (
+                'email', 'Use a different email.')
+        assert unique_violation(integrity_error(
+            'NOT NULL constraint failed: users.email')) is None
+
     def test_create_invalid_user(self):
         rv = self.client.post('/api/users', json={
             'username': '1user',
@@ -41,6 +97,28 @@ class UserTests(BaseTestCase):
         })
         assert rv.status_code == 400
 
+    def test_create_duplicate_and_invalid_user(self):
+        rv = self.client.post('/api/users', json={
+            'username': 'test',
+            'email': 'test@example.com',
+            'password': 'a'
+        })
+        assert rv.status_code == 400
+        errors = rv.json['errors']['json']
+        assert errors['username'] == ['Use a different username.']
+        assert errors['email'] == ['Use a different email.']
+        assert 'password' in errors
+
+        rv = self.client.post('/api/users', json={
+            'username': 'test',
+            'email': 'test',
+            'password': 'dog'
+        })
+        assert rv.status_code == 400
+        errors = rv.json['errors']['json']
+        assert errors['username'] == ['Use a different username.']
+        assert errors['email'] == ['Not a valid email address.']
+
     def test_get_users(self):
         rv = self.client.get('/api/users')
         assert rv.status_code == 200
@@ -63,6 +141,63 @@ class UserTests(BaseTestCase):
         assert rv.json['email'] == 'test@example.com'
         assert 'password' not in rv.json
 
+    def test_sparse_fields(self):
+        rv = self.client.get('/api/users?fields=id,username,avatar_url')
+        assert rv.status_code == 200
+        assert rv.json['pagination']['total'] == 1
+        assert rv.json['data'][0]['username'] == 'test'
+        assert sorted(rv.json['data'][0]) == ['avatar_url', 'id', 'username']
+
+        rv = self.client.get('/api/users/1?fields=username,last_seen')
+        assert rv.status_code == 200
+        assert sorted(rv.json) == ['last_seen', 'username']
+        assert rv.json['last_seen'].endswith('Z')
+        rv = self.client.get('/api/users/test?fields=url')
+        assert rv.status_code == 200
+        assert rv.json == {'url': '/api/users/1'}
+        rv = self.client.get('/api/me?fields=email')
+        assert rv.status_code == 200
+        assert rv.json == {'email': 'test@example.com'}
+
+        rv = self.client.get('/api/users?fields=username,password')
+        assert rv.status_code == 400
+        assert 'fields' in rv.json['errors']['query']
+        rv = self.client.get('/api/users/1?fields=username.id')
+        assert rv.status_code == 400
+
+    def test_get_users_by_ids(self):
+        rv = self.client.post('/api/users', json={
+            'username': 'susan',
+            'email': 'susan@example.com',
+            'password': 'dog'
+        })
+        assert rv.status_code == 201
+        rv = self.client.get('/api/users?ids=2,3,1,2')
+        assert rv.status_code == 200
+        assert 'pagination' not in rv.json
+        assert [user and user['username'] for user in rv.json['data']] == \
+            ['susan', None, 'test', 'susan']
+        rv = self.client.get('/api/users?ids=1,2&fields=username')
+        assert rv.status_code == 200
+        assert rv.json['data'] == [{'username': 'test'},
+                                   {'username': 'susan'}]
+        rv = self.client.get('/api/me/following?ids=1,2')
+        assert rv.status_code == 200
+        assert rv.json['data'] == [None, None]
+
+        # lookups by id are not paginated
+        rv = self.client.get('/api/users?ids=1,99&offset=5&limit=1')
+        assert rv.status_code == 400
+        assert rv.json['errors']['query']['_schema'] == [
+            'Cannot specify limit, offset with ids']
+        rv = self.client.get('/api/users?ids=1&after=a')
+        assert rv.status_code == 400
+
+        self.app.config['BATCH_MAX_IDS'] = 3
+        rv = self.client.get('/api/users?ids=1,2,3,4')
+        assert rv.status_code == 400
+        assert 'ids' in rv.json['errors']['query']
+
     def test_get_me(self):
         rv = self.client.get('/api/me')
         assert rv.status_code == 200